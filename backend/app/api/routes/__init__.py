@@ -4,7 +4,8 @@ API router configuration
 """
 from fastapi import APIRouter
 
-from app.api.routes import home_profiles, appliances, service_records, reminders
+from app.api.routes import home_profiles, appliances, service_records, reminders, uploads, thumbnails, local_storage, health, events, reports, admin
+from app.core.config import settings
 
 # Create API router
 api_router = APIRouter()
@@ -14,3 +15,13 @@ api_router.include_router(home_profiles.router, prefix="/home_profiles", tags=["
 api_router.include_router(appliances.router, prefix="/appliances", tags=["appliances"])
 api_router.include_router(service_records.router, prefix="/service_records", tags=["service_records"])
 api_router.include_router(reminders.router, prefix="/reminders", tags=["reminders"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(thumbnails.router, prefix="/thumbnails", tags=["thumbnails"])
+api_router.include_router(reports.router, prefix="/reports", tags=["reports"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
+api_router.include_router(health.router, prefix="/health", tags=["health"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
+
+# Local stand-in for Supabase Storage presigned URLs
+if settings.FILE_STORAGE_BACKEND == "local":
+    api_router.include_router(local_storage.router, prefix="/storage/local", tags=["storage"], include_in_schema=False)
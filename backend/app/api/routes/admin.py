@@ -0,0 +1,65 @@
+"""
+API routes for administrators: captured request profiles and memory reports
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any, List, Optional
+import logging
+
+from app.models.profile import ProfileSummary
+from app.core.dependencies import get_admin_user
+from app.core.memory import GROUP_BY, memory_report
+from app.core.profiling import collapsed, get_profile, profiles
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+ROUTE_DESCRIPTION = "Only profiles of this route template, e.g. /appliances/{appliance_id}"
+
+def _matching(route: Optional[str]):
+    return [profile for profile in reversed(profiles) if route is None or profile.route == route]
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+async def list_profiles(
+    route: Optional[str] = Query(None, description=ROUTE_DESCRIPTION),
+    user: Dict[str, Any] = Depends(get_admin_user),
+):
+    """
+    List the request profiles kept by this worker, newest first
+    """
+    return [profile.summary() for profile in _matching(route)]
+
+@router.get("/profiles/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_profiles(
+    route: Optional[str] = Query(None, description=ROUTE_DESCRIPTION),
+    user: Dict[str, Any] = Depends(get_admin_user),
+):
+    """
+    Merge the kept profiles into collapsed stacks ("frame;frame;frame count"
+    per line), the input of flamegraph.pl, speedscope and inferno
+    """
+    return PlainTextResponse(collapsed(_matching(route)))
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_stacks(profile_id: str, user: Dict[str, Any] = Depends(get_admin_user)):
+    """
+    Collapsed stacks of one profile, by the X-Profile-Id of its response
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found or no longer kept")
+    return PlainTextResponse(collapsed([profile]))
+
+@router.get("/memory")
+async def get_memory_report(
+    group_by: str = Query("lineno", pattern=f"^({'|'.join(GROUP_BY)})$", description="How to group allocation sites"),
+    limit: int = Query(25, ge=1, le=500, description="Number of allocation sites to list"),
+    compare: bool = Query(False, description="List the sites that grew most since the previous report"),
+    user: Dict[str, Any] = Depends(get_admin_user),
+):
+    """
+    Report this worker's resident size, the deep size of its row and token
+    caches and, with MEMORY_TRACING_ENABLED, its largest allocation sites
+    """
+    return await run_in_threadpool(memory_report, group_by, limit, compare)
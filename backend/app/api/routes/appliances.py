@@ -2,17 +2,33 @@
 """
 API routes for appliances
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Dict, Any, Optional, Sequence, Union
 import logging
 
-from app.models.appliance import ApplianceCreate, ApplianceResponse, ApplianceUpdate
+from app.models.appliance import ApplianceCreate, ApplianceDetailResponse, ApplianceResponse, ApplianceUpdate
+from app.models.bulk import ByIdResponse, DeletionCounts
+from app.core.config import settings
 from app.core.dependencies import get_current_user
-from app.core.supabase import supabase
+from app.core.events import publish_change
+from app.core.listing import (
+    IDS_DESCRIPTION, INCLUDE_DESCRIPTION, INCLUDE_LIMIT_DESCRIPTION, SORT_DESCRIPTION, Include, ListQuery,
+    include_pattern, parse_ids, parse_include, sort_pattern, split_by_owner,
+)
+from app.core.serialization import serialize_list
+from app.core.database import get_db
+from app.core.replica import read_replica
+from app.core.supabase import run_query, run_write_rpc
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+SORT_FIELDS = ("name", "category", "purchase_date", "warranty_expiration_date", "created_at")
+INCLUDES = {
+    "service_records": Include("service_records", "service_records", "date", descending=True),
+    "reminders": Include("reminders", "maintenance_reminders", "due_date"),
+}
+
 @router.post("/", response_model=ApplianceResponse, status_code=status.HTTP_201_CREATED)
 async def create_appliance(appliance: ApplianceCreate, user: Dict[str, Any] = Depends(get_current_user)):
     """
@@ -21,7 +37,7 @@ async def create_appliance(appliance: ApplianceCreate, user: Dict[str, Any] = De
     try:
         # Verify that the home_profile_id belongs to the user
         logger.info(f"Creating appliance for home profile {appliance.home_profile_id}")
-        home_profile = supabase.table("home_profiles").select("*").eq("id", appliance.home_profile_id).execute()
+        home_profile = await run_query(get_db().table("home_profiles").select("*").eq("id", appliance.home_profile_id))
         
         if not home_profile.data:
             logger.warning(f"Home profile {appliance.home_profile_id} not found")
@@ -32,7 +48,7 @@ async def create_appliance(appliance: ApplianceCreate, user: Dict[str, Any] = De
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add appliances to this home profile")
         
         # Insert the appliance
-        result = supabase.table("appliances").insert({
+        result = await run_query(get_db().table("appliances").insert({
             "name": appliance.name,
             "category": appliance.category,
             "purchase_date": str(appliance.purchase_date),
@@ -40,10 +56,11 @@ async def create_appliance(appliance: ApplianceCreate, user: Dict[str, Any] = De
             "warranty_document": appliance.warranty_document,
             "notes": appliance.notes,
             "home_profile_id": appliance.home_profile_id
-        }).execute()
+        }), "insert")
         
         if result.data:
             logger.info(f"Appliance created with ID {result.data[0]['id']}")
+            await publish_change(user["id"], "appliances", "created", result.data[0]["id"], result.data[0])
             return result.data[0]
         else:
             logger.error("Failed to create appliance")
@@ -54,15 +71,56 @@ async def create_appliance(appliance: ApplianceCreate, user: Dict[str, Any] = De
         logger.error(f"Error creating appliance: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
-@router.get("/", response_model=List[ApplianceResponse])
-async def get_appliances(user: Dict[str, Any] = Depends(get_current_user)):
+async def _get_appliances_by_id(ids: List[str], user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch appliances by id in one query, with the owning user of each embedded
     """
-    Get all appliances for the current user's home profiles
+    rows = await read_replica.get_rows(user["id"], "appliances", ids)
+    if rows is not None:
+        return {"found": rows, "forbidden": [], "missing": []}
+    
+    result = await run_query(get_db().table("appliances").select("*, owner:home_profiles(user_id)").in_("id", ids))
+    return split_by_owner(ids, result.data, "owner", lambda owner: owner["user_id"], user["id"])
+
+@router.get("/", response_model=Union[List[ApplianceResponse], ByIdResponse[ApplianceResponse]])
+async def get_appliances(
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    category: Optional[str] = Query(None, description="Only appliances in this category"),
+    home_profile_id: Optional[str] = Query(None, description="Only appliances in this home profile"),
+    sort: Optional[str] = Query(None, pattern=sort_pattern(SORT_FIELDS), description=SORT_DESCRIPTION),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get the appliances in the current user's home profiles, optionally
+    filtered and sorted
+
+    With `ids`, fetch those appliances instead, reporting the ids that belong
+    to other users or do not exist
     """
     try:
+        if ids is not None:
+            logger.info(f"Fetching appliances by id for user {user['id']}")
+            return await _get_appliances_by_id(parse_ids(ids), user)
+        
+        listing = (
+            ListQuery()
+            .where("category", "eq", category)
+            .where("home_profile_id", "eq", home_profile_id)
+            .sort(sort)
+        )
+        
         # Get all home profiles for the user
         logger.info(f"Fetching appliances for user {user['id']}")
-        home_profiles = supabase.table("home_profiles").select("id").eq("user_id", user["id"]).execute()
+        rows = await read_replica.list_rows(user["id"], "appliances")
+        if rows is not None:
+            return serialize_list(listing.apply_rows(rows), ApplianceResponse)
+        
+        if settings.USE_DB_RPC:
+            # Single round trip: ownership join runs inside the database
+            result = await run_query(listing.apply(get_db().rpc("get_user_appliances", {"p_user_id": user["id"]}), order=False))
+            return serialize_list(listing.sort_rows(result.data), ApplianceResponse)
+        
+        home_profiles = await run_query(get_db().table("home_profiles").select("id").eq("user_id", user["id"]))
         
         if not home_profiles.data:
             logger.info(f"No home profiles found for user {user['id']}")
@@ -70,36 +128,78 @@ async def get_appliances(user: Dict[str, Any] = Depends(get_current_user)):
         
         # Get appliances for all home profiles
         home_profile_ids = [profile["id"] for profile in home_profiles.data]
-        result = supabase.table("appliances").select("*").in_("home_profile_id", home_profile_ids).execute()
+        result = await run_query(listing.apply(get_db().table("appliances").select("*").in_("home_profile_id", home_profile_ids)))
         
-        return result.data
+        return serialize_list(result.data, ApplianceResponse)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching appliances: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
-@router.get("/{appliance_id}", response_model=ApplianceResponse)
-async def get_appliance(appliance_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+async def _get_owned_appliance(
+    appliance_id: str,
+    user: Dict[str, Any],
+    includes: Sequence[str] = (),
+    limits: Optional[Dict[str, Optional[int]]] = None
+) -> Dict[str, Any]:
     """
-    Get a specific appliance by ID
+    Fetch an appliance with the requested children, raising 404 if it does not
+    exist and 403 if it belongs to another user
     """
-    try:
-        logger.info(f"Fetching appliance {appliance_id}")
-        # Get the appliance
-        appliance = supabase.table("appliances").select("*").eq("id", appliance_id).execute()
+    limits = limits or {}
+    row = await read_replica.get_row(user["id"], "appliances", appliance_id)
+    for name in includes if row is not None else ():
+        children = await read_replica.list_children(user["id"], INCLUDES[name].table, appliance_id)
+        if children is None:
+            row = None
+            break
+        row[name] = children[:limits.get(name)]
+    if row is not None:
+        return row
+    
+    # One round trip: the owning profile and the requested children are embedded in the appliance row
+    query = get_db().table("appliances").select(
+        ", ".join(["*", "owner:home_profiles(user_id)"] + [INCLUDES[name].select for name in includes])
+    ).eq("id", appliance_id)
+    for name in includes:
+        query = INCLUDES[name].apply(query, limits.get(name))
+    appliance = await run_query(query)
+    
+    if not appliance.data:
+        logger.warning(f"Appliance {appliance_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
         
-        if not appliance.data:
-            logger.warning(f"Appliance {appliance_id} not found")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
-            
-        # Verify that the appliance belongs to a home profile owned by the user
-        home_profile_id = appliance.data[0]["home_profile_id"]
-        home_profile = supabase.table("home_profiles").select("user_id").eq("id", home_profile_id).execute()
+    # Verify that the appliance belongs to a home profile owned by the user
+    row = appliance.data[0]
+    owner = row.get("owner")
+    
+    if not owner or owner["user_id"] != user["id"]:
+        logger.warning(f"User {user['id']} attempted to access appliance {appliance_id} belonging to another user")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this appliance")
         
-        if not home_profile.data or home_profile.data[0]["user_id"] != user["id"]:
-            logger.warning(f"User {user['id']} attempted to access appliance {appliance_id} belonging to another user")
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this appliance")
-            
-        return appliance.data[0]
+    # A new dict: the result may also be held by the stale read cache
+    return {key: value for key, value in row.items() if key != "owner"}
+
+@router.get("/{appliance_id}", response_model=ApplianceDetailResponse)
+async def get_appliance(
+    appliance_id: str,
+    include: Optional[str] = Query(None, pattern=include_pattern(list(INCLUDES)), description=INCLUDE_DESCRIPTION),
+    service_records_limit: Optional[int] = Query(
+        None, ge=1, le=1000, description=INCLUDE_LIMIT_DESCRIPTION.format(name="service records")
+    ),
+    reminders_limit: Optional[int] = Query(None, ge=1, le=1000, description=INCLUDE_LIMIT_DESCRIPTION.format(name="reminders")),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get a specific appliance by ID, optionally with its service records
+    (newest first) and reminders (soonest due first)
+    """
+    try:
+        logger.info(f"Fetching appliance {appliance_id}")
+        includes = parse_include(include)
+        limits = {"service_records": service_records_limit, "reminders": reminders_limit}
+        return await _get_owned_appliance(appliance_id, user, includes, limits)
     except HTTPException:
         raise
     except Exception as e:
@@ -118,11 +218,11 @@ async def update_appliance(
     try:
         logger.info(f"Updating appliance {appliance_id}")
         # Check if appliance exists and belongs to the user
-        appliance_check = await get_appliance(appliance_id, user)
+        appliance_check = await _get_owned_appliance(appliance_id, user)
         
         # If home_profile_id is being updated, check if the new home profile belongs to the user
         if appliance_update.home_profile_id:
-            home_profile = supabase.table("home_profiles").select("user_id").eq("id", appliance_update.home_profile_id).execute()
+            home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", appliance_update.home_profile_id))
             
             if not home_profile.data:
                 logger.warning(f"Home profile {appliance_update.home_profile_id} not found")
@@ -144,10 +244,11 @@ async def update_appliance(
         if not update_data:
             return appliance_check
             
-        result = supabase.table("appliances").update(update_data).eq("id", appliance_id).execute()
+        result = await run_query(get_db().table("appliances").update(update_data).eq("id", appliance_id), "update")
         
         if result.data:
             logger.info(f"Appliance {appliance_id} updated successfully")
+            await publish_change(user["id"], "appliances", "updated", appliance_id, result.data[0])
             return result.data[0]
         else:
             logger.error(f"Failed to update appliance {appliance_id}")
@@ -166,13 +267,14 @@ async def delete_appliance(appliance_id: str, user: Dict[str, Any] = Depends(get
     try:
         logger.info(f"Deleting appliance {appliance_id}")
         # Check if appliance exists and belongs to the user
-        await get_appliance(appliance_id, user)
+        await _get_owned_appliance(appliance_id, user)
         
         # Delete the appliance
-        result = supabase.table("appliances").delete().eq("id", appliance_id).execute()
+        result = await run_query(get_db().table("appliances").delete().eq("id", appliance_id), "delete")
         
         if result.data:
             logger.info(f"Appliance {appliance_id} deleted successfully")
+            await publish_change(user["id"], "appliances", "deleted", appliance_id)
             return None
         else:
             logger.error(f"Failed to delete appliance {appliance_id}")
@@ -182,3 +284,23 @@ async def delete_appliance(appliance_id: str, user: Dict[str, Any] = Depends(get
     except Exception as e:
         logger.error(f"Error deleting appliance {appliance_id}: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.delete("/{appliance_id}/cascade", response_model=DeletionCounts)
+async def delete_appliance_cascade(appliance_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Delete an appliance with its service records and reminders in one
+    transaction, returning the number of rows deleted per table
+    """
+    try:
+        logger.info(f"Deleting appliance {appliance_id} with its history")
+        counts = await run_write_rpc(
+            "delete_appliance_cascade", {"p_user_id": user["id"], "p_appliance_id": appliance_id}
+        )
+        logger.info(f"Appliance {appliance_id} deleted: {counts}")
+        await publish_change(user["id"], "appliances", "deleted", appliance_id)
+        return counts
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting appliance {appliance_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -0,0 +1,68 @@
+"""
+API routes for server-sent change notifications
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.dependencies import get_current_user, get_stream_user
+from app.core.events import RESYNC, format_sse, get_event_bus
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/ticket")
+async def create_stream_ticket(user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Issue a single-use ticket for opening an event stream
+
+    Pass it as `GET /events/stream?ticket=...` within `expires_in` seconds.
+    """
+    ticket = await get_event_bus().issue_ticket(user, settings.EVENTS_TICKET_TTL_SECONDS)
+    return {"ticket": ticket, "expires_in": settings.EVENTS_TICKET_TTL_SECONDS}
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_events(user: Dict[str, Any] = Depends(get_stream_user)):
+    """
+    Stream the current user's changes to home profiles, appliances, service
+    records and reminders as server-sent events
+
+    Each event's data is JSON with `type` (e.g. "appliances.updated"),
+    `resource`, `action`, `record_id`, `data` and `at`. A `resync` event means
+    events were missed and the client should refetch. Browsers' EventSource
+    cannot set headers, so it may authenticate with `?ticket=` from
+    `POST /events/ticket` instead.
+    """
+    bus = get_event_bus()
+    if bus.subscriber_count(user["id"]) >= settings.EVENTS_MAX_STREAMS_PER_USER:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many open event streams")
+
+    subscription = await bus.subscribe(user["id"])
+    logger.info(f"Event stream opened for user {user['id']}")
+
+    async def events():
+        try:
+            yield b"retry: %d\n\n" % (settings.EVENTS_RETRY_MS,)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield b": ping\n\n"
+                    continue
+                if event["type"] == RESYNC:
+                    yield b"event: resync\ndata: {}\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            bus.unsubscribe(subscription)
+            logger.info(f"Event stream closed for user {user['id']}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,44 @@
+"""
+API routes for health checks
+"""
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from typing import Optional
+
+from app.core.dependencies import get_admin_user, get_current_user, optional_security
+from app.core.health import health_monitor
+
+router = APIRouter()
+
+NO_STORE = {"Cache-Control": "no-store"}
+
+@router.get("/live")
+async def live():
+    """
+    Liveness probe for container healthchecks
+
+    Touches no upstream service, so it stays cheap and answers as long as the
+    worker's event loop is responsive.
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready(
+    verbose: bool = Query(False, description="Include pool, cache and circuit breaker stats (administrators only)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    """
+    Readiness probe: 200 when the last background probes of the database and
+    auth service succeeded, otherwise 503
+
+    Only reads cached probe results and stats; never calls upstream services
+    itself. Verbose output exposes internal state and requires an
+    ADMIN_USER_IDS user.
+    """
+    snapshot = health_monitor.snapshot()
+    if verbose:
+        await get_admin_user(await get_current_user(credentials))
+        snapshot["stats"] = health_monitor.stats()
+    status_code = status.HTTP_200_OK if snapshot["status"] == "ready" else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(snapshot, status_code=status_code, headers=NO_STORE)
@@ -2,17 +2,53 @@
 """
 API routes for home profiles
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Dict, Any, Optional, Sequence
 import logging
 
-from app.models.home_profile import HomeProfileCreate, HomeProfileResponse, HomeProfileUpdate
+from app.models.bulk import DeletionCounts, MoveAppliancesRequest, MoveAppliancesResponse
+from app.models.home_profile import HomeProfileCreate, HomeProfileDetailResponse, HomeProfileResponse, HomeProfileUpdate
 from app.core.dependencies import get_current_user
-from app.core.supabase import supabase
+from app.core.events import publish_change
+from app.core.listing import INCLUDE_DESCRIPTION, INCLUDE_LIMIT_DESCRIPTION, Include, include_pattern, parse_include
+from app.core.serialization import serialize_list
+from app.core.database import get_db
+from app.core.replica import read_replica
+from app.core.supabase import run_query, run_write_rpc
+from app.core.thumbnails import processed_digests, thumbnail_urls
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+INCLUDES = {"appliances": Include("appliances", "appliances", "created_at")}
+
+async def _with_thumbnails(profiles: List[Dict[str, Any]], user: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Add thumbnail URLs, keyed by image path, for images that have been processed
+    """
+    paths = {image for profile in profiles for image in profile.get("images") or []}
+    if not paths:
+        return profiles
+
+    uploads = await run_query(
+        get_db().table("file_uploads").select("path,checksum").eq("user_id", user["id"]).in_("path", sorted(paths))
+    )
+    digests = {upload["path"]: upload["checksum"] for upload in uploads.data if upload.get("checksum")}
+    # Each check stats a file per size, so they run off the event loop together
+    processed = await processed_digests(digests.values())
+
+    return [
+        {
+            **profile,
+            "thumbnails": {
+                image: thumbnail_urls(digests[image])
+                for image in profile.get("images") or []
+                if digests.get(image) in processed
+            },
+        }
+        for profile in profiles
+    ]
+
 @router.post("/", response_model=HomeProfileResponse, status_code=status.HTTP_201_CREATED)
 async def create_home_profile(home_profile: HomeProfileCreate, user: Dict[str, Any] = Depends(get_current_user)):
     """
@@ -20,55 +56,106 @@ async def create_home_profile(home_profile: HomeProfileCreate, user: Dict[str, A
     """
     try:
         logger.info(f"Creating home profile for user {user['id']}")
-        result = supabase.table("home_profiles").insert({
+        result = await run_query(get_db().table("home_profiles").insert({
             "address": home_profile.address,
             "construction_year": home_profile.construction_year,
             "images": home_profile.images,
             "user_id": user["id"]
-        }).execute()
+        }), "insert")
         
         if result.data:
             logger.info(f"Home profile created with ID {result.data[0]['id']}")
+            await publish_change(user["id"], "home_profiles", "created", result.data[0]["id"], result.data[0])
             return result.data[0]
         else:
             logger.error("Failed to create home profile")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create home profile")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating home profile: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
 @router.get("/", response_model=List[HomeProfileResponse])
-async def get_home_profiles(user: Dict[str, Any] = Depends(get_current_user)):
+async def get_home_profiles(
+    include_thumbnails: bool = Query(False, description="Include thumbnail URLs for processed images"),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
     """
     Get all home profiles for the current user
     """
     try:
         logger.info(f"Fetching home profiles for user {user['id']}")
-        result = supabase.table("home_profiles").select("*").eq("user_id", user["id"]).execute()
-        return result.data
+        rows = await read_replica.list_rows(user["id"], "home_profiles")
+        if rows is None:
+            rows = (await run_query(get_db().table("home_profiles").select("*").eq("user_id", user["id"]))).data
+        if include_thumbnails:
+            return serialize_list(await _with_thumbnails(rows, user), HomeProfileResponse)
+        return serialize_list(rows, HomeProfileResponse)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching home profiles: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
-@router.get("/{profile_id}", response_model=HomeProfileResponse)
-async def get_home_profile(profile_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+async def _get_owned_home_profile(
+    profile_id: str,
+    user: Dict[str, Any],
+    includes: Sequence[str] = (),
+    limits: Optional[Dict[str, Optional[int]]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch a home profile with the requested children, raising 404 if it does
+    not exist and 403 if it belongs to another user
+    """
+    limits = limits or {}
+    profile = await read_replica.get_row(user["id"], "home_profiles", profile_id)
+    for name in includes if profile is not None else ():
+        children = await read_replica.list_children(user["id"], INCLUDES[name].table, profile_id)
+        if children is None:
+            profile = None
+            break
+        profile[name] = children[:limits.get(name)]
+    if profile is not None:
+        return profile
+    
+    # The requested children are embedded, so this stays one round trip
+    query = get_db().table("home_profiles").select(
+        ", ".join(["*"] + [INCLUDES[name].select for name in includes])
+    ).eq("id", profile_id)
+    for name in includes:
+        query = INCLUDES[name].apply(query, limits.get(name))
+    result = await run_query(query)
+    
+    if not result.data:
+        logger.warning(f"Home profile {profile_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Home profile not found")
+    
+    # Check if the profile belongs to the user
+    if result.data[0]["user_id"] != user["id"]:
+        logger.warning(f"User {user['id']} attempted to access profile {profile_id} belonging to another user")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this profile")
+    return result.data[0]
+
+@router.get("/{profile_id}", response_model=HomeProfileDetailResponse)
+async def get_home_profile(
+    profile_id: str,
+    include_thumbnails: bool = Query(False, description="Include thumbnail URLs for processed images"),
+    include: Optional[str] = Query(None, pattern=include_pattern(list(INCLUDES)), description=INCLUDE_DESCRIPTION),
+    appliances_limit: Optional[int] = Query(None, ge=1, le=1000, description=INCLUDE_LIMIT_DESCRIPTION.format(name="appliances")),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
     """
-    Get a specific home profile by ID
+    Get a specific home profile by ID, optionally with its appliances
     """
     try:
         logger.info(f"Fetching home profile {profile_id} for user {user['id']}")
-        result = supabase.table("home_profiles").select("*").eq("id", profile_id).execute()
-        
-        if not result.data:
-            logger.warning(f"Home profile {profile_id} not found")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Home profile not found")
+        includes = parse_include(include)
+        profile = await _get_owned_home_profile(profile_id, user, includes, {"appliances": appliances_limit})
         
-        # Check if the profile belongs to the user
-        if result.data[0]["user_id"] != user["id"]:
-            logger.warning(f"User {user['id']} attempted to access profile {profile_id} belonging to another user")
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this profile")
-        
-        return result.data[0]
+        if include_thumbnails:
+            return (await _with_thumbnails([profile], user))[0]
+        return profile
     except HTTPException:
         raise
     except Exception as e:
@@ -87,7 +174,7 @@ async def update_home_profile(
     try:
         # First check if profile exists and belongs to user
         logger.info(f"Updating home profile {profile_id} for user {user['id']}")
-        profile_check = supabase.table("home_profiles").select("user_id").eq("id", profile_id).execute()
+        profile_check = await run_query(get_db().table("home_profiles").select("user_id").eq("id", profile_id))
         
         if not profile_check.data:
             logger.warning(f"Home profile {profile_id} not found")
@@ -100,12 +187,13 @@ async def update_home_profile(
         # Update the profile
         update_data = {k: v for k, v in profile_update.model_dump().items() if v is not None}
         if not update_data:
-            return await get_home_profile(profile_id, user)
+            return await _get_owned_home_profile(profile_id, user)
             
-        result = supabase.table("home_profiles").update(update_data).eq("id", profile_id).execute()
+        result = await run_query(get_db().table("home_profiles").update(update_data).eq("id", profile_id), "update")
         
         if result.data:
             logger.info(f"Home profile {profile_id} updated successfully")
+            await publish_change(user["id"], "home_profiles", "updated", profile_id, result.data[0])
             return result.data[0]
         else:
             logger.error(f"Failed to update home profile {profile_id}")
@@ -124,7 +212,7 @@ async def delete_home_profile(profile_id: str, user: Dict[str, Any] = Depends(ge
     try:
         # First check if profile exists and belongs to user
         logger.info(f"Deleting home profile {profile_id} for user {user['id']}")
-        profile_check = supabase.table("home_profiles").select("user_id").eq("id", profile_id).execute()
+        profile_check = await run_query(get_db().table("home_profiles").select("user_id").eq("id", profile_id))
         
         if not profile_check.data:
             logger.warning(f"Home profile {profile_id} not found")
@@ -135,10 +223,11 @@ async def delete_home_profile(profile_id: str, user: Dict[str, Any] = Depends(ge
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this profile")
         
         # Delete the profile
-        result = supabase.table("home_profiles").delete().eq("id", profile_id).execute()
+        result = await run_query(get_db().table("home_profiles").delete().eq("id", profile_id), "delete")
         
         if result.data:
             logger.info(f"Home profile {profile_id} deleted successfully")
+            await publish_change(user["id"], "home_profiles", "deleted", profile_id)
             return None
         else:
             logger.error(f"Failed to delete home profile {profile_id}")
@@ -148,3 +237,55 @@ async def delete_home_profile(profile_id: str, user: Dict[str, Any] = Depends(ge
     except Exception as e:
         logger.error(f"Error deleting home profile {profile_id}: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.delete("/{profile_id}/cascade", response_model=DeletionCounts)
+async def delete_home_profile_cascade(profile_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Delete a home profile with all its appliances, service records and reminders
+    in one transaction, returning the number of rows deleted per table
+    """
+    try:
+        logger.info(f"Deleting home profile {profile_id} with its history for user {user['id']}")
+        counts = await run_write_rpc(
+            "delete_home_profile_cascade", {"p_user_id": user["id"], "p_home_profile_id": profile_id}
+        )
+        logger.info(f"Home profile {profile_id} deleted: {counts}")
+        await publish_change(user["id"], "home_profiles", "deleted", profile_id)
+        return counts
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting home profile {profile_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.post("/{profile_id}/move_appliances", response_model=MoveAppliancesResponse)
+async def move_appliances(
+    profile_id: str,
+    move: MoveAppliancesRequest,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Move appliances (all, or those in `appliance_ids`) from this home profile to
+    another of the user's profiles in one transaction; their service records
+    and reminders follow them
+    """
+    try:
+        logger.info(f"Moving appliances from home profile {profile_id} to {move.to_home_profile_id}")
+        result = await run_write_rpc("move_appliances", {
+            "p_user_id": user["id"],
+            "p_from_home_profile_id": profile_id,
+            "p_to_home_profile_id": move.to_home_profile_id,
+            "p_appliance_ids": move.appliance_ids,
+        })
+        logger.info(f"Moved {result['moved']} appliances from home profile {profile_id}")
+        for appliance_id in result["appliance_ids"]:
+            await publish_change(user["id"], "appliances", "moved", appliance_id, {
+                "from_home_profile_id": profile_id,
+                "to_home_profile_id": move.to_home_profile_id,
+            })
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error moving appliances from home profile {profile_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -0,0 +1,90 @@
+"""
+Routes backing the local object storage stand-in
+
+Only mounted when FILE_STORAGE_BACKEND is "local". Access is granted by the
+signed token in the URL, exactly like a presigned Supabase Storage URL.
+"""
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pathlib import Path
+from typing import Dict
+import hashlib
+import json
+import logging
+import os
+
+from app.core.storage import LocalObjectStorage, get_object_storage, verify_local_token
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+def _discard(output, partial_path: Path):
+    output.close()
+    os.remove(partial_path)
+
+def _commit(partial_path: Path, file_path: Path, meta_path: Path, meta: Dict[str, str]):
+    os.replace(partial_path, file_path)
+    meta_path.write_text(json.dumps(meta))
+
+def _local_storage() -> LocalObjectStorage:
+    storage = get_object_storage()
+    if not isinstance(storage, LocalObjectStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return storage
+
+@router.put("/{token}", status_code=status.HTTP_200_OK)
+async def put_object(token: str, request: Request):
+    """
+    Receive an upload, streaming it to disk
+    """
+    storage = _local_storage()
+    payload = verify_local_token(token, "PUT")
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired upload URL")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != payload["ct"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Content type does not match upload URL")
+
+    file_path = storage.file_path(payload["p"])
+    partial_path = file_path.with_name(file_path.name + ".partial")
+    await run_in_threadpool(file_path.parent.mkdir, parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    output = await run_in_threadpool(open, partial_path, "wb")
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > payload["max"]:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Upload too large")
+            digest.update(chunk)
+            await run_in_threadpool(output.write, chunk)
+    except BaseException:
+        await run_in_threadpool(_discard, output, partial_path)
+        raise
+    await run_in_threadpool(output.close)
+
+    meta = {"content_type": content_type, "sha256": digest.hexdigest()}
+    await run_in_threadpool(_commit, partial_path, file_path, storage.meta_path(file_path), meta)
+    logger.info(f"Stored {size} bytes at {payload['p']}")
+    return {"size": size, "sha256": meta["sha256"]}
+
+@router.get("/{token}")
+async def get_object(token: str):
+    """
+    Serve a stored file
+    """
+    storage = _local_storage()
+    payload = verify_local_token(token, "GET")
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired download URL")
+
+    info = await storage.stat(payload["p"])
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Object not found")
+
+    return FileResponse(storage.file_path(payload["p"]), media_type=info.content_type)
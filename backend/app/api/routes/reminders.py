@@ -2,17 +2,29 @@
 """
 API routes for maintenance reminders
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Dict, Any, Optional, Union
+from datetime import date
 import logging
 
+from app.models.bulk import ByIdResponse
 from app.models.reminder import ReminderCreate, ReminderResponse, ReminderUpdate
+from app.core.config import settings
 from app.core.dependencies import get_current_user
-from app.core.supabase import supabase
+from app.core.events import publish_change
+from app.core.listing import (
+    IDS_DESCRIPTION, SORT_DESCRIPTION, ListQuery, check_range, parse_ids, sort_pattern, split_by_owner,
+)
+from app.core.serialization import serialize_list
+from app.core.database import get_db
+from app.core.replica import read_replica
+from app.core.supabase import run_query
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+SORT_FIELDS = ("due_date", "title", "completed", "created_at")
+
 @router.post("/", response_model=ReminderResponse, status_code=status.HTTP_201_CREATED)
 async def create_reminder(reminder: ReminderCreate, user: Dict[str, Any] = Depends(get_current_user)):
     """
@@ -21,20 +33,20 @@ async def create_reminder(reminder: ReminderCreate, user: Dict[str, Any] = Depen
     try:
         logger.info(f"Creating reminder for appliance {reminder.appliance_id}")
         # Verify that the appliance belongs to the user
-        appliance = supabase.table("appliances").select("home_profile_id").eq("id", reminder.appliance_id).execute()
+        appliance = await run_query(get_db().table("appliances").select("home_profile_id").eq("id", reminder.appliance_id))
         
         if not appliance.data:
             logger.warning(f"Appliance {reminder.appliance_id} not found")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
         
-        home_profile = supabase.table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]).execute()
+        home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]))
         
         if not home_profile.data or home_profile.data[0]["user_id"] != user["id"]:
             logger.warning(f"User {user['id']} attempted to add reminder to appliance {reminder.appliance_id} belonging to another user")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add reminders to this appliance")
         
         # Insert the reminder
-        result = supabase.table("maintenance_reminders").insert({
+        result = await run_query(get_db().table("maintenance_reminders").insert({
             "appliance_id": reminder.appliance_id,
             "title": reminder.title,
             "description": reminder.description,
@@ -42,10 +54,11 @@ async def create_reminder(reminder: ReminderCreate, user: Dict[str, Any] = Depen
             "recurring": reminder.recurring,
             "recurrence_pattern": reminder.recurrence_pattern,
             "completed": reminder.completed
-        }).execute()
+        }), "insert")
         
         if result.data:
             logger.info(f"Reminder created with ID {result.data[0]['id']}")
+            await publish_change(user["id"], "maintenance_reminders", "created", result.data[0]["id"], result.data[0])
             return result.data[0]
         else:
             logger.error("Failed to create reminder")
@@ -56,15 +69,59 @@ async def create_reminder(reminder: ReminderCreate, user: Dict[str, Any] = Depen
         logger.error(f"Error creating reminder: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
-@router.get("/", response_model=List[ReminderResponse])
-async def get_reminders(user: Dict[str, Any] = Depends(get_current_user)):
+async def _get_reminders_by_id(ids: List[str], user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch reminders by id in one query, with the owning user of each embedded
     """
-    Get all reminders for the current user's appliances
+    rows = await read_replica.get_rows(user["id"], "maintenance_reminders", ids)
+    if rows is not None:
+        return {"found": rows, "forbidden": [], "missing": []}
+    
+    result = await run_query(get_db().table("maintenance_reminders").select("*, appliance:appliances(owner:home_profiles(user_id))").in_("id", ids))
+    return split_by_owner(ids, result.data, "appliance", lambda appliance: appliance["owner"]["user_id"], user["id"])
+
+@router.get("/", response_model=Union[List[ReminderResponse], ByIdResponse[ReminderResponse]])
+async def get_reminders(
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    completed: Optional[bool] = Query(None, description="Only completed (true) or open (false) reminders"),
+    due_from: Optional[date] = Query(None, description="Only reminders due on or after this date"),
+    due_to: Optional[date] = Query(None, description="Only reminders due on or before this date"),
+    sort: Optional[str] = Query(None, pattern=sort_pattern(SORT_FIELDS), description=SORT_DESCRIPTION),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get the reminders for the current user's appliances, optionally filtered
+    and sorted
+
+    With `ids`, fetch those reminders instead, reporting the ids that belong
+    to other users or do not exist
     """
     try:
+        if ids is not None:
+            logger.info(f"Fetching reminders by id for user {user['id']}")
+            return await _get_reminders_by_id(parse_ids(ids), user)
+        
+        check_range(due_from, due_to, "due_from", "due_to")
+        listing = (
+            ListQuery()
+            .where("completed", "eq", completed)
+            .where("due_date", "gte", due_from)
+            .where("due_date", "lte", due_to)
+            .sort(sort)
+        )
+        
         logger.info(f"Fetching reminders for user {user['id']}")
+        rows = await read_replica.list_rows(user["id"], "maintenance_reminders")
+        if rows is not None:
+            return serialize_list(listing.apply_rows(rows), ReminderResponse)
+        
+        if settings.USE_DB_RPC:
+            # Single round trip: ownership join runs inside the database
+            result = await run_query(listing.apply(get_db().rpc("get_user_reminders", {"p_user_id": user["id"]}), order=False))
+            return serialize_list(listing.sort_rows(result.data), ReminderResponse)
+        
         # Get all home profiles for the user
-        home_profiles = supabase.table("home_profiles").select("id").eq("user_id", user["id"]).execute()
+        home_profiles = await run_query(get_db().table("home_profiles").select("id").eq("user_id", user["id"]))
         
         if not home_profiles.data:
             logger.info(f"No home profiles found for user {user['id']}")
@@ -72,7 +129,7 @@ async def get_reminders(user: Dict[str, Any] = Depends(get_current_user)):
         
         # Get appliances for all home profiles
         home_profile_ids = [profile["id"] for profile in home_profiles.data]
-        appliances = supabase.table("appliances").select("id").in_("home_profile_id", home_profile_ids).execute()
+        appliances = await run_query(get_db().table("appliances").select("id").in_("home_profile_id", home_profile_ids))
         
         if not appliances.data:
             logger.info(f"No appliances found for user {user['id']}")
@@ -80,9 +137,11 @@ async def get_reminders(user: Dict[str, Any] = Depends(get_current_user)):
         
         # Get reminders for all appliances
         appliance_ids = [appliance["id"] for appliance in appliances.data]
-        result = supabase.table("maintenance_reminders").select("*").in_("appliance_id", appliance_ids).execute()
+        result = await run_query(listing.apply(get_db().table("maintenance_reminders").select("*").in_("appliance_id", appliance_ids)))
         
-        return result.data
+        return serialize_list(result.data, ReminderResponse)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching reminders: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -94,8 +153,12 @@ async def get_reminder(reminder_id: str, user: Dict[str, Any] = Depends(get_curr
     """
     try:
         logger.info(f"Fetching reminder {reminder_id}")
+        row = await read_replica.get_row(user["id"], "maintenance_reminders", reminder_id)
+        if row is not None:
+            return row
+        
         # Get the reminder
-        reminder = supabase.table("maintenance_reminders").select("*").eq("id", reminder_id).execute()
+        reminder = await run_query(get_db().table("maintenance_reminders").select("*").eq("id", reminder_id))
         
         if not reminder.data:
             logger.warning(f"Reminder {reminder_id} not found")
@@ -103,13 +166,13 @@ async def get_reminder(reminder_id: str, user: Dict[str, Any] = Depends(get_curr
             
         # Verify that the reminder belongs to an appliance owned by the user
         appliance_id = reminder.data[0]["appliance_id"]
-        appliance = supabase.table("appliances").select("home_profile_id").eq("id", appliance_id).execute()
+        appliance = await run_query(get_db().table("appliances").select("home_profile_id").eq("id", appliance_id))
         
         if not appliance.data:
             logger.warning(f"Appliance {appliance_id} not found")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
             
-        home_profile = supabase.table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]).execute()
+        home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]))
         
         if not home_profile.data or home_profile.data[0]["user_id"] != user["id"]:
             logger.warning(f"User {user['id']} attempted to access reminder {reminder_id} belonging to another user")
@@ -146,10 +209,11 @@ async def update_reminder(
         if not update_data:
             return await get_reminder(reminder_id, user)
             
-        result = supabase.table("maintenance_reminders").update(update_data).eq("id", reminder_id).execute()
+        result = await run_query(get_db().table("maintenance_reminders").update(update_data).eq("id", reminder_id), "update")
         
         if result.data:
             logger.info(f"Reminder {reminder_id} updated successfully")
+            await publish_change(user["id"], "maintenance_reminders", "updated", reminder_id, result.data[0])
             return result.data[0]
         else:
             logger.error(f"Failed to update reminder {reminder_id}")
@@ -171,10 +235,11 @@ async def mark_reminder_complete(reminder_id: str, user: Dict[str, Any] = Depend
         await get_reminder(reminder_id, user)
         
         # Update the reminder
-        result = supabase.table("maintenance_reminders").update({"completed": True}).eq("id", reminder_id).execute()
+        result = await run_query(get_db().table("maintenance_reminders").update({"completed": True}).eq("id", reminder_id), "update")
         
         if result.data:
             logger.info(f"Reminder {reminder_id} marked as complete")
+            await publish_change(user["id"], "maintenance_reminders", "updated", reminder_id, result.data[0])
             return result.data[0]
         else:
             logger.error(f"Failed to update reminder {reminder_id}")
@@ -196,10 +261,11 @@ async def delete_reminder(reminder_id: str, user: Dict[str, Any] = Depends(get_c
         await get_reminder(reminder_id, user)
         
         # Delete the reminder
-        result = supabase.table("maintenance_reminders").delete().eq("id", reminder_id).execute()
+        result = await run_query(get_db().table("maintenance_reminders").delete().eq("id", reminder_id), "delete")
         
         if result.data:
             logger.info(f"Reminder {reminder_id} deleted successfully")
+            await publish_change(user["id"], "maintenance_reminders", "deleted", reminder_id)
             return None
         else:
             logger.error(f"Failed to delete reminder {reminder_id}")
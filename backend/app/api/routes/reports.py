@@ -0,0 +1,127 @@
+"""
+API routes for appliance lifecycle and cost reports
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from typing import Dict, Any
+import logging
+
+from app.models.report import ReportCreate, ReportJobResponse
+from app.core.dependencies import get_current_user
+from app.core.jobs import JobQueueFull, job_runner
+from app.core.reports import REPORT_MEDIA_TYPES, expire_if_stale, report_path, update_job
+from app.core.database import get_db
+from app.core.supabase import run_query
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+async def _get_owned_job(job_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    result = await run_query(get_db().table("report_jobs").select("*").eq("id", job_id))
+
+    if not result.data:
+        logger.warning(f"Report job {job_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report not found")
+
+    if result.data[0]["user_id"] != user["id"]:
+        logger.warning(f"User {user['id']} attempted to access report job {job_id} belonging to another user")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this report")
+
+    return await expire_if_stale(result.data[0])
+
+@router.post("/", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_report(report: ReportCreate, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Queue a lifecycle and total-cost-of-ownership report for a home profile;
+    poll the returned job (or listen for report_jobs.updated events) until it
+    has succeeded, then download it
+    """
+    try:
+        home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", report.home_profile_id))
+
+        if not home_profile.data:
+            logger.warning(f"Home profile {report.home_profile_id} not found")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Home profile not found")
+
+        if home_profile.data[0]["user_id"] != user["id"]:
+            logger.warning(f"User {user['id']} attempted to report on home profile {report.home_profile_id} belonging to another user")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this home profile")
+
+        result = await run_query(get_db().table("report_jobs").insert({
+            "user_id": user["id"],
+            "home_profile_id": report.home_profile_id,
+            "format": report.format.value,
+            "status": "queued"
+        }), "insert")
+
+        if not result.data:
+            logger.error("Failed to create report job")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create report")
+
+        job = result.data[0]
+        try:
+            await job_runner.enqueue("reports.generate", {
+                "id": job["id"],
+                "user_id": user["id"],
+                "home_profile_id": report.home_profile_id,
+                "format": report.format.value
+            })
+        except JobQueueFull:
+            await update_job(job["id"], {"status": "failed", "error": "Report queue is full"})
+            logger.warning(f"Job queue full, rejected report job {job['id']}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many reports are being generated, try again shortly",
+                headers={"Retry-After": "30"},
+            )
+
+        logger.info(f"Queued {report.format.value} report job {job['id']} for home profile {report.home_profile_id}")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating report: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.get("/{job_id}", response_model=ReportJobResponse)
+async def get_report(job_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Get the status of a report job
+    """
+    try:
+        return await _get_owned_job(job_id, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching report job {job_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.get("/{job_id}/download", response_class=FileResponse)
+async def download_report(job_id: str, request: Request, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Download a finished report
+    """
+    try:
+        job = await _get_owned_job(job_id, user)
+
+        if job["status"] != "succeeded":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Report is {job['status']}")
+
+        etag = f'"{job["data_hash"][:32]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        path = report_path(job["data_hash"], job["format"])
+        if not path.exists():
+            # Rendered by a worker on another host, or evicted from the cache
+            logger.warning(f"Report file for job {job_id} is missing")
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Report file is no longer available, request a new report")
+
+        filename = f"home-report-{job['created_at'][:10]}.{job['format']}"
+        return FileResponse(path, media_type=REPORT_MEDIA_TYPES[job["format"]], filename=filename, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error downloading report job {job_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -2,17 +2,29 @@
 """
 API routes for service records
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Dict, Any, Optional, Union
+from datetime import date
 import logging
 
+from app.models.bulk import ByIdResponse
 from app.models.service_record import ServiceRecordCreate, ServiceRecordResponse, ServiceRecordUpdate
+from app.core.config import settings
 from app.core.dependencies import get_current_user
-from app.core.supabase import supabase
+from app.core.events import publish_change
+from app.core.listing import (
+    IDS_DESCRIPTION, SORT_DESCRIPTION, ListQuery, check_range, parse_ids, sort_pattern, split_by_owner,
+)
+from app.core.serialization import serialize_list
+from app.core.database import get_db
+from app.core.replica import read_replica
+from app.core.supabase import run_query
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+SORT_FIELDS = ("date", "cost", "service_type", "provider_name", "created_at")
+
 @router.post("/", response_model=ServiceRecordResponse, status_code=status.HTTP_201_CREATED)
 async def create_service_record(service_record: ServiceRecordCreate, user: Dict[str, Any] = Depends(get_current_user)):
     """
@@ -21,20 +33,20 @@ async def create_service_record(service_record: ServiceRecordCreate, user: Dict[
     try:
         logger.info(f"Creating service record for appliance {service_record.appliance_id}")
         # Verify that the appliance belongs to the user
-        appliance = supabase.table("appliances").select("home_profile_id").eq("id", service_record.appliance_id).execute()
+        appliance = await run_query(get_db().table("appliances").select("home_profile_id").eq("id", service_record.appliance_id))
         
         if not appliance.data:
             logger.warning(f"Appliance {service_record.appliance_id} not found")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
         
-        home_profile = supabase.table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]).execute()
+        home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]))
         
         if not home_profile.data or home_profile.data[0]["user_id"] != user["id"]:
             logger.warning(f"User {user['id']} attempted to add service record to appliance {service_record.appliance_id} belonging to another user")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add service records to this appliance")
         
         # Insert the service record
-        result = supabase.table("service_records").insert({
+        result = await run_query(get_db().table("service_records").insert({
             "appliance_id": service_record.appliance_id,
             "date": str(service_record.date),
             "service_type": service_record.service_type,
@@ -43,10 +55,11 @@ async def create_service_record(service_record: ServiceRecordCreate, user: Dict[
             "cost": service_record.cost,
             "notes": service_record.notes,
             "invoice_document": service_record.invoice_document
-        }).execute()
+        }), "insert")
         
         if result.data:
             logger.info(f"Service record created with ID {result.data[0]['id']}")
+            await publish_change(user["id"], "service_records", "created", result.data[0]["id"], result.data[0])
             return result.data[0]
         else:
             logger.error("Failed to create service record")
@@ -57,15 +70,63 @@ async def create_service_record(service_record: ServiceRecordCreate, user: Dict[
         logger.error(f"Error creating service record: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
-@router.get("/", response_model=List[ServiceRecordResponse])
-async def get_service_records(user: Dict[str, Any] = Depends(get_current_user)):
+async def _get_service_records_by_id(ids: List[str], user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch service records by id in one query, with the owning user of each embedded
     """
-    Get all service records for the current user's appliances
+    rows = await read_replica.get_rows(user["id"], "service_records", ids)
+    if rows is not None:
+        return {"found": rows, "forbidden": [], "missing": []}
+    
+    result = await run_query(get_db().table("service_records").select("*, appliance:appliances(owner:home_profiles(user_id))").in_("id", ids))
+    return split_by_owner(ids, result.data, "appliance", lambda appliance: appliance["owner"]["user_id"], user["id"])
+
+@router.get("/", response_model=Union[List[ServiceRecordResponse], ByIdResponse[ServiceRecordResponse]])
+async def get_service_records(
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    appliance_id: Optional[str] = Query(None, description="Only records for this appliance"),
+    service_type: Optional[str] = Query(None, description="Only records of this service type"),
+    provider_name: Optional[str] = Query(None, description="Only records from this provider"),
+    date_from: Optional[date] = Query(None, description="Only records on or after this date"),
+    date_to: Optional[date] = Query(None, description="Only records on or before this date"),
+    sort: Optional[str] = Query(None, pattern=sort_pattern(SORT_FIELDS), description=SORT_DESCRIPTION),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get the service records for the current user's appliances, optionally
+    filtered and sorted
+
+    With `ids`, fetch those service records instead, reporting the ids that belong
+    to other users or do not exist
     """
     try:
+        if ids is not None:
+            logger.info(f"Fetching service records by id for user {user['id']}")
+            return await _get_service_records_by_id(parse_ids(ids), user)
+        
+        check_range(date_from, date_to, "date_from", "date_to")
+        listing = (
+            ListQuery()
+            .where("appliance_id", "eq", appliance_id)
+            .where("service_type", "eq", service_type)
+            .where("provider_name", "eq", provider_name)
+            .where("date", "gte", date_from)
+            .where("date", "lte", date_to)
+            .sort(sort)
+        )
+        
         logger.info(f"Fetching service records for user {user['id']}")
+        rows = await read_replica.list_rows(user["id"], "service_records")
+        if rows is not None:
+            return serialize_list(listing.apply_rows(rows), ServiceRecordResponse)
+        
+        if settings.USE_DB_RPC:
+            # Single round trip: ownership join runs inside the database
+            result = await run_query(listing.apply(get_db().rpc("get_user_service_records", {"p_user_id": user["id"]}), order=False))
+            return serialize_list(listing.sort_rows(result.data), ServiceRecordResponse)
+        
         # Get all home profiles for the user
-        home_profiles = supabase.table("home_profiles").select("id").eq("user_id", user["id"]).execute()
+        home_profiles = await run_query(get_db().table("home_profiles").select("id").eq("user_id", user["id"]))
         
         if not home_profiles.data:
             logger.info(f"No home profiles found for user {user['id']}")
@@ -73,7 +134,7 @@ async def get_service_records(user: Dict[str, Any] = Depends(get_current_user)):
         
         # Get appliances for all home profiles
         home_profile_ids = [profile["id"] for profile in home_profiles.data]
-        appliances = supabase.table("appliances").select("id").in_("home_profile_id", home_profile_ids).execute()
+        appliances = await run_query(get_db().table("appliances").select("id").in_("home_profile_id", home_profile_ids))
         
         if not appliances.data:
             logger.info(f"No appliances found for user {user['id']}")
@@ -81,9 +142,11 @@ async def get_service_records(user: Dict[str, Any] = Depends(get_current_user)):
         
         # Get service records for all appliances
         appliance_ids = [appliance["id"] for appliance in appliances.data]
-        result = supabase.table("service_records").select("*").in_("appliance_id", appliance_ids).execute()
+        result = await run_query(listing.apply(get_db().table("service_records").select("*").in_("appliance_id", appliance_ids)))
         
-        return result.data
+        return serialize_list(result.data, ServiceRecordResponse)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching service records: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -95,8 +158,12 @@ async def get_service_record(record_id: str, user: Dict[str, Any] = Depends(get_
     """
     try:
         logger.info(f"Fetching service record {record_id}")
+        row = await read_replica.get_row(user["id"], "service_records", record_id)
+        if row is not None:
+            return row
+        
         # Get the service record
-        service_record = supabase.table("service_records").select("*").eq("id", record_id).execute()
+        service_record = await run_query(get_db().table("service_records").select("*").eq("id", record_id))
         
         if not service_record.data:
             logger.warning(f"Service record {record_id} not found")
@@ -104,13 +171,13 @@ async def get_service_record(record_id: str, user: Dict[str, Any] = Depends(get_
             
         # Verify that the service record belongs to an appliance owned by the user
         appliance_id = service_record.data[0]["appliance_id"]
-        appliance = supabase.table("appliances").select("home_profile_id").eq("id", appliance_id).execute()
+        appliance = await run_query(get_db().table("appliances").select("home_profile_id").eq("id", appliance_id))
         
         if not appliance.data:
             logger.warning(f"Appliance {appliance_id} not found")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appliance not found")
             
-        home_profile = supabase.table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]).execute()
+        home_profile = await run_query(get_db().table("home_profiles").select("user_id").eq("id", appliance.data[0]["home_profile_id"]))
         
         if not home_profile.data or home_profile.data[0]["user_id"] != user["id"]:
             logger.warning(f"User {user['id']} attempted to access service record {record_id} belonging to another user")
@@ -147,10 +214,11 @@ async def update_service_record(
         if not update_data:
             return await get_service_record(record_id, user)
             
-        result = supabase.table("service_records").update(update_data).eq("id", record_id).execute()
+        result = await run_query(get_db().table("service_records").update(update_data).eq("id", record_id), "update")
         
         if result.data:
             logger.info(f"Service record {record_id} updated successfully")
+            await publish_change(user["id"], "service_records", "updated", record_id, result.data[0])
             return result.data[0]
         else:
             logger.error(f"Failed to update service record {record_id}")
@@ -172,10 +240,11 @@ async def delete_service_record(record_id: str, user: Dict[str, Any] = Depends(g
         await get_service_record(record_id, user)
         
         # Delete the service record
-        result = supabase.table("service_records").delete().eq("id", record_id).execute()
+        result = await run_query(get_db().table("service_records").delete().eq("id", record_id), "delete")
         
         if result.data:
             logger.info(f"Service record {record_id} deleted successfully")
+            await publish_change(user["id"], "service_records", "deleted", record_id)
             return None
         else:
             logger.error(f"Failed to delete service record {record_id}")
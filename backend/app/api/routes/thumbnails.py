@@ -0,0 +1,36 @@
+"""
+API routes for serving image thumbnails
+"""
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+import logging
+import re
+
+from app.core.thumbnails import THUMBNAIL_FORMAT, THUMBNAIL_MEDIA_TYPE, thumbnail_path, thumbnail_sizes
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Content-addressed thumbnails never change, so clients and CDNs may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{digest}/{filename}", response_class=FileResponse)
+async def get_thumbnail(digest: str, filename: str, request: Request):
+    """
+    Serve a thumbnail by source image digest and size
+    """
+    match = re.fullmatch(rf"(\d+)\.{THUMBNAIL_FORMAT}", filename)
+    if not re.fullmatch(r"[0-9a-f]{64}", digest) or not match or int(match.group(1)) not in thumbnail_sizes():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found")
+
+    etag = f'"{digest[:16]}-{match.group(1)}"'
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = thumbnail_path(digest, int(match.group(1)))
+    if not path.exists():
+        logger.info(f"Thumbnail {digest[:12]}/{filename} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found")
+
+    return FileResponse(path, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers)
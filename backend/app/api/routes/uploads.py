@@ -0,0 +1,225 @@
+"""
+API routes for presigned file uploads and downloads
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+import logging
+import re
+import uuid
+
+from app.models.upload import (
+    UploadCreate,
+    UploadComplete,
+    UploadKind,
+    UploadResponse,
+    UploadTicketResponse,
+    PresignedUrlResponse,
+)
+from app.core.config import settings
+from app.core.dependencies import get_current_user
+from app.core.storage import ObjectInfo, get_object_storage
+from app.core.database import get_db
+from app.core.supabase import run_query
+from app.core.thumbnails import schedule_thumbnails
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic"}
+ALLOWED_CONTENT_TYPES = {
+    UploadKind.warranty_document: IMAGE_CONTENT_TYPES | {"application/pdf"},
+    UploadKind.invoice_document: IMAGE_CONTENT_TYPES | {"application/pdf"},
+    UploadKind.home_image: IMAGE_CONTENT_TYPES,
+}
+
+def _object_path(user_id: str, kind: UploadKind, filename: str) -> str:
+    suffix = PurePosixPath(filename).suffix.lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", suffix):
+        suffix = ""
+    return f"{user_id}/{kind.value}/{uuid.uuid4().hex}{suffix}"
+
+async def _get_owned_upload(upload_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    result = await run_query(get_db().table("file_uploads").select("*").eq("id", upload_id))
+
+    if not result.data:
+        logger.warning(f"Upload {upload_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+
+    if result.data[0]["user_id"] != user["id"]:
+        logger.warning(f"User {user['id']} attempted to access upload {upload_id} belonging to another user")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this upload")
+
+    return result.data[0]
+
+def _rejection(upload: Dict[str, Any], info: ObjectInfo) -> Optional[HTTPException]:
+    """Why a stored object does not match its upload ticket, or None if it does"""
+    if info.size > settings.MAX_UPLOAD_BYTES:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_BYTES} bytes",
+        )
+    if upload.get("size") is not None and info.size != upload["size"]:
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Uploaded file is {info.size} bytes, not the declared {upload['size']}",
+        )
+    content_type = (info.content_type or "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_CONTENT_TYPES[UploadKind(upload["kind"])]:
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Content type {content_type or 'unknown'} is not allowed for {upload['kind']}",
+        )
+    return None
+
+def _schedule_upload_thumbnails(upload: Dict[str, Any]):
+    async def record_digest(digest: str):
+        # Thumbnails are addressed by the digest of the stored bytes; keep the record in sync
+        if upload.get("checksum") != digest:
+            await run_query(get_db().table("file_uploads").update({"checksum": digest}).eq("id", upload["id"]), "update")
+
+    schedule_thumbnails(upload["path"], on_done=record_digest)
+
+@router.post("/", response_model=UploadTicketResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(upload: UploadCreate, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Issue a short-lived presigned URL for uploading a file directly to storage
+    """
+    try:
+        if upload.content_type not in ALLOWED_CONTENT_TYPES[upload.kind]:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Content type {upload.content_type} is not allowed for {upload.kind.value}",
+            )
+        if upload.size > settings.MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_BYTES} bytes",
+            )
+
+        path = _object_path(user["id"], upload.kind, upload.filename)
+        logger.info(f"Issuing upload URL for {path}")
+        presigned = await get_object_storage().create_upload_url(path, upload.content_type, upload.size)
+
+        result = await run_query(get_db().table("file_uploads").insert({
+            "user_id": user["id"],
+            "kind": upload.kind.value,
+            "path": path,
+            "filename": upload.filename,
+            "content_type": upload.content_type,
+            # The declared size until completion, which requires the stored object to match
+            "size": upload.size,
+            "status": "pending"
+        }), "insert")
+
+        if not result.data:
+            logger.error("Failed to record upload")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create upload")
+
+        return {
+            "id": result.data[0]["id"],
+            "path": path,
+            "url": presigned.url,
+            "method": presigned.method,
+            "expires_at": presigned.expires_at,
+            "headers": presigned.headers,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating upload: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.post("/{upload_id}/complete", response_model=UploadResponse)
+async def complete_upload(upload_id: str, completion: UploadComplete, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Record size, content type and checksum of a finished upload
+
+    The stored object must be within MAX_UPLOAD_BYTES, of the declared size and
+    of a content type allowed for the upload's kind; otherwise it is deleted.
+    """
+    try:
+        logger.info(f"Completing upload {upload_id}")
+        upload = await _get_owned_upload(upload_id, user)
+
+        if upload["status"] == "complete":
+            return upload
+
+        storage = get_object_storage()
+        info = await storage.stat(upload["path"])
+        if info is None:
+            logger.warning(f"Upload {upload_id} has no object at {upload['path']}")
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File has not been uploaded yet")
+
+        rejection = _rejection(upload, info)
+        checksum = completion.checksum.lower() if completion.checksum else None
+        if rejection is None and info.checksum and checksum and info.checksum != checksum:
+            rejection = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Checksum does not match uploaded file")
+        if rejection is not None:
+            # Nothing unverified stays in storage; the client may upload again with the same ticket
+            logger.warning(f"Rejecting upload {upload_id}: {rejection.detail}")
+            await storage.delete(upload["path"])
+            raise rejection
+
+        result = await run_query(get_db().table("file_uploads").update({
+            "size": info.size,
+            "content_type": info.content_type.split(";")[0].strip().lower(),
+            # Only a checksum the storage backend computed; a client's claim is not recorded
+            "checksum": info.checksum,
+            "status": "complete",
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", upload_id), "update")
+
+        if result.data:
+            logger.info(f"Upload {upload_id} completed ({info.size} bytes)")
+            if upload["kind"] == UploadKind.home_image.value:
+                _schedule_upload_thumbnails(result.data[0])
+            return result.data[0]
+        else:
+            logger.error(f"Failed to complete upload {upload_id}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to complete upload")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.get("/{upload_id}", response_model=UploadResponse)
+async def get_upload(upload_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Get metadata for an upload
+    """
+    try:
+        logger.info(f"Fetching upload {upload_id}")
+        return await _get_owned_upload(upload_id, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
+
+@router.get("/{upload_id}/download", response_model=PresignedUrlResponse)
+async def get_download_url(upload_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Issue a short-lived presigned URL for downloading a file directly from storage
+    """
+    try:
+        logger.info(f"Issuing download URL for upload {upload_id}")
+        upload = await _get_owned_upload(upload_id, user)
+
+        if upload["status"] != "complete":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload has not been completed")
+
+        presigned = await get_object_storage().create_download_url(upload["path"])
+        return {
+            "url": presigned.url,
+            "method": presigned.method,
+            "expires_at": presigned.expires_at,
+            "headers": presigned.headers,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error issuing download URL for upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
@@ -0,0 +1,442 @@
+"""
+Negotiated response compression (zstd, brotli, gzip) with a precompressed cache
+
+List and export payloads repeat the same keys, categories and dates, so they
+shrink several times over. CompressionMiddleware picks the first encoding in
+COMPRESSION_ENCODINGS that the client's Accept-Encoding allows and leaves
+alone bodies smaller than COMPRESSION_MIN_SIZE, responses that are already
+encoded or marked no-transform, media types that are already compressed
+(images, PDFs) and event streams. Bodies of COMPRESSION_THREADPOOL_BYTES or
+more are compressed in the threadpool so the event loop keeps serving other
+requests; streamed responses (large lists, report downloads) are compressed
+chunk by chunk.
+
+Compressed bodies are kept in a bounded LRU keyed by the response's ETag, or
+by a digest of the body when it has none, so repeats of the same response (a
+report downloaded again, an unchanged list polled by the frontend) are sent
+without compressing them again. A compressed response's ETag is made weak, as
+nginx does, and If-None-Match is compared weakly so revalidation still gets a
+304.
+
+zstd and brotli need the optional `zstandard` and `brotli` packages; gzip is
+always available.
+"""
+import gzip
+import hashlib
+import logging
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+compressed_responses = registry.counter(
+    "compressed_responses_total", "Responses sent compressed, by encoding and whether the cache had them", ["encoding", "source"]
+)
+compression_bytes = registry.counter(
+    "compression_bytes_total", "Body bytes before (original) and after (sent) compression", ["encoding", "stage"]
+)
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+class Codec:
+    """One content coding: whole-body compression and a streaming compressor"""
+
+    name = ""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def stream(self) -> "Stream":
+        raise NotImplementedError
+
+
+class Stream:
+    """Compresses a body chunk by chunk, flushing each so the client can start parsing"""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    level = 6
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self) -> Stream:
+        return GzipStream(zlib.compressobj(self.level, zlib.DEFLATED, 31))
+
+
+class GzipStream(Stream):
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class BrotliCodec(Codec):
+    name = "br"
+    # Quality 4 compresses better than gzip -6 at a similar speed
+    quality = 4
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self) -> Stream:
+        return BrotliStream(brotli.Compressor(quality=self.quality))
+
+
+class BrotliStream(Stream):
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    level = 3
+
+    # A compressor per call: they are not safe to share between threadpool workers
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self) -> Stream:
+        return ZstdStream(zstandard.ZstdCompressor(level=self.level).compressobj())
+
+
+class ZstdStream(Stream):
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+def available_codecs() -> Dict[str, Codec]:
+    codecs: Dict[str, Codec] = {"gzip": GzipCodec()}
+    if brotli is not None:
+        codecs["br"] = BrotliCodec()
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec()
+    return codecs
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    return accepted
+
+
+class CompressedCache:
+    """Compressed bodies by (encoding, ETag or body digest), bounded by total size"""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key: Tuple[str, bytes], body: bytes):
+        if len(body) > self.max_entry_bytes or key in self._entries:
+            return
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _weak(etag: bytes) -> bytes:
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the best encoding the client accepts"""
+
+    def __init__(
+        self,
+        app,
+        encodings: Optional[List[str]] = None,
+        min_size: Optional[int] = None,
+        threadpool_bytes: Optional[int] = None,
+        cache: Optional[CompressedCache] = None,
+    ):
+        self.app = app
+        codecs = available_codecs()
+        preferred = encodings if encodings is not None else settings.COMPRESSION_ENCODINGS.split(",")
+        self.codecs = [codecs[name.strip()] for name in preferred if name.strip() in codecs]
+        self.min_size = settings.COMPRESSION_MIN_SIZE if min_size is None else min_size
+        self.threadpool_bytes = settings.COMPRESSION_THREADPOOL_BYTES if threadpool_bytes is None else threadpool_bytes
+        self.cache = cache if cache is not None else compressed_cache
+        self.negotiate = lru_cache(maxsize=256)(self._negotiate)
+
+    def _negotiate(self, header: bytes) -> Optional[Codec]:
+        accepted = _parse_accept_encoding(header.decode("latin-1"))
+        fallback = accepted.get("*", 0.0)
+        for codec in self.codecs:
+            if accepted.get(codec.name, fallback) > 0:
+                return codec
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = None
+        weak_validator = False
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+            elif name == b"if-none-match" and b"W/" in value:
+                weak_validator = True
+        if weak_validator:
+            # If-None-Match uses weak comparison; handlers compare the strong ETag they set
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value.replace(b"W/", b"") if name == b"if-none-match" else value)
+                for name, value in scope["headers"]
+            ]
+        codec = self.negotiate(accept_encoding) if accept_encoding else None
+        if codec is None:
+            return await self.app(scope, receive, send)
+        await CompressedResponder(self, codec, send).run(scope, receive)
+
+    def compressible(self, status: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if not 200 <= status < 300 or status in (204, 206):
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"cache-control" and b"no-transform" in value:
+                return False
+            if name == b"content-type":
+                content_type = value
+        media_type = content_type.decode("latin-1").lower()
+        return media_type.startswith(COMPRESSIBLE_TYPES) and not media_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+    async def compress(self, codec: Codec, data: bytes) -> bytes:
+        if len(data) >= self.threadpool_bytes:
+            return await run_in_threadpool(codec.compress, data)
+        return codec.compress(data)
+
+    async def compress_chunk(self, stream: Stream, data: bytes) -> bytes:
+        if len(data) >= self.threadpool_bytes:
+            return await run_in_threadpool(stream.compress, data)
+        return stream.compress(data)
+
+
+class CompressedResponder:
+    """Rewrites one response's messages: holds the start until the first body chunk decides"""
+
+    def __init__(self, middleware: CompressionMiddleware, codec: Codec, send):
+        self.middleware = middleware
+        self.codec = codec
+        self.send = send
+        self.start: Optional[Dict[str, Any]] = None
+        # None: undecided, False: passing through, True: compressing a stream
+        self.compressing: Optional[bool] = None
+        self.draining = False
+        self.stream: Optional[Stream] = None
+        self.cache_key: Optional[Tuple[str, bytes]] = None
+        self.original_size = 0
+        self.sent: List[bytes] = []
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.on_message)
+
+    def _headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for name, value in self.start["headers"]:
+            if name == b"content-length":
+                continue
+            if name == b"etag":
+                value = _weak(value)
+            if name == b"vary":
+                vary = value
+                continue
+            headers.append((name, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower() and vary.strip() != b"*":
+            vary += b", Accept-Encoding"
+        headers.append((b"vary", vary))
+        headers.append((b"content-encoding", self.codec.name.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def _send_compressed(self, body: bytes, source: str):
+        await self.send({**self.start, "headers": self._headers(len(body))})
+        await self.send({"type": "http.response.body", "body": body})
+        compressed_responses.inc(encoding=self.codec.name, source=source)
+        compression_bytes.inc(len(body), encoding=self.codec.name, stage="sent")
+
+    async def on_message(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = message.get("headers", [])
+            if message["status"] == 304:
+                # Match the weak ETag the full response carried
+                await self.send({**message, "headers": [
+                    (name, _weak(value) if name == b"etag" else value) for name, value in headers
+                ]})
+                self.compressing = False
+            elif not self.middleware.compressible(message["status"], headers):
+                await self.send(message)
+                self.compressing = False
+            return
+        if message["type"] != "http.response.body":
+            return await self.send(message)
+        if self.draining:
+            return
+        if self.compressing is False:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            headers = dict(self.start.get("headers", []))
+            etag = headers.get(b"etag")
+            self.cache_key = (self.codec.name, etag) if etag else None
+            if self.cache_key is not None:
+                cached = self.middleware.cache.get(self.cache_key)
+                if cached is not None:
+                    if not more_body:
+                        compression_bytes.inc(len(body), encoding=self.codec.name, stage="original")
+                    await self._send_compressed(cached, "cache")
+                    # The handler's own body is no longer needed
+                    self.draining = more_body
+                    return
+            length = int(headers.get(b"content-length", b"-1"))
+            if not more_body:
+                await self._complete(body)
+                return
+            if 0 <= length < self.middleware.min_size:
+                await self.send(self.start)
+                self.compressing = False
+                return await self.send(message)
+            # A streamed body: compress chunk by chunk
+            self.compressing = True
+            self.stream = self.codec.stream()
+            await self.send({**self.start, "headers": self._headers(None)})
+
+        self.original_size += len(body)
+        chunk = await self.middleware.compress_chunk(self.stream, body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        if self.cache_key is not None:
+            self.sent.append(chunk)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        compression_bytes.inc(len(chunk), encoding=self.codec.name, stage="sent")
+        if not more_body:
+            compression_bytes.inc(self.original_size, encoding=self.codec.name, stage="original")
+            compressed_responses.inc(encoding=self.codec.name, source="stream")
+            if self.cache_key is not None:
+                self.middleware.cache.put(self.cache_key, b"".join(self.sent))
+
+    async def _complete(self, body: bytes):
+        """Compress a body that arrived in one message"""
+        if len(body) < self.middleware.min_size:
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            self.compressing = False
+            return
+        if self.cache_key is None:
+            self.cache_key = (self.codec.name, hashlib.blake2b(body, digest_size=16).digest())
+            cached = self.middleware.cache.get(self.cache_key)
+            if cached is not None:
+                compression_bytes.inc(len(body), encoding=self.codec.name, stage="original")
+                await self._send_compressed(cached, "cache")
+                return
+        compressed = await self.middleware.compress(self.codec, body)
+        if len(compressed) >= len(body):
+            # Incompressible after all: not worth the encoding
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            self.compressing = False
+            return
+        self.middleware.cache.put(self.cache_key, compressed)
+        compression_bytes.inc(len(body), encoding=self.codec.name, stage="original")
+        await self._send_compressed(compressed, "compressed")
+
+
+compressed_cache = CompressedCache(settings.COMPRESSION_CACHE_BYTES, settings.COMPRESSION_CACHE_MAX_ENTRY_BYTES)
+
+
+def compression_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.COMPRESSION_ENABLED,
+        "encodings": [name for name in settings.COMPRESSION_ENCODINGS.split(",") if name.strip() in available_codecs()],
+        "cache": compressed_cache.stats(),
+    }
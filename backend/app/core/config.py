@@ -2,16 +2,20 @@
 """
 Configuration settings loaded from environment variables with sensible defaults
 """
-from typing import List, Optional, Union, Dict, Any
-from pydantic import AnyHttpUrl, field_validator
-from pydantic_settings import BaseSettings
+from typing import List, Optional, Set, Union, Dict, Any
+from pathlib import Path
+from pydantic import AnyHttpUrl, Field, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
-from dotenv import load_dotenv
+import tempfile
 
-# Load environment variables from .env file
-load_dotenv()
+# Values from the .env file are read by pydantic-settings when Settings is
+# instantiated, without copying them into os.environ at import
+ENV_FILE = Path(__file__).resolve().parents[2] / ".env"
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=ENV_FILE, env_file_encoding="utf-8", extra="ignore")
+    
     # Project info
     PROJECT_NAME: str = "Home Maintenance API"
     PROJECT_VERSION: str = "1.0.0"
@@ -21,9 +25,16 @@ class Settings(BaseSettings):
     # API settings
     API_PREFIX: str = "/api"
     
-    # CORS configuration
-    BACKEND_CORS_ORIGINS_STR: str = os.getenv("BACKEND_CORS_ORIGINS", '["http://localhost:3000","http://localhost:5173"]')
-    BACKEND_CORS_ORIGINS: List[str] = []
+    # Files the service writes at runtime (caches, local storage, queues)
+    # default to directories under DATA_DIR, outside the source tree; point it
+    # at a persistent volume in production
+    DATA_DIR: str = os.getenv("DATA_DIR", os.path.join(tempfile.gettempdir(), "home-maintenance-api"))
+    
+    # CORS configuration: BACKEND_CORS_ORIGINS as a JSON list or comma-separated
+    BACKEND_CORS_ORIGINS_STR: str = Field(
+        default='["http://localhost:3000","http://localhost:5173"]',
+        validation_alias="BACKEND_CORS_ORIGINS",
+    )
     
     # Supabase configuration
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
@@ -33,23 +44,207 @@ class Settings(BaseSettings):
     # JWT configuration
     JWT_SECRET: str = os.getenv("JWT_SECRET", "your-jwt-secret-key")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
+    JWT_AUDIENCE: str = os.getenv("JWT_AUDIENCE", "authenticated")
+    
+    # Token verification: local checks against JWT_SECRET (the project's JWT secret)
+    # when set, otherwise a call to Supabase auth; verified tokens are cached
+    AUTH_LOCAL_VERIFY: bool = os.getenv("AUTH_LOCAL_VERIFY", "true").lower() == "true"
+    AUTH_CACHE_TTL: int = int(os.getenv("AUTH_CACHE_TTL", "300"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    
+    # Use the database-side RPCs from supabase/migrations for ownership-joined lists
+    USE_DB_RPC: bool = os.getenv("USE_DB_RPC", "false").lower() == "true"
+    
+    # Data access: "supabase" (PostgREST over HTTP), "postgres" (direct
+    # asyncpg pool to POSTGRES_DSN, e.g. the project's pooler connection string)
+    # or "memory" (in-process tables for tests and benchmarks)
+    DATABASE_BACKEND: str = os.getenv("DATABASE_BACKEND", "supabase")
+    POSTGRES_DSN: str = os.getenv("POSTGRES_DSN", "")
+    POSTGRES_POOL_MIN_SIZE: int = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+    POSTGRES_POOL_MAX_SIZE: int = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+    POSTGRES_STATEMENT_CACHE_SIZE: int = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "256"))
+    
+    # Local read replica: GET handlers read a per-host SQLite copy of each
+    # user's rows (at REPLICA_PATH, by default DATA_DIR/replica.sqlite3),
+    # refreshed once older than REPLICA_MAX_STALENESS seconds
+    REPLICA_ENABLED: bool = os.getenv("REPLICA_ENABLED", "false").lower() == "true"
+    REPLICA_PATH: str = os.getenv("REPLICA_PATH", "")
+    REPLICA_MAX_STALENESS: float = float(os.getenv("REPLICA_MAX_STALENESS", "30"))
+    REPLICA_IDLE_TTL: float = float(os.getenv("REPLICA_IDLE_TTL", "86400"))
+    REPLICA_MMAP_SIZE: int = int(os.getenv("REPLICA_MMAP_SIZE", str(256 * 1024 * 1024)))
+    
+    # Upstream resilience (seconds unless noted)
+    UPSTREAM_READ_TIMEOUT: float = float(os.getenv("UPSTREAM_READ_TIMEOUT", "3.0"))
+    UPSTREAM_WRITE_TIMEOUT: float = float(os.getenv("UPSTREAM_WRITE_TIMEOUT", "5.0"))
+    UPSTREAM_AUTH_TIMEOUT: float = float(os.getenv("UPSTREAM_AUTH_TIMEOUT", "2.0"))
+    UPSTREAM_RETRY_ATTEMPTS: int = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.05"))
+    UPSTREAM_RETRY_MAX_DELAY: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "1.0"))
+    UPSTREAM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("UPSTREAM_BREAKER_FAILURE_THRESHOLD", "5"))
+    UPSTREAM_BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("UPSTREAM_BREAKER_RECOVERY_TIMEOUT", "30.0"))
+    UPSTREAM_STALE_CACHE_SIZE: int = int(os.getenv("UPSTREAM_STALE_CACHE_SIZE", "2048"))
+    UPSTREAM_STALE_MAX_AGE: float = float(os.getenv("UPSTREAM_STALE_MAX_AGE", "300.0"))
+    # Store appliance, service record and reminder rows in the stale cache as
+    # compact column arrays rather than dicts, for results of at least
+    # UPSTREAM_STALE_COMPACT_MIN_ROWS rows (compacted by a background thread)
+    UPSTREAM_STALE_COMPACT: bool = os.getenv("UPSTREAM_STALE_COMPACT", "false").lower() == "true"
+    UPSTREAM_STALE_COMPACT_MIN_ROWS: int = int(os.getenv("UPSTREAM_STALE_COMPACT_MIN_ROWS", "100"))
+    
+    # Rate limiting: token buckets per user (or client IP) and route group, refilled
+    # at *_PER_SECOND tokens per second up to *_BURST; a rate of 0 disables a group
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_STORE: str = os.getenv("RATE_LIMIT_STORE", "memory")  # "memory" or "redis"
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    RATE_LIMIT_READ_PER_SECOND: float = float(os.getenv("RATE_LIMIT_READ_PER_SECOND", "10"))
+    RATE_LIMIT_READ_BURST: int = int(os.getenv("RATE_LIMIT_READ_BURST", "40"))
+    RATE_LIMIT_WRITE_PER_SECOND: float = float(os.getenv("RATE_LIMIT_WRITE_PER_SECOND", "2"))
+    RATE_LIMIT_WRITE_BURST: int = int(os.getenv("RATE_LIMIT_WRITE_BURST", "10"))
+    RATE_LIMIT_UPLOADS_PER_SECOND: float = float(os.getenv("RATE_LIMIT_UPLOADS_PER_SECOND", "0.5"))
+    RATE_LIMIT_UPLOADS_BURST: int = int(os.getenv("RATE_LIMIT_UPLOADS_BURST", "5"))
+    
+    # Idempotency-Key support for POST requests; IDEMPOTENCY_STORE is "memory"
+    # (per worker, so retries reaching another gunicorn worker are not
+    # deduplicated) or "redis" (shared across workers and nodes)
+    IDEMPOTENCY_ENABLED: bool = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    IDEMPOTENCY_STORE: str = os.getenv("IDEMPOTENCY_STORE", "memory")
+    IDEMPOTENCY_REDIS_URL: str = os.getenv("IDEMPOTENCY_REDIS_URL", "redis://localhost:6379/0")
+    IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    IDEMPOTENCY_WAIT_TIMEOUT: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+    
+    # Change notifications (server-sent events); EVENT_BUS_BACKEND is "memory"
+    # (per worker) or "redis" (shared across workers and nodes)
+    EVENT_BUS_BACKEND: str = os.getenv("EVENT_BUS_BACKEND", "memory")
+    EVENT_BUS_REDIS_URL: str = os.getenv("EVENT_BUS_REDIS_URL", "redis://localhost:6379/0")
+    EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
+    EVENTS_RETRY_MS: int = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+    EVENTS_MAX_STREAMS_PER_USER: int = int(os.getenv("EVENTS_MAX_STREAMS_PER_USER", "10"))
+    # Lifetime of the single-use tickets that authenticate GET /events/stream
+    EVENTS_TICKET_TTL_SECONDS: float = float(os.getenv("EVENTS_TICKET_TTL_SECONDS", "30"))
+    
+    # Health checks: upstream probes run in the background every interval
+    HEALTH_PROBE_INTERVAL: float = float(os.getenv("HEALTH_PROBE_INTERVAL", "15.0"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2.0"))
+    
+    # File storage
+    FILE_STORAGE_BACKEND: str = os.getenv("FILE_STORAGE_BACKEND", "supabase")  # "supabase" or "local"
+    STORAGE_BUCKET: str = os.getenv("STORAGE_BUCKET", "documents")
+    STORAGE_URL_TTL_SECONDS: int = int(os.getenv("STORAGE_URL_TTL_SECONDS", "600"))
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+    LOCAL_STORAGE_DIR: str = os.getenv("LOCAL_STORAGE_DIR", "")  # default: DATA_DIR/storage
+    # Signs the local backend's upload and download URLs; required with it
+    STORAGE_SIGNING_SECRET: str = os.getenv("STORAGE_SIGNING_SECRET", "your-storage-signing-secret")
+    PUBLIC_BASE_URL: str = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+    
+    # Image thumbnails
+    THUMBNAIL_SIZES: str = os.getenv("THUMBNAIL_SIZES", "128,320,640")
+    THUMBNAIL_CACHE_DIR: str = os.getenv("THUMBNAIL_CACHE_DIR", "")  # default: DATA_DIR/thumbnails
+    THUMBNAIL_WORKERS: int = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+    # Source images above either limit get no thumbnails
+    THUMBNAIL_MAX_SOURCE_BYTES: int = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(25 * 1024 * 1024)))
+    THUMBNAIL_MAX_PIXELS: int = int(os.getenv("THUMBNAIL_MAX_PIXELS", str(50 * 1000 * 1000)))
+    
+    # Background reports: REPORT_WORKERS jobs run at once per worker, rendering
+    # in REPORT_PROCESSES processes; output is cached under REPORT_CACHE_DIR
+    # (default: DATA_DIR/reports)
+    REPORT_CACHE_DIR: str = os.getenv("REPORT_CACHE_DIR", "")
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", "2"))
+    REPORT_PROCESSES: int = int(os.getenv("REPORT_PROCESSES", "1"))
+    REPORT_JOB_TIMEOUT: float = float(os.getenv("REPORT_JOB_TIMEOUT", "120"))
+    REPORT_CACHE_MAX_AGE_DAYS: float = float(os.getenv("REPORT_CACHE_MAX_AGE_DAYS", "7"))
+    
+    # Background jobs: JOBS_BACKEND is "memory" (per worker), "sqlite" (a local
+    # durable queue at JOBS_SQLITE_PATH, by default DATA_DIR/jobs.sqlite3) or
+    # "database" (the background_jobs table, shared by every worker and node)
+    JOBS_BACKEND: str = os.getenv("JOBS_BACKEND", "memory")
+    JOBS_SQLITE_PATH: str = os.getenv("JOBS_SQLITE_PATH", "")
+    JOBS_CONCURRENCY: int = int(os.getenv("JOBS_CONCURRENCY", "4"))
+    JOBS_QUEUE_SIZE: int = int(os.getenv("JOBS_QUEUE_SIZE", "1000"))
+    JOBS_POLL_INTERVAL: float = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+    JOBS_LEASE_SECONDS: float = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+    JOBS_RETRY_BACKOFF: float = float(os.getenv("JOBS_RETRY_BACKOFF", "5.0"))
+    JOBS_SHUTDOWN_TIMEOUT: float = float(os.getenv("JOBS_SHUTDOWN_TIMEOUT", "10"))
+    JOBS_RETENTION_DAYS: float = float(os.getenv("JOBS_RETENTION_DAYS", "7"))
+    
+    # Response serialization
+    FAST_SERIALIZATION: bool = os.getenv("FAST_SERIALIZATION", "true").lower() == "true"
+    SERIALIZATION_STREAM_THRESHOLD: int = int(os.getenv("SERIALIZATION_STREAM_THRESHOLD", "2000"))
+    SERIALIZATION_CHUNK_SIZE: int = int(os.getenv("SERIALIZATION_CHUNK_SIZE", "500"))
+    
+    # Response compression: encodings in order of preference (zstd and br
+    # need the zstandard and brotli packages), bodies below COMPRESSION_MIN_SIZE
+    # are sent as is and those from COMPRESSION_THREADPOOL_BYTES up are
+    # compressed off the event loop; compressed bodies are cached per worker
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_ENCODINGS: str = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_THREADPOOL_BYTES: int = int(os.getenv("COMPRESSION_THREADPOOL_BYTES", "65536"))
+    COMPRESSION_CACHE_BYTES: int = int(os.getenv("COMPRESSION_CACHE_BYTES", str(32 * 1024 * 1024)))
+    COMPRESSION_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("COMPRESSION_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+    
+    # Administrators: comma-separated user ids allowed to use /admin endpoints
+    ADMIN_USER_IDS: str = os.getenv("ADMIN_USER_IDS", "")
+    
+    # Request profiling: when enabled, requests are profiled if an admin sends
+    # "X-Profile: true" or at random with probability PROFILING_SAMPLE_RATE,
+    # sampling the request every PROFILING_INTERVAL seconds; the last
+    # PROFILING_BUFFER_SIZE profiles are kept per worker for /admin/profiles
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_INTERVAL: float = float(os.getenv("PROFILING_INTERVAL", "0.002"))
+    PROFILING_BUFFER_SIZE: int = int(os.getenv("PROFILING_BUFFER_SIZE", "100"))
+    
+    # Traffic capture for replay: records anonymized request shapes to a file
+    # per worker in TRAFFIC_CAPTURE_DIR (default: DATA_DIR/traffic), hashing user ids into
+    # TRAFFIC_CAPTURE_USER_BUCKETS buckets keyed by TRAFFIC_CAPTURE_SALT (set it
+    # for buckets that agree across workers and restarts)
+    TRAFFIC_CAPTURE_ENABLED: bool = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() == "true"
+    TRAFFIC_CAPTURE_DIR: str = os.getenv("TRAFFIC_CAPTURE_DIR", "")
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+    TRAFFIC_CAPTURE_USER_BUCKETS: int = int(os.getenv("TRAFFIC_CAPTURE_USER_BUCKETS", "1000"))
+    TRAFFIC_CAPTURE_SALT: str = os.getenv("TRAFFIC_CAPTURE_SALT", "")
+    TRAFFIC_CAPTURE_MAX_BYTES: int = int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(100 * 1024 * 1024)))
+    
+    # Memory reports: MEMORY_TRACING_ENABLED starts tracemalloc, keeping
+    # MEMORY_TRACING_FRAMES frames per allocation, for /admin/memory
+    MEMORY_TRACING_ENABLED: bool = os.getenv("MEMORY_TRACING_ENABLED", "false").lower() == "true"
+    MEMORY_TRACING_FRAMES: int = int(os.getenv("MEMORY_TRACING_FRAMES", "1"))
     
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
-    @field_validator("BACKEND_CORS_ORIGINS")
-    @classmethod
-    def assemble_cors_origins(cls, v: Union[str, List[str]], values: Dict[str, Any]) -> List[str]:
-        if isinstance(v, str) and not v.startswith("["):
-            return [i.strip() for i in v.split(",")]
-        if isinstance(v, (list, str)):
-            import ast
-            cors_origins_str = values.data.get("BACKEND_CORS_ORIGINS_STR")
-            if cors_origins_str:
-                try:
-                    return ast.literal_eval(cors_origins_str)
-                except Exception:
-                    return [x.strip() for x in cors_origins_str.split(",") if x.strip()]
-        return []
+    @property
+    def BACKEND_CORS_ORIGINS(self) -> List[str]:
+        cors_origins_str = self.BACKEND_CORS_ORIGINS_STR.strip()
+        if not cors_origins_str.startswith("["):
+            return [x.strip() for x in cors_origins_str.split(",") if x.strip()]
+        import ast
+        try:
+            return list(ast.literal_eval(cors_origins_str))
+        except Exception:
+            return [x.strip() for x in cors_origins_str.strip("[]").split(",") if x.strip()]
+
+    @property
+    def ADMIN_USERS(self) -> Set[str]:
+        return {x.strip() for x in self.ADMIN_USER_IDS.split(",") if x.strip()}
+    
+    @model_validator(mode="after")
+    def _default_data_paths(self) -> "Settings":
+        # Resolved here rather than in the defaults so DATA_DIR can come from .env
+        if not self.REPORT_CACHE_DIR:
+            self.REPORT_CACHE_DIR = os.path.join(self.DATA_DIR, "reports")
+        if not self.LOCAL_STORAGE_DIR:
+            self.LOCAL_STORAGE_DIR = os.path.join(self.DATA_DIR, "storage")
+        if not self.THUMBNAIL_CACHE_DIR:
+            self.THUMBNAIL_CACHE_DIR = os.path.join(self.DATA_DIR, "thumbnails")
+        if not self.JOBS_SQLITE_PATH:
+            self.JOBS_SQLITE_PATH = os.path.join(self.DATA_DIR, "jobs.sqlite3")
+        if not self.REPLICA_PATH:
+            self.REPLICA_PATH = os.path.join(self.DATA_DIR, "replica.sqlite3")
+        if not self.TRAFFIC_CAPTURE_DIR:
+            self.TRAFFIC_CAPTURE_DIR = os.path.join(self.DATA_DIR, "traffic")
+        return self
 
 settings = Settings()
@@ -0,0 +1,462 @@
+"""
+Database access: one table/RPC interface over interchangeable backends
+
+Routers build queries with `get_db().table(...)` or `get_db().rpc(...)` and
+run them with `run_query`. DATABASE_BACKEND selects what answers them:
+- "supabase" (default): the supabase-py client, over HTTP to PostgREST
+- "postgres": a direct asyncpg connection pool (see app.core.postgres)
+- "memory": in-process tables for tests and benchmarks (see app.core.memory_database)
+
+Every backend accepts the same builder calls (the subset of the PostgREST
+builder the routers use) and returns rows shaped like PostgREST's JSON: ids,
+dates and timestamps as strings, numerics as floats.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+EMBED = re.compile(r"(?:([A-Za-z_][A-Za-z0-9_]*):)?([A-Za-z_][A-Za-z0-9_]*)\((.*)\)", re.DOTALL)
+
+# Foreign keys between the app's tables, as {table: {column: referenced table}};
+# a select can embed a table related through one of them
+FOREIGN_KEYS: Dict[str, Dict[str, str]] = {
+    "appliances": {"home_profile_id": "home_profiles"},
+    "service_records": {"appliance_id": "appliances"},
+    "maintenance_reminders": {"appliance_id": "appliances"},
+    "report_jobs": {"home_profile_id": "home_profiles"},
+}
+
+# Fractional seconds, and an offset given in hours only, which
+# datetime.fromisoformat rejects before Python 3.11
+TIMESTAMP_FRACTION = re.compile(r"\.(\d+)")
+HOURS_OFFSET = re.compile(r"([+-]\d\d)$")
+
+# SQLSTATE classes worth retrying: connection exceptions, insufficient
+# resources, operator intervention, serialization failures and deadlocks
+TRANSIENT_SQLSTATES = ("08", "53", "57P", "40001", "40P01")
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """
+    A timestamp column's value as a datetime
+
+    PostgREST, like the direct Postgres backend, trims trailing zeros from
+    fractional seconds ("2026-01-02T03:04:05.12345+00:00"), which Python 3.9's
+    datetime.fromisoformat rejects; the fraction is normalized to 6 digits
+    first, and a "Z" or hours-only offset is accepted as well.
+    """
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    text = TIMESTAMP_FRACTION.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), text, count=1)
+    text = HOURS_OFFSET.sub(r"\1:00", text) if len(text) > 10 else text
+    return datetime.fromisoformat(text)
+
+
+class QueryError(Exception):
+    """A query failed in the database; `code` is its SQLSTATE, as on PostgREST errors"""
+
+    def __init__(self, message: str, code: Optional[str] = None, transient: bool = False):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.transient = transient or bool(code and code.startswith(TRANSIENT_SQLSTATES))
+
+
+@dataclass
+class QueryResult:
+    """Rows returned by a query; mirrors the attributes of a PostgREST response"""
+    data: Any
+    count: Optional[int] = None
+
+
+def check_identifier(name: str) -> str:
+    if not IDENTIFIER.fullmatch(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def parse_columns(columns: str) -> Optional[List[str]]:
+    """Column list of a select() call; None for all columns"""
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    if not names or names == ["*"]:
+        return None
+    return [check_identifier(name) for name in names]
+
+
+@dataclass
+class Embed:
+    """A related table embedded in a select, e.g. "reminders:maintenance_reminders(*)" """
+    name: str
+    table: str
+    columns: Optional[List[str]]
+    orders: List[Tuple[str, bool, bool]] = field(default_factory=list)
+    limit: Optional[int] = None
+    # Tables embedded in this one, e.g. owner:home_profiles(user_id) in appliances(...)
+    embeds: List["Embed"] = field(default_factory=list)
+
+
+def parse_select(columns: str) -> Tuple[Optional[List[str]], List[Embed]]:
+    """Column list (None for all columns) and embedded tables of a select() call"""
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(columns):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(columns[start:index])
+            start = index + 1
+    parts.append(columns[start:])
+
+    names, embeds = [], []
+    for part in parts:
+        embed = EMBED.fullmatch(part.strip())
+        if embed:
+            alias, table, inner = embed.groups()
+            inner_columns, inner_embeds = parse_select(inner)
+            embeds.append(Embed(alias or table, check_identifier(table), inner_columns, embeds=inner_embeds))
+        else:
+            names.append(part)
+    if embeds and not any(name.strip() for name in names):
+        # Only embedded tables, e.g. "owner:home_profiles(user_id)"
+        return [], embeds
+    return parse_columns(",".join(names)), embeds
+
+
+def relationship(table: str, embedded: str) -> Tuple[str, str, bool]:
+    """
+    How an embedded table joins its parent query's table
+
+    Returns:
+        (column on table, column on embedded, whether many embedded rows match)
+
+    Raises:
+        QueryError: PGRST200 if no foreign key relates the two tables
+    """
+    for column, referenced in FOREIGN_KEYS.get(table, {}).items():
+        if referenced == embedded:
+            return column, "id", False
+    for column, referenced in FOREIGN_KEYS.get(embedded, {}).items():
+        if referenced == table:
+            return "id", column, True
+    raise QueryError(f"Could not find a relationship between '{table}' and '{embedded}'", "PGRST200")
+
+
+def _coerce(row_value: Any, value: Any) -> Any:
+    """Filter values may arrive as strings (e.g. from query parameters)"""
+    if isinstance(value, str) and row_value is not None and not isinstance(row_value, str):
+        if isinstance(row_value, bool):
+            return value.lower() == "true"
+        if isinstance(row_value, (int, float)):
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+_LIKE_CACHE: Dict[Tuple[str, bool], "re.Pattern"] = {}
+
+
+def _like(pattern: str, case_insensitive: bool) -> "re.Pattern":
+    compiled = _LIKE_CACHE.get((pattern, case_insensitive))
+    if compiled is None:
+        regex = "".join(
+            ".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern
+        )
+        compiled = re.compile(regex, re.IGNORECASE | re.DOTALL if case_insensitive else re.DOTALL)
+        _LIKE_CACHE[(pattern, case_insensitive)] = compiled
+    return compiled
+
+
+def matches(row: Dict[str, Any], filters: Iterable[Tuple[str, str, Any]]) -> bool:
+    """Evaluate recorded filters against a row, with SQL semantics for nulls"""
+    for column, operator, value in filters:
+        row_value = row.get(column)
+        if operator == "is":
+            keyword = value.lower() if isinstance(value, str) else value
+            if keyword in (None, "null"):
+                if row_value is not None:
+                    return False
+            elif keyword in (True, "true"):
+                if row_value is not True:
+                    return False
+            elif keyword in (False, "false"):
+                if row_value is not False:
+                    return False
+            else:
+                raise ValueError(f"Invalid is_ value: {value!r}")
+            continue
+        # As in SQL, comparisons with null are never true
+        if row_value is None:
+            return False
+        if operator == "in":
+            if row_value not in {_coerce(row_value, item) for item in value}:
+                return False
+            continue
+        value = _coerce(row_value, value)
+        if value is None:
+            return False
+        if operator == "eq":
+            matched = row_value == value
+        elif operator == "neq":
+            matched = row_value != value
+        elif operator == "gt":
+            matched = row_value > value
+        elif operator == "gte":
+            matched = row_value >= value
+        elif operator == "lt":
+            matched = row_value < value
+        elif operator == "lte":
+            matched = row_value <= value
+        elif operator in ("like", "ilike"):
+            matched = _like(value, operator == "ilike").fullmatch(str(row_value)) is not None
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        if not matched:
+            return False
+    return True
+
+
+def sort_rows(rows: List[Dict[str, Any]], orders: List[Tuple[str, bool, bool]]) -> List[Dict[str, Any]]:
+    """Order rows as ORDER BY would; orders are (column, desc, nullsfirst)"""
+    # Stable sorts from the last key to the first give a multi-column order
+    for column, desc, nullsfirst in reversed(orders):
+        present = [row for row in rows if row.get(column) is not None]
+        nulls = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse=desc)
+        rows = nulls + present if nullsfirst else present + nulls
+    return rows
+
+
+def filter_rows(rows: Iterable[Dict[str, Any]], filters: List[Tuple[str, str, Any]]) -> List[Dict[str, Any]]:
+    return [row for row in rows if matches(row, filters)]
+
+
+class FilterQuery:
+    """
+    Filter methods shared by table queries and function calls, as on the
+    PostgREST builders; filters are recorded as (column, operator, value)
+    """
+
+    filters: List[Tuple[str, str, Any]]
+
+    def _filter(self, column: str, operator: str, value: Any) -> "FilterQuery":
+        self.filters.append((check_identifier(column), operator, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "lte", value)
+
+    def in_(self, column: str, values: List[Any]) -> "FilterQuery":
+        return self._filter(column, "in", list(values))
+
+    def is_(self, column: str, value: Any) -> "FilterQuery":
+        return self._filter(column, "is", value)
+
+    def like(self, column: str, pattern: str) -> "FilterQuery":
+        return self._filter(column, "like", pattern)
+
+    def ilike(self, column: str, pattern: str) -> "FilterQuery":
+        return self._filter(column, "ilike", pattern)
+
+
+class TableQuery(FilterQuery):
+    """
+    Backend-neutral query builder with the same methods as the PostgREST builder
+
+    The backend turns the finished query into SQL or evaluates it directly.
+    """
+
+    is_async = True
+
+    def __init__(self, database: "Database", table: str):
+        self.database = database
+        self.table = check_identifier(table)
+        self.action = "select"
+        self.columns = "*"
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.orders: List[Tuple[str, bool, bool]] = []
+        self.limit_count: Optional[int] = None
+        self.embed_orders: Dict[str, List[Tuple[str, bool, bool]]] = {}
+        self.embed_limits: Dict[str, int] = {}
+        self.values: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+
+    def select(self, columns: str = "*", *args, count: Optional[str] = None) -> "TableQuery":
+        self.action = "select"
+        self.columns = ",".join((columns,) + args)
+        return self
+
+    def insert(self, values: Any, *, upsert: bool = False, **kwargs) -> "TableQuery":
+        self.action = "upsert" if upsert else "insert"
+        self.values = values
+        return self
+
+    def upsert(self, values: Any, *, ignore_duplicates: bool = False, on_conflict: str = "", **kwargs) -> "TableQuery":
+        self.action = "upsert"
+        self.values = values
+        self.ignore_duplicates = ignore_duplicates
+        self.on_conflict = on_conflict or None
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs) -> "TableQuery":
+        self.action = "update"
+        self.values = values
+        return self
+
+    def delete(self, **kwargs) -> "TableQuery":
+        self.action = "delete"
+        return self
+
+    def order(
+        self, column: str, *, desc: bool = False, nullsfirst: bool = False, foreign_table: Optional[str] = None
+    ) -> "TableQuery":
+        """Order the rows, or with `foreign_table` the rows of that embedded table"""
+        orders = self.embed_orders.setdefault(foreign_table, []) if foreign_table else self.orders
+        orders.append((check_identifier(column), desc, nullsfirst))
+        return self
+
+    def limit(self, size: int, *, foreign_table: Optional[str] = None) -> "TableQuery":
+        """Limit the rows, or with `foreign_table` the rows of that embedded table per parent row"""
+        if foreign_table:
+            self.embed_limits[foreign_table] = int(size)
+        else:
+            self.limit_count = int(size)
+        return self
+
+    def selection(self) -> Tuple[Optional[List[str]], List[Embed]]:
+        """Selected columns and embedded tables, with their orders and limits attached"""
+        columns, embeds = parse_select(self.columns)
+        for embed in embeds:
+            embed.orders = self.embed_orders.get(embed.name, [])
+            embed.limit = self.embed_limits.get(embed.name)
+        return columns, embeds
+
+    def cache_key(self) -> Hashable:
+        return (
+            self.table, self.action, self.columns,
+            json.dumps(self.filters, default=str), tuple(self.orders), self.limit_count,
+            json.dumps(self.embed_orders, sort_keys=True), json.dumps(self.embed_limits, sort_keys=True),
+        )
+
+    async def execute(self) -> QueryResult:
+        return await self.database.execute(self)
+
+
+class RpcQuery(FilterQuery):
+    """A database function call, built by `Database.rpc`; filters apply to the rows it returns"""
+
+    is_async = True
+
+    def __init__(self, database: "Database", function: str, params: Optional[Dict[str, Any]]):
+        self.database = database
+        self.function = check_identifier(function)
+        self.params = {check_identifier(name): value for name, value in (params or {}).items()}
+        self.filters: List[Tuple[str, str, Any]] = []
+
+    def cache_key(self) -> Hashable:
+        return (
+            "rpc", self.function, json.dumps(self.params, sort_keys=True, default=str),
+            json.dumps(self.filters, default=str),
+        )
+
+    async def execute(self) -> QueryResult:
+        return await self.database.call(self)
+
+
+class Database:
+    """A backend that runs TableQuery and RpcQuery objects"""
+
+    def table(self, name: str) -> TableQuery:
+        return TableQuery(self, name)
+
+    def from_(self, name: str) -> TableQuery:
+        return self.table(name)
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> RpcQuery:
+        return RpcQuery(self, function, params)
+
+    async def execute(self, query: TableQuery) -> QueryResult:
+        raise NotImplementedError
+
+    async def call(self, query: RpcQuery) -> QueryResult:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def close(self):
+        pass
+
+
+_database: Optional[Database] = None
+
+
+def get_db():
+    """
+    Client for the configured DATABASE_BACKEND
+
+    Returns:
+        The Supabase client, or a Database with the same table()/rpc() methods
+
+    Raises:
+        HTTPException: 503 if the backend is not configured
+    """
+    global _database
+    if settings.DATABASE_BACKEND == "supabase":
+        from app.core.supabase import get_supabase
+
+        return get_supabase()
+    if _database is None:
+        if settings.DATABASE_BACKEND == "memory":
+            from app.core.memory_database import MemoryDatabase
+
+            _database = MemoryDatabase()
+        else:
+            from app.core.postgres import PostgresDatabase
+
+            _database = PostgresDatabase.from_settings()
+    return _database
+
+
+def database_stats() -> Dict[str, Any]:
+    return {"backend": settings.DATABASE_BACKEND, **(_database.stats() if _database is not None else {})}
+
+
+async def close_db():
+    """Close the direct database backend's connections, if it was created"""
+    global _database
+    if _database is not None:
+        await _database.close()
+        _database = None
+
+
+def reset_after_fork():
+    """Forget a backend inherited from a preloading parent process"""
+    global _database
+    _database = None
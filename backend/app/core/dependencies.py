@@ -2,13 +2,16 @@
 """
 Dependency injection functions for FastAPI
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
 import logging
+from app.core.config import settings
 from app.core.supabase import verify_token
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
@@ -43,6 +46,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             
         return user
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Authentication error: {str(e)}")
         raise HTTPException(
@@ -50,3 +55,39 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail=f"Authentication error: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+async def get_stream_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    ticket: Optional[str] = Query(None, description="Single-use ticket from POST /events/ticket, for clients that cannot set headers"),
+):
+    """
+    Authenticate a streaming request from the Authorization header or, for
+    browser EventSource clients, a `ticket` query parameter
+
+    Query strings end up in access logs, so a stream never takes the bearer
+    token there; a ticket is short-lived and stops working once redeemed.
+    """
+    if credentials is None and ticket:
+        from app.core.events import get_event_bus
+
+        user = await get_event_bus().redeem_ticket(ticket)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired ticket",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return user
+    return await get_current_user(credentials)
+
+async def get_admin_user(user = Depends(get_current_user)):
+    """
+    Require an authenticated user listed in ADMIN_USER_IDS
+    """
+    if user["id"] not in settings.ADMIN_USERS:
+        logger.warning(f"User {user['id']} attempted to access an admin endpoint")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return user
@@ -0,0 +1,308 @@
+"""
+Change notifications: per-user pub/sub behind the server-sent events stream
+
+Routers publish a change after each successful write. The in-process bus fans
+events out to the user's open streams in this worker. With
+EVENT_BUS_BACKEND=redis, events go through Redis pub/sub instead, so a stream
+on any worker or node receives changes made through any other.
+
+Each subscriber is a bounded queue; an idle stream costs one suspended
+coroutine and no timers beyond its heartbeat. A subscriber that falls too far
+behind is sent a single "resync" event and should refetch.
+
+Browsers' EventSource cannot set headers, so a stream authenticates with a
+ticket: a random, single-use token issued for a user and redeemed within
+EVENTS_TICKET_TTL_SECONDS. Tickets live on the bus, so with the Redis backend
+a ticket issued by one worker can be redeemed on any other.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+events_published = registry.counter("events_published_total", "Change events published", ["resource", "action"])
+events_dropped = registry.counter("events_dropped_total", "Subscribers reset after falling behind")
+event_subscribers = registry.gauge("event_subscribers", "Open change event streams in this worker")
+
+RESYNC = "resync"
+
+_event_ids = itertools.count(1)
+
+
+def make_event(resource: str, action: str, record_id: Any, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "type": f"{resource}.{action}",
+        "resource": resource,
+        "action": action,
+        "record_id": str(record_id),
+        "data": data,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class Subscription:
+    """One open stream's queue of pending events"""
+
+    def __init__(self, user_id: str, max_queue: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max_queue)
+
+    def deliver(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Pending events are useless once some are lost; tell the client to refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": RESYNC})
+            events_dropped.inc()
+
+
+class EventBus:
+    """In-process pub/sub keyed by user id"""
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # Unredeemed stream tickets: ticket -> (expiry on the monotonic clock, user)
+        self._tickets: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        event_subscribers.set_function(lambda: float(self.subscriber_count()))
+
+    def subscriber_count(self, user_id: Optional[str] = None) -> int:
+        if user_id is not None:
+            return len(self._subscribers.get(user_id, ()))
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.max_queue)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def deliver_local(self, user_id: str, event: Dict[str, Any]):
+        for subscription in tuple(self._subscribers.get(user_id, ())):
+            subscription.deliver(event)
+
+    async def publish(self, user_id: str, event: Dict[str, Any]):
+        self.deliver_local(user_id, event)
+
+    async def issue_ticket(self, user: Dict[str, Any], ttl: float) -> str:
+        now = time.monotonic()
+        for ticket, (expires, _) in list(self._tickets.items()):
+            if expires <= now:
+                del self._tickets[ticket]
+        ticket = secrets.token_urlsafe(32)
+        self._tickets[ticket] = (now + ttl, user)
+        return ticket
+
+    async def redeem_ticket(self, ticket: str) -> Optional[Dict[str, Any]]:
+        """Return the ticket's user, once; None if it is unknown, used or expired"""
+        expires, user = self._tickets.pop(ticket, (0.0, None))
+        return user if expires > time.monotonic() else None
+
+    async def close(self):
+        pass
+
+
+class RedisEventBus(EventBus):
+    """
+    Pub/sub relayed through Redis so streams on every worker see every change
+
+    Each user's events go to their own channel, and a worker subscribes (on a
+    single connection) only to the channels of users with a stream open on
+    it, so it never receives other users' events. The first stream a user
+    opens subscribes before it returns; a channel whose last stream closed is
+    unsubscribed by the listener within a second. If a publish to Redis fails,
+    the event is still delivered to local streams.
+    """
+
+    def __init__(self, url: str, max_queue: int = 100, channel_prefix: str = "events:", ticket_prefix: str = "events-ticket:"):
+        super().__init__(max_queue)
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self.ticket_prefix = ticket_prefix
+        self._client: Optional[Any] = None
+        self._pubsub: Optional[Any] = None
+        # User ids whose channels the current pubsub connection is subscribed to
+        self._channels: Set[str] = set()
+        self._stale = False
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _get_client(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("EVENT_BUS_BACKEND=redis requires the redis package") from e
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    def _channel(self, user_id: str) -> str:
+        return f"{self.channel_prefix}{user_id}"
+
+    async def _sync_channels(self):
+        """Subscribe to the channels of users with open streams here, and only those"""
+        async with self._lock:
+            self._stale = False
+            if self._pubsub is None:
+                self._pubsub = self._get_client().pubsub(ignore_subscribe_messages=True)
+                self._channels = set()
+            wanted = set(self._subscribers)
+            added = wanted - self._channels
+            removed = self._channels - wanted
+            if added:
+                await self._pubsub.subscribe(*(self._channel(user_id) for user_id in added))
+            if removed:
+                await self._pubsub.unsubscribe(*(self._channel(user_id) for user_id in removed))
+            self._channels = wanted
+        if wanted:
+            self._wakeup.set()
+
+    async def _disconnect(self):
+        async with self._lock:
+            pubsub, self._pubsub = self._pubsub, None
+            self._channels = set()
+        if pubsub is not None:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    async def _listen(self):
+        while True:
+            try:
+                await self._sync_channels()
+                while self._pubsub is not None:
+                    if self._stale:
+                        await self._sync_channels()
+                    if not self._channels:
+                        # Nothing to read until a stream opens
+                        self._wakeup.clear()
+                        await self._wakeup.wait()
+                        continue
+                    message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        channel = message["channel"].decode()
+                        self.deliver_local(channel[len(self.channel_prefix):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event bus subscription lost, reconnecting: {str(e)}")
+                await self._disconnect()
+                await asyncio.sleep(1.0)
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        subscription = await super().subscribe(user_id)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        if user_id not in self._channels:
+            try:
+                await self._sync_channels()
+            except Exception as e:
+                # The listener resubscribes every open stream's channel once it reconnects
+                logger.warning(f"Event bus subscribe failed: {str(e)}")
+                await self._disconnect()
+                self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        super().unsubscribe(subscription)
+        if subscription.user_id not in self._subscribers and subscription.user_id in self._channels:
+            self._stale = True
+
+    async def publish(self, user_id: str, event: Dict[str, Any]):
+        try:
+            await self._get_client().publish(self._channel(user_id), dumps(event))
+        except Exception as e:
+            logger.warning(f"Event bus publish failed, delivering locally only: {str(e)}")
+            self.deliver_local(user_id, event)
+
+    async def issue_ticket(self, user: Dict[str, Any], ttl: float) -> str:
+        ticket = secrets.token_urlsafe(32)
+        await self._get_client().set(f"{self.ticket_prefix}{ticket}", dumps(user), px=max(1, int(ttl * 1000)))
+        return ticket
+
+    async def redeem_ticket(self, ticket: str) -> Optional[Dict[str, Any]]:
+        # GETDEL reads and removes atomically, so a ticket is redeemed at most once
+        raw = await self._get_client().getdel(f"{self.ticket_prefix}{ticket}")
+        return json.loads(raw) if raw is not None else None
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._disconnect()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    global _bus
+    if _bus is None:
+        if settings.EVENT_BUS_BACKEND == "redis":
+            _bus = RedisEventBus(settings.EVENT_BUS_REDIS_URL, settings.EVENTS_QUEUE_SIZE)
+        else:
+            _bus = EventBus(settings.EVENTS_QUEUE_SIZE)
+    return _bus
+
+
+async def close_event_bus():
+    global _bus
+    if _bus is not None:
+        await _bus.close()
+        _bus = None
+
+
+async def publish_change(user_id: str, resource: str, action: str, record_id: Any, data: Optional[Dict[str, Any]] = None):
+    """
+    Notify a user's open streams of a change; never fails the write that caused it
+
+    Every successful write passes through here, so it also writes the change
+    through to the local read replica.
+
+    Args:
+        user_id: Owner of the changed record
+        resource: Table name, e.g. "appliances"
+        action: "created", "updated", "moved" or "deleted"
+        record_id: Id of the changed record
+        data: The record as stored, if it still exists
+    """
+    from app.core.replica import read_replica
+
+    await read_replica.apply_change(user_id, resource, action, record_id, data)
+    try:
+        await get_event_bus().publish(user_id, make_event(resource, action, record_id, data))
+        events_published.inc(resource=resource, action=action)
+    except Exception as e:
+        logger.error(f"Error publishing {resource}.{action} event: {str(e)}")
+
+
+def format_sse(event: Dict[str, Any]) -> bytes:
+    """Encode an event in the text/event-stream wire format"""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (next(_event_ids), event["type"].encode(), dumps(event))
@@ -0,0 +1,235 @@
+"""
+Background health probing of upstream dependencies
+
+Readiness is decided from the last probe results, which a background task
+refreshes every HEALTH_PROBE_INTERVAL seconds. Health check requests only read
+that snapshot, so a storm of probes from load balancers or orchestrators never
+turns into load on Supabase and always answers in constant time. The runtime
+stats of verbose output are collected by the same task, in the threadpool.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.security import local_verification_enabled
+
+logger = logging.getLogger(__name__)
+
+upstream_health = registry.gauge("upstream_health", "Result of the last health probe (1=up, 0=down)", ["check"])
+
+UP = "up"
+DOWN = "down"
+NOT_CONFIGURED = "not_configured"
+# The dependency is not needed, e.g. auth when tokens are verified locally
+SKIPPED = "skipped"
+
+HEALTHY_STATUSES = (UP, SKIPPED)
+
+
+@dataclass
+class CheckResult:
+    status: str
+    checked_at: float
+    latency_ms: float
+    error: Optional[str] = None
+
+
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+class HealthMonitor:
+    """
+    Periodically runs a set of probes and caches their results
+
+    A probe is a coroutine function that raises on failure and may return a
+    status (e.g. NOT_CONFIGURED or SKIPPED) instead of the default UP.
+    `collect_stats`, if given, is called in the threadpool after each round.
+    """
+
+    def __init__(
+        self,
+        probes: Dict[str, Probe],
+        interval: float,
+        timeout: float,
+        collect_stats: Optional[Callable[[], Dict[str, Any]]] = None,
+    ):
+        self.probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self.collect_stats = collect_stats
+        self.results: Dict[str, CheckResult] = {}
+        self._stats: Optional[Dict[str, Any]] = None
+        self._stats_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_probe(self, name: str, probe: Probe) -> CheckResult:
+        started = time.monotonic()
+        error = None
+        try:
+            status = await asyncio.wait_for(probe(), self.timeout) or UP
+        except asyncio.TimeoutError:
+            status, error = DOWN, f"timed out after {self.timeout}s"
+        except HTTPException as e:
+            status, error = DOWN, str(e.detail)
+        except Exception as e:
+            status, error = DOWN, str(e) or type(e).__name__
+        result = CheckResult(
+            status=status,
+            checked_at=time.time(),
+            latency_ms=round((time.monotonic() - started) * 1000, 1),
+            error=error,
+        )
+        previous = self.results.get(name)
+        if status == DOWN and (previous is None or previous.status != DOWN):
+            logger.warning(f"Health probe {name} failed: {error}")
+        upstream_health.set(1.0 if status in HEALTHY_STATUSES else 0.0, check=name)
+        return result
+
+    async def probe_once(self):
+        """Run every probe concurrently and store the results"""
+        names = list(self.probes)
+        results = await asyncio.gather(*(self._run_probe(name, self.probes[name]) for name in names))
+        self.results.update(zip(names, results))
+
+    async def refresh_stats(self):
+        if self.collect_stats is not None:
+            self._stats = await run_in_threadpool(self.collect_stats)
+            self._stats_at = time.time()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.error(f"Health probing failed: {str(e)}")
+            try:
+                await self.refresh_stats()
+            except Exception as e:
+                logger.error(f"Collecting runtime stats failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Readiness from the cached results
+
+        Results older than three probe intervals count as failing, so a stuck
+        probe loop cannot report a stale "ready" forever.
+        """
+        now = time.time()
+        max_age = self.interval * 3
+        checks = {}
+        ready = bool(self.results) and len(self.results) == len(self.probes)
+        for name, result in self.results.items():
+            check = asdict(result)
+            check["age_seconds"] = round(now - result.checked_at, 1)
+            if result.status not in HEALTHY_STATUSES or now - result.checked_at > max_age:
+                ready = False
+            checks[name] = check
+        return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """The runtime stats from the last round, with their age"""
+        if self._stats is None:
+            return None
+        return {**self._stats, "age_seconds": round(time.time() - self._stats_at, 1)}
+
+
+async def probe_database() -> Optional[str]:
+    from app.core.database import get_db
+
+    try:
+        client = get_db()
+    except HTTPException:
+        if settings.DATABASE_BACKEND == "postgres":
+            if not settings.POSTGRES_DSN:
+                return NOT_CONFIGURED
+        elif not (settings.SUPABASE_URL and settings.SUPABASE_KEY):
+            return NOT_CONFIGURED
+        raise
+    # Cheapest possible indexed read; bypasses the upstream policy so probes
+    # neither trip the circuit breaker nor get answered from the stale cache
+    query = client.table("home_profiles").select("id").limit(1)
+    if getattr(query, "is_async", False):
+        await query.execute()
+    else:
+        await run_in_threadpool(query.execute)
+    return None
+
+
+async def probe_auth() -> Optional[str]:
+    from app.core.supabase import get_http_client
+
+    if local_verification_enabled():
+        return SKIPPED
+    if not settings.SUPABASE_URL:
+        return NOT_CONFIGURED
+    response = await get_http_client().get(
+        f"{settings.SUPABASE_URL}/auth/v1/health",
+        headers={"apikey": settings.SUPABASE_ANON_KEY},
+    )
+    response.raise_for_status()
+    return None
+
+
+def runtime_stats() -> Dict[str, Any]:
+    """
+    Connection pool, cache and circuit breaker statistics for verbose health
+    output; some query local files, so call it from a thread
+    """
+    from app.core import thumbnails
+    from app.core.compression import compression_stats
+    from app.core.database import database_stats
+    from app.core.jobs import job_runner
+    from app.core.profiling import profiling_stats
+    from app.core.replica import read_replica
+    from app.core.reports import report_renderer
+    from app.core.security import token_cache
+    from app.core.storage import storage_policy
+    from app.core.supabase import auth_policy, db_policy, http_client_stats
+    from app.core.traffic import traffic_recorder
+
+    return {
+        "upstreams": {
+            "database": db_policy.stats(),
+            "auth": auth_policy.stats(),
+            "storage": storage_policy.stats(),
+        },
+        "http_client": http_client_stats(),
+        "database": database_stats(),
+        "token_cache": {"entries": len(token_cache), "max_entries": token_cache.max_entries},
+        "thumbnails": thumbnails.pool_stats(),
+        "jobs": job_runner.stats(),
+        "reports": report_renderer.stats(),
+        "replica": read_replica.stats(),
+        "compression": compression_stats(),
+        "profiling": profiling_stats(),
+        "traffic_capture": traffic_recorder.stats(),
+    }
+
+
+health_monitor = HealthMonitor(
+    {"database": probe_database, "auth": probe_auth},
+    interval=settings.HEALTH_PROBE_INTERVAL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT,
+    collect_stats=runtime_stats,
+)
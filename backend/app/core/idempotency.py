@@ -0,0 +1,399 @@
+"""
+Idempotency-Key support for POST requests
+
+A client that may retry a create sends a unique `Idempotency-Key` header. The
+first request with a key runs normally and, if it succeeds, its response is
+stored for IDEMPOTENCY_TTL_SECONDS. A retry with the same key gets the stored
+response back without reaching the handler or Supabase, and a duplicate that
+arrives while the first is still running waits for it. Reusing a key with a
+different body is rejected with 422.
+
+Keys are scoped to the verified user id, the method and the path, so a retry
+still matches after the client refreshes its access token; requests without
+a valid token are passed through. Only 2xx responses are stored; after a
+failure the key is released so the client can retry.
+
+Entries live in process memory (bounded, least-recently-used eviction) or,
+with IDEMPOTENCY_STORE=redis, in Redis. The memory store is per worker: under
+gunicorn with several workers a retry that lands on another worker is not
+deduplicated, so production deployments should use the Redis store.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.security import cached_user_id, local_verification_enabled
+from app.core.supabase import verify_token
+
+logger = logging.getLogger(__name__)
+
+idempotent_requests = registry.counter(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key by outcome", ["outcome"]
+)
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Responses larger than this are not stored; create responses are a single row
+MAX_STORED_BODY = 256 * 1024
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "status_code": self.status_code,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+            "body": base64.b64encode(self.body).decode(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "StoredResponse":
+        return cls(
+            status_code=data["status_code"],
+            headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in data["headers"]],
+            body=base64.b64decode(data["body"]),
+        )
+
+
+@dataclass
+class Entry:
+    fingerprint: str
+    response: Optional[StoredResponse] = None
+    expires_at: float = 0.0
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class IdempotencyStore:
+    """Storage for idempotency keys and their responses"""
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Entry]:
+        """
+        Claim a key for a new request
+
+        Returns:
+            None if the caller now owns the key, otherwise the existing entry
+            (completed, or still pending)
+        """
+        raise NotImplementedError
+
+    async def wait(self, key: str, entry: Entry, timeout: float):
+        """Wait until a pending entry completes or is released, up to `timeout`"""
+        raise NotImplementedError
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        raise NotImplementedError
+
+    async def release(self, key: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Keys in process memory; duplicates are only caught within one worker"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is not None and entry.expires_at <= time.time():
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        self._entries[key] = Entry(fingerprint)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            evicted.done.set()
+        return None
+
+    async def wait(self, key: str, entry: Entry, timeout: float):
+        try:
+            await asyncio.wait_for(entry.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = Entry(fingerprint)
+        entry.response = response
+        entry.expires_at = time.time() + self.ttl
+        entry.done.set()
+
+    async def release(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """
+    Keys shared through Redis so retries landing on any worker are deduplicated
+
+    Pending claims expire after IDEMPOTENCY_WAIT_TIMEOUT so a crashed worker
+    cannot hold a key forever. If Redis is unreachable, requests run without
+    deduplication rather than failing.
+    """
+
+    def __init__(self, url: str, ttl: float, pending_ttl: float, prefix: str = "idempotency:"):
+        self.url = url
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.prefix = prefix
+        self._client: Optional[Any] = None
+
+    def _get_client(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("IDEMPOTENCY_STORE=redis requires the redis package") from e
+            self._client = redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @staticmethod
+    def _entry(raw: bytes) -> Entry:
+        data = json.loads(raw)
+        response = StoredResponse.from_json(data["response"]) if data.get("response") else None
+        return Entry(data["fingerprint"], response)
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Entry]:
+        client = self._get_client()
+        try:
+            claimed = await client.set(
+                self.prefix + key,
+                json.dumps({"fingerprint": fingerprint}),
+                nx=True,
+                px=int(self.pending_ttl * 1000),
+            )
+            if claimed:
+                return None
+            raw = await client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Idempotency store unavailable, not deduplicating: {str(e)}")
+            return None
+        # The key expired between SET and GET: claim again
+        return self._entry(raw) if raw is not None else await self.claim(key, fingerprint)
+
+    async def wait(self, key: str, entry: Entry, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            try:
+                raw = await self._get_client().get(self.prefix + key)
+            except Exception:
+                return
+            if raw is None or self._entry(raw).response is not None:
+                return
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        try:
+            await self._get_client().set(
+                self.prefix + key,
+                json.dumps({"fingerprint": fingerprint, "response": response.to_json()}),
+                px=int(self.ttl * 1000),
+            )
+        except Exception as e:
+            logger.warning(f"Could not store idempotent response: {str(e)}")
+
+    async def release(self, key: str):
+        try:
+            await self._get_client().delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Could not release idempotency key: {str(e)}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        if settings.IDEMPOTENCY_STORE == "redis":
+            _store = RedisIdempotencyStore(
+                settings.IDEMPOTENCY_REDIS_URL, settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_WAIT_TIMEOUT
+            )
+        else:
+            _store = MemoryIdempotencyStore(settings.IDEMPOTENCY_MAX_ENTRIES, settings.IDEMPOTENCY_TTL_SECONDS)
+    return _store
+
+
+async def close_idempotency_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+async def _user_id(authorization: Optional[bytes]) -> Optional[str]:
+    """
+    The verified user id for an Authorization header, or None
+
+    Verification fills the token cache, so the handler's own authentication
+    does not repeat it.
+    """
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token:
+        return None
+    user_id = cached_user_id(token)
+    if user_id is not None or local_verification_enabled():
+        return user_id
+    try:
+        user = await verify_token(token)
+    except HTTPException:
+        return None
+    return user["id"] if user else None
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware deduplicating POST requests that carry an Idempotency-Key"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        idempotency_key = authorization = None
+        for name, value in scope["headers"]:
+            if name == HEADER:
+                idempotency_key = value
+            elif name == b"authorization":
+                authorization = value
+        if idempotency_key is None:
+            return await self.app(scope, receive, send)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            response = _error(status.HTTP_400_BAD_REQUEST, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+            return await response(scope, receive, send)
+        user_id = await _user_id(authorization)
+        if user_id is None:
+            # The handler rejects the request; there is nothing to deduplicate
+            return await self.app(scope, receive, send)
+
+        # Buffer the body to fingerprint it, then replay it to the application
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        key = hashlib.sha256(
+            b"\0".join((user_id.encode(), scope["method"].encode(), scope["path"].encode(), idempotency_key))
+        ).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store = get_idempotency_store()
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        waited = False
+        while True:
+            entry = await store.claim(key, fingerprint)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                idempotent_requests.inc(outcome="mismatch")
+                response = _error(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "Idempotency-Key was already used with a different request body",
+                )
+                return await response(scope, receive, send)
+            if entry.response is not None:
+                idempotent_requests.inc(outcome="waited" if waited else "replayed")
+                return await self._replay(entry.response, send)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                idempotent_requests.inc(outcome="conflict")
+                response = _error(status.HTTP_409_CONFLICT, "A request with this Idempotency-Key is still in progress")
+                return await response(scope, receive, send)
+            await store.wait(key, entry, remaining)
+            waited = True
+
+        idempotent_requests.inc(outcome="new")
+        await self._run(scope, body, send, store, key, fingerprint)
+
+    async def _run(self, scope, body: bytes, send, store: IdempotencyStore, key: str, fingerprint: str):
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                # The body was already consumed; block until the server reports a disconnect
+                await asyncio.Event().wait()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        captured: Dict[str, Any] = {"status": None, "headers": [], "body": []}
+        size = 0
+
+        async def capture(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= MAX_STORED_BODY:
+                    captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        except BaseException:
+            await store.release(key)
+            raise
+
+        status_code = captured["status"]
+        if status_code is not None and 200 <= status_code < 300 and size <= MAX_STORED_BODY:
+            await store.complete(
+                key, fingerprint, StoredResponse(status_code, captured["headers"], b"".join(captured["body"]))
+            )
+        else:
+            await store.release(key)
+
+    @staticmethod
+    async def _replay(response: StoredResponse, send):
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": response.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": response.body})
@@ -0,0 +1,704 @@
+"""
+Background jobs: deferred, retried and scheduled work off the request path
+
+Modules register handlers with `job_runner.task(...)`; route handlers call
+`await job_runner.enqueue(name, payload)`, which only records the job and
+returns. The runner, started and stopped by the application lifespan, claims
+due jobs and runs them with global (JOBS_CONCURRENCY) and per-task
+concurrency limits, retrying failures with exponential backoff.
+
+JOBS_BACKEND selects where jobs wait:
+- "memory": an in-process heap; fast, but queued jobs are lost on restart and
+  each worker only runs the jobs it enqueued
+- "sqlite": a local SQLite file (JOBS_SQLITE_PATH) shared by the workers on
+  one host; a durable stand-in for the database backend
+- "database": the `background_jobs` table, claimed through the
+  `claim_background_job` function so every worker and node shares one queue
+
+Claimed jobs hold a lease (JOBS_LEASE_SECONDS); a job whose worker died is
+claimed again once its lease expires. Cron schedules (`job_runner.schedule`)
+enqueue one job per time slot; with a durable backend the slot key is unique,
+so each slot runs once however many workers are scheduling it.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import parse_timestamp
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+jobs_enqueued = registry.counter("jobs_enqueued_total", "Background jobs enqueued", ["name"])
+jobs_finished = registry.counter("jobs_finished_total", "Background job attempts by outcome", ["name", "outcome"])
+job_duration = registry.histogram("job_duration_seconds", "Background job run time", ["name"])
+jobs_running = registry.gauge("jobs_running", "Background jobs running in this worker")
+jobs_queued = registry.gauge("jobs_queued", "Background jobs waiting in this worker's memory queue")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+MAX_RETRY_DELAY = 3600.0
+
+
+class JobQueueFull(Exception):
+    """The in-memory job queue is at JOBS_QUEUE_SIZE"""
+
+
+@dataclass
+class Job:
+    id: str
+    name: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    max_attempts: int = 1
+    run_at: float = 0.0
+    dedupe_key: Optional[str] = None
+    last_error: Optional[str] = None
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    handler: Handler
+    max_attempts: int
+    concurrency: int
+    timeout: float
+    running: int = 0
+
+
+@dataclass
+class Schedule:
+    cron: "CronSchedule"
+    task: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    next_run: Optional[datetime] = None
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week),
+    evaluated in UTC. Fields accept `*`, numbers, ranges `a-b`, steps `*/n` or
+    `a-b/n`, and comma-separated lists; day-of-week 0 and 7 are Sunday.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        parsed = [self._parse(value, low, high) for value, (low, high) in zip(fields, self.RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        # Standard cron: when both day fields are restricted, either may match
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(value: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in value.split(","):
+            span, _, step = part.partition("/")
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(bound) for bound in span.split("-", 1))
+            else:
+                start = end = int(span)
+            if start < low or end > high or start > end or (step and int(step) < 1):
+                raise ValueError(f"Invalid cron field {value!r}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First matching minute strictly after `moment`"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+class JobBackend:
+    """Where jobs wait between enqueue and completion"""
+
+    durable = False
+
+    async def push(self, job: Job) -> bool:
+        """Store a new job; False if a job with its dedupe key already exists"""
+        raise NotImplementedError
+
+    async def claim(self, names: List[str], worker: str, lease: float) -> Optional[Job]:
+        """Take the earliest due job for one of `names`, incrementing its attempts"""
+        raise NotImplementedError
+
+    async def complete(self, job: Job):
+        raise NotImplementedError
+
+    async def retry(self, job: Job, error: str, run_at: float):
+        raise NotImplementedError
+
+    async def fail(self, job: Job, error: str):
+        raise NotImplementedError
+
+    async def prune(self, before: float) -> int:
+        """Delete finished jobs older than `before`; returns the number removed"""
+        return 0
+
+    def next_due(self) -> Optional[float]:
+        """When the next job becomes due, if the backend knows without polling"""
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def close(self):
+        pass
+
+
+class MemoryJobBackend(JobBackend):
+    """Jobs in an in-process heap ordered by due time"""
+
+    def __init__(self, max_queued: int, dedupe_window: int = 10000):
+        self.max_queued = max_queued
+        self.dedupe_window = dedupe_window
+        self._heap: List[Tuple[float, int, Job]] = []
+        self._order = itertools.count()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        jobs_queued.set_function(lambda: float(len(self._heap)))
+
+    async def push(self, job: Job) -> bool:
+        if job.dedupe_key is not None and job.dedupe_key in self._seen:
+            return False
+        if len(self._heap) >= self.max_queued:
+            raise JobQueueFull(f"{len(self._heap)} jobs are already queued")
+        if job.dedupe_key is not None:
+            self._seen[job.dedupe_key] = None
+            while len(self._seen) > self.dedupe_window:
+                self._seen.popitem(last=False)
+        heapq.heappush(self._heap, (job.run_at, next(self._order), job))
+        return True
+
+    async def claim(self, names: List[str], worker: str, lease: float) -> Optional[Job]:
+        now = time.time()
+        skipped = []
+        found = None
+        while self._heap and self._heap[0][0] <= now:
+            item = heapq.heappop(self._heap)
+            if item[2].name in names:
+                found = item[2]
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        if found is not None:
+            found.attempts += 1
+        return found
+
+    async def complete(self, job: Job):
+        pass
+
+    async def retry(self, job: Job, error: str, run_at: float):
+        job.run_at = run_at
+        job.last_error = error
+        heapq.heappush(self._heap, (run_at, next(self._order), job))
+
+    async def fail(self, job: Job, error: str):
+        job.last_error = error
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": len(self._heap)}
+
+
+class SqliteJobBackend(JobBackend):
+    """Jobs in a local SQLite file, shared by the worker processes on one host"""
+
+    durable = True
+    SCHEMA = """
+        create table if not exists background_jobs (
+            id text primary key,
+            name text not null,
+            payload text not null,
+            status text not null default 'queued',
+            attempts integer not null default 0,
+            max_attempts integer not null default 1,
+            run_at real not null,
+            locked_by text,
+            locked_until real,
+            dedupe_key text unique,
+            last_error text,
+            created_at real not null,
+            finished_at real
+        );
+        create index if not exists background_jobs_due_idx on background_jobs (status, run_at);
+    """
+    COLUMNS = "id, name, payload, attempts, max_attempts, run_at, dedupe_key, last_error"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import sqlite3
+
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("pragma journal_mode=wal")
+            connection.execute("pragma synchronous=normal")
+            connection.executescript(self.SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _call(self, function, *args):
+        with self._lock:
+            return function(self._connect(), *args)
+
+    async def _run(self, function, *args):
+        return await run_in_threadpool(self._call, function, *args)
+
+    @staticmethod
+    def _job(row) -> Job:
+        return Job(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5], row[6], row[7])
+
+    def _push(self, connection, job: Job) -> bool:
+        cursor = connection.execute(
+            "insert or ignore into background_jobs (id, name, payload, attempts, max_attempts, run_at, dedupe_key, created_at)"
+            " values (?, ?, ?, 0, ?, ?, ?, ?)",
+            (job.id, job.name, json.dumps(job.payload), job.max_attempts, job.run_at, job.dedupe_key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def _claim(self, connection, names: List[str], worker: str, lease: float) -> Optional[Job]:
+        now = time.time()
+        connection.execute("begin immediate")
+        try:
+            row = connection.execute(
+                f"select {self.COLUMNS} from background_jobs"
+                f" where name in ({', '.join('?' * len(names))})"
+                " and ((status = 'queued' and run_at <= ?) or (status = 'running' and locked_until < ?))"
+                " order by run_at limit 1",
+                (*names, now, now),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "update background_jobs set status = 'running', attempts = attempts + 1,"
+                    " locked_by = ?, locked_until = ? where id = ?",
+                    (worker, now + lease, row[0]),
+                )
+            connection.execute("commit")
+        except BaseException:
+            connection.execute("rollback")
+            raise
+        if row is None:
+            return None
+        job = self._job(row)
+        job.attempts += 1
+        return job
+
+    async def push(self, job: Job) -> bool:
+        return await self._run(self._push, job)
+
+    async def claim(self, names: List[str], worker: str, lease: float) -> Optional[Job]:
+        return await self._run(self._claim, names, worker, lease)
+
+    async def complete(self, job: Job):
+        await self._run(lambda c: c.execute(
+            "update background_jobs set status = 'succeeded', locked_by = null, locked_until = null,"
+            " finished_at = ? where id = ?", (time.time(), job.id)
+        ))
+
+    async def retry(self, job: Job, error: str, run_at: float):
+        await self._run(lambda c: c.execute(
+            "update background_jobs set status = 'queued', run_at = ?, attempts = ?, last_error = ?,"
+            " locked_by = null, locked_until = null where id = ?", (run_at, job.attempts, error, job.id)
+        ))
+
+    async def fail(self, job: Job, error: str):
+        await self._run(lambda c: c.execute(
+            "update background_jobs set status = 'failed', last_error = ?, locked_by = null,"
+            " locked_until = null, finished_at = ? where id = ?", (error, time.time(), job.id)
+        ))
+
+    async def prune(self, before: float) -> int:
+        return await self._run(lambda c: c.execute(
+            "delete from background_jobs where status in ('succeeded', 'failed') and finished_at < ?", (before,)
+        ).rowcount)
+
+    async def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def _timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+class DatabaseJobBackend(JobBackend):
+    """Jobs in the `background_jobs` table, shared by every worker and node"""
+
+    durable = True
+
+    @staticmethod
+    def _job(row: Dict[str, Any]) -> Job:
+        run_at = parse_timestamp(row["run_at"]).timestamp()
+        return Job(
+            row["id"], row["name"], row["payload"] or {}, row["attempts"], row["max_attempts"],
+            run_at, row.get("dedupe_key"), row.get("last_error"),
+        )
+
+    async def push(self, job: Job) -> bool:
+        from app.core.database import get_db
+        from app.core.supabase import run_query
+
+        row = {
+            "id": job.id,
+            "name": job.name,
+            "payload": job.payload,
+            "max_attempts": job.max_attempts,
+            "run_at": _timestamp(job.run_at),
+            "dedupe_key": job.dedupe_key,
+        }
+        table = get_db().table("background_jobs")
+        if job.dedupe_key is None:
+            result = await run_query(table.insert(row), "insert")
+        else:
+            result = await run_query(table.upsert(row, ignore_duplicates=True, on_conflict="dedupe_key"), "insert")
+        return bool(result.data)
+
+    async def claim(self, names: List[str], worker: str, lease: float) -> Optional[Job]:
+        from app.core.database import get_db
+        from app.core.supabase import run_query
+
+        result = await run_query(
+            get_db().rpc(
+                "claim_background_job", {"p_names": names, "p_worker": worker, "p_lease_seconds": int(lease)}
+            ),
+            "write_rpc",
+        )
+        return self._job(result.data[0]) if result.data else None
+
+    async def _update(self, job: Job, values: Dict[str, Any]):
+        from app.core.database import get_db
+        from app.core.supabase import run_query
+
+        values.update({"locked_by": None, "locked_until": None})
+        await run_query(get_db().table("background_jobs").update(values).eq("id", job.id), "update")
+
+    async def complete(self, job: Job):
+        await self._update(job, {"status": "succeeded", "finished_at": _timestamp(time.time())})
+
+    async def retry(self, job: Job, error: str, run_at: float):
+        await self._update(
+            job, {"status": "queued", "run_at": _timestamp(run_at), "attempts": job.attempts, "last_error": error}
+        )
+
+    async def fail(self, job: Job, error: str):
+        await self._update(job, {"status": "failed", "last_error": error, "finished_at": _timestamp(time.time())})
+
+    async def prune(self, before: float) -> int:
+        from app.core.database import get_db
+        from app.core.supabase import run_query
+
+        result = await run_query(
+            get_db().table("background_jobs").delete()
+            .in_("status", ["succeeded", "failed"])
+            .lt("finished_at", _timestamp(before)),
+            "delete",
+        )
+        return len(result.data or [])
+
+
+def create_job_backend() -> JobBackend:
+    if settings.JOBS_BACKEND == "database":
+        return DatabaseJobBackend()
+    if settings.JOBS_BACKEND == "sqlite":
+        return SqliteJobBackend(settings.JOBS_SQLITE_PATH)
+    return MemoryJobBackend(settings.JOBS_QUEUE_SIZE)
+
+
+class JobRunner:
+    """Registry of job handlers and the loops that dispatch and schedule them"""
+
+    def __init__(self):
+        self._tasks: Dict[str, TaskSpec] = {}
+        self._schedules: List[Schedule] = []
+        self._backend: Optional[JobBackend] = None
+        self._running: Set[asyncio.Task] = set()
+        self._loops: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        jobs_running.set_function(lambda: float(len(self._running)))
+
+    @property
+    def backend(self) -> JobBackend:
+        if self._backend is None:
+            self._backend = create_job_backend()
+        return self._backend
+
+    def task(
+        self,
+        name: str,
+        *,
+        max_attempts: int = 3,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Callable[[Handler], Handler]:
+        """
+        Register a coroutine function as a job handler
+
+        Args:
+            name: Job name used when enqueueing, e.g. "reports.generate"
+            max_attempts: Runs before a failing job is given up on
+            concurrency: Jobs of this name running at once per worker
+                (default: no limit beyond JOBS_CONCURRENCY)
+            timeout: Seconds before a run is cancelled and counted as a
+                failure; capped at JOBS_LEASE_SECONDS
+        """
+        def register(handler: Handler) -> Handler:
+            self._tasks[name] = TaskSpec(
+                name, handler, max(1, max_attempts), concurrency or settings.JOBS_CONCURRENCY,
+                min(timeout or settings.JOBS_LEASE_SECONDS, settings.JOBS_LEASE_SECONDS),
+            )
+            return handler
+        return register
+
+    def schedule(self, cron: str, task: str, payload: Optional[Dict[str, Any]] = None):
+        """Enqueue `task` at every time matching a cron expression (UTC)"""
+        self._schedules.append(Schedule(CronSchedule(cron), task, payload or {}))
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict[str, Any]] = None,
+        *,
+        delay: float = 0.0,
+        dedupe_key: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Queue a job and return without waiting for it
+
+        Args:
+            name: Registered job name
+            payload: JSON-serializable arguments for the handler
+            delay: Seconds to wait before the job becomes due
+            dedupe_key: Skip the job if one with this key was already queued
+
+        Returns:
+            The job id, or None if it was a duplicate
+
+        Raises:
+            JobQueueFull: The in-memory backend is at JOBS_QUEUE_SIZE
+        """
+        spec = self._tasks.get(name)
+        if spec is None:
+            raise ValueError(f"No job handler registered for {name!r}")
+        # Round-trip through JSON so payloads behave the same with every backend
+        job = Job(
+            str(uuid.uuid4()), name, json.loads(json.dumps(payload or {})),
+            max_attempts=spec.max_attempts, run_at=time.time() + delay, dedupe_key=dedupe_key,
+        )
+        if not await self.backend.push(job):
+            return None
+        jobs_enqueued.inc(name=name)
+        if self._wake is not None:
+            self._wake.set()
+        return job.id
+
+    def start(self):
+        if self._loops:
+            return
+        self._wake = asyncio.Event()
+        self._loops = [asyncio.create_task(self._dispatch())]
+        if self._schedules:
+            self._loops.append(asyncio.create_task(self._schedule_loop()))
+        logger.info(f"Job runner started ({settings.JOBS_BACKEND} backend, {len(self._tasks)} tasks)")
+
+    async def stop(self):
+        """Stop claiming jobs, give running jobs a grace period, then cancel them"""
+        for loop in self._loops:
+            loop.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+        if self._running:
+            _, pending = await asyncio.wait(set(self._running), timeout=settings.JOBS_SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._backend is not None:
+            queued = self._backend.stats().get("queued")
+            if queued:
+                logger.warning(f"Discarding {queued} queued jobs held in memory")
+            await self._backend.close()
+            self._backend = None
+        self._wake = None
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(settings.JOBS_RETRY_BACKOFF * (2 ** (attempts - 1)), MAX_RETRY_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _execute(self, spec: TaskSpec, job: Job):
+        started = time.perf_counter()
+        try:
+            if job.attempts > job.max_attempts:
+                # Reclaimed after its worker died on the final attempt
+                raise RuntimeError(job.last_error or "Job exceeded its attempts")
+            await asyncio.wait_for(spec.handler(job.payload), spec.timeout)
+        except asyncio.CancelledError:
+            # Shutting down: make the job due again for the next worker, without
+            # counting the interrupted run as an attempt
+            job.attempts -= 1
+            await self.backend.retry(job, "Interrupted by shutdown", time.time())
+            jobs_finished.inc(name=spec.name, outcome="interrupted")
+            raise
+        except Exception as e:
+            error = f"Timed out after {spec.timeout:g}s" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            if job.attempts < job.max_attempts:
+                delay = self._retry_delay(job.attempts)
+                logger.warning(f"Job {spec.name} {job.id} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+                await self.backend.retry(job, error[:1000], time.time() + delay)
+                jobs_finished.inc(name=spec.name, outcome="retried")
+            else:
+                logger.error(f"Job {spec.name} {job.id} failed after {job.attempts} attempts: {error}")
+                await self.backend.fail(job, error[:1000])
+                jobs_finished.inc(name=spec.name, outcome="failed")
+        else:
+            await self.backend.complete(job)
+            jobs_finished.inc(name=spec.name, outcome="succeeded")
+        finally:
+            job_duration.observe(time.perf_counter() - started, name=spec.name)
+
+    def _start_job(self, spec: TaskSpec, job: Job):
+        spec.running += 1
+        task = asyncio.create_task(self._execute(spec, job))
+        self._running.add(task)
+
+        def finished(task: asyncio.Task):
+            spec.running -= 1
+            self._running.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Error finishing job {spec.name} {job.id}: {task.exception()}")
+            if self._wake is not None:
+                self._wake.set()
+
+        task.add_done_callback(finished)
+
+    async def _fill(self):
+        while len(self._running) < settings.JOBS_CONCURRENCY:
+            names = [name for name, spec in self._tasks.items() if spec.running < spec.concurrency]
+            if not names:
+                return
+            job = await self.backend.claim(names, self.worker_id, settings.JOBS_LEASE_SECONDS)
+            if job is None:
+                return
+            spec = self._tasks.get(job.name)
+            if spec is None:
+                await self.backend.fail(job, f"No job handler registered for {job.name!r}")
+                continue
+            self._start_job(spec, job)
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            timeout = settings.JOBS_POLL_INTERVAL
+            try:
+                await self._fill()
+            except Exception as e:
+                logger.error(f"Error claiming jobs: {str(e)}")
+            if not self.backend.durable:
+                # The memory backend knows when its next job is due, so it never polls.
+                # Jobs already due but not claimed are waiting for a free slot,
+                # and a finishing job sets the wake event.
+                due = self.backend.next_due()
+                now = time.time()
+                timeout = due - now if due is not None and due > now else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _schedule_loop(self):
+        now = datetime.now(timezone.utc)
+        for schedule in self._schedules:
+            schedule.next_run = schedule.cron.next_after(now)
+        while True:
+            upcoming = min(schedule.next_run for schedule in self._schedules)
+            await asyncio.sleep(max((upcoming - datetime.now(timezone.utc)).total_seconds(), 0.0))
+            now = datetime.now(timezone.utc)
+            for schedule in self._schedules:
+                if schedule.next_run > now:
+                    continue
+                slot = schedule.next_run
+                schedule.next_run = schedule.cron.next_after(now)
+                try:
+                    await self.enqueue(
+                        schedule.task, schedule.payload, dedupe_key=f"cron:{schedule.task}:{slot.isoformat()}"
+                    )
+                except Exception as e:
+                    logger.error(f"Error scheduling {schedule.task}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.JOBS_BACKEND,
+            "running": len(self._running),
+            "tasks": {name: spec.running for name, spec in self._tasks.items()},
+            "schedules": [
+                {"task": s.task, "cron": s.cron.expression, "next_run": s.next_run.isoformat() if s.next_run else None}
+                for s in self._schedules
+            ],
+            **(self._backend.stats() if self._backend is not None else {}),
+        }
+
+
+job_runner = JobRunner()
+
+
+@job_runner.task("jobs.prune", max_attempts=1)
+async def prune_jobs(payload: Dict[str, Any]):
+    """Delete finished jobs older than JOBS_RETENTION_DAYS"""
+    removed = await job_runner.backend.prune(time.time() - settings.JOBS_RETENTION_DAYS * 86400)
+    if removed:
+        logger.info(f"Pruned {removed} finished jobs")
+
+
+job_runner.schedule("17 3 * * *", "jobs.prune")
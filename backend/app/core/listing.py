@@ -0,0 +1,202 @@
+"""
+Filters and sort order for list endpoints, embedded children for detail endpoints
+
+Routers collect their typed query parameters into a ListQuery and apply it
+to the database query, so filtering happens in PostgREST or SQL and only
+matching rows are returned. Rows that are already local (from the read
+replica) are filtered and sorted in process with the same semantics.
+
+List endpoints also accept `?ids=` to fetch known rows in one query, with
+ownership checked for the whole set at once.
+
+Detail endpoints accept `?include=` for child resources; each Include adds
+an embedded table to the parent's select, so the parent and its children
+come back from one query.
+"""
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core.database import TableQuery, filter_rows, sort_rows
+
+SORT_DESCRIPTION = "Comma-separated fields to sort by, each optionally prefixed with '-' for descending"
+IDS_DESCRIPTION = "Comma-separated ids to fetch instead of listing; filters and sort do not apply"
+INCLUDE_DESCRIPTION = "Comma-separated related resources to embed in the response"
+INCLUDE_LIMIT_DESCRIPTION = "Maximum number of embedded {name} (default: all)"
+
+# Most ids accepted by one multi-get request
+MAX_IDS = 100
+
+# Recorded operators whose builder method has a different name
+FILTER_METHODS = {"in": "in_", "is": "is_"}
+
+
+def sort_pattern(fields: Sequence[str]) -> str:
+    """Regex accepted by a `sort` query parameter over these fields"""
+    names = "|".join(fields)
+    return rf"^-?({names})(,-?({names}))*$"
+
+
+def include_pattern(names: Sequence[str]) -> str:
+    """Regex accepted by an `include` query parameter over these resources"""
+    alternatives = "|".join(names)
+    return rf"^({alternatives})(,({alternatives}))*$"
+
+
+def parse_include(include: Optional[str]) -> List[str]:
+    """Resource names from a validated `include` parameter, without repeats"""
+    return list(dict.fromkeys(name for name in (include or "").split(",") if name))
+
+
+def parse_ids(ids: str) -> List[str]:
+    """
+    Ids from an `ids` query parameter, without repeats
+
+    Raises:
+        HTTPException: 422 if an id is not a UUID or there are more than MAX_IDS
+    """
+    parsed = []
+    for value in ids.split(","):
+        if not value.strip():
+            continue
+        try:
+            parsed.append(str(uuid.UUID(value.strip())))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid id: {value.strip()}")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed or len(parsed) > MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"ids must list between 1 and {MAX_IDS} ids"
+        )
+    return parsed
+
+
+def split_by_owner(
+    ids: List[str],
+    rows: List[Dict[str, Any]],
+    embed: str,
+    owner: Callable[[Dict[str, Any]], Optional[str]],
+    user_id: str,
+) -> Dict[str, Any]:
+    """
+    Sort the rows fetched for a multi-get into found, forbidden and missing ids
+
+    Found rows are new dicts without the embed; `rows` are left as they are,
+    since a query result may also be held by the stale read cache.
+
+    Args:
+        ids: The requested ids, in request order
+        rows: Rows fetched by id, with their owner embedded
+        embed: Name of the embedded resource holding the owner
+        owner: Returns the owning user id from the embedded resource
+        user_id: The requesting user
+    """
+    by_id = {row["id"]: row for row in rows}
+    found, forbidden, missing = [], [], []
+    for record_id in ids:
+        row = by_id.get(record_id)
+        if row is None:
+            missing.append(record_id)
+            continue
+        embedded = row.get(embed)
+        if embedded is not None and owner(embedded) == user_id:
+            found.append({key: value for key, value in row.items() if key != embed})
+        else:
+            forbidden.append(record_id)
+    return {"found": found, "forbidden": forbidden, "missing": missing}
+
+
+def add_order(query: Any, column: str, desc: bool, nullsfirst: bool = False, foreign_table: Optional[str] = None) -> Any:
+    """
+    Add a sort key to a query with its null placement spelled out
+
+    Postgres puts nulls first in a descending sort unless told otherwise, and
+    the Supabase client can only ask for `nullsfirst`, so for nulls last it is
+    given the `nullslast` modifier as part of the column. The direct backends
+    take `nullsfirst` as is.
+    """
+    if nullsfirst or isinstance(query, TableQuery):
+        return query.order(column, desc=desc, nullsfirst=nullsfirst, foreign_table=foreign_table)
+    return query.order(f"{column}{'.desc' if desc else ''}.nullslast", foreign_table=foreign_table)
+
+
+def check_range(low: Optional[date], high: Optional[date], low_name: str, high_name: str):
+    if low is not None and high is not None and low > high:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{low_name} must not be after {high_name}",
+        )
+
+
+@dataclass
+class ListQuery:
+    """Filters and sort order requested for a list endpoint"""
+    filters: List[Tuple[str, str, Any]] = field(default_factory=list)
+    orders: List[Tuple[str, bool, bool]] = field(default_factory=list)
+
+    def where(self, column: str, operator: str, value: Any) -> "ListQuery":
+        """Add a filter unless its parameter was not given"""
+        if value is not None:
+            # Dates are compared as the ISO strings the database returns
+            self.filters.append((column, operator, value.isoformat() if isinstance(value, date) else value))
+        return self
+
+    def sort(self, sort: Optional[str]) -> "ListQuery":
+        """Add the order from a validated `sort` parameter, e.g. "-date,cost" """
+        for name in (sort or "").split(","):
+            if name:
+                self.orders.append((name.lstrip("-"), name.startswith("-"), False))
+        return self
+
+    def apply(self, query: Any, order: bool = True) -> Any:
+        """
+        Add the filters (and sort order) to a table query or function call
+
+        Args:
+            query: A query builder from get_db()
+            order: Whether to add the sort order; function calls cannot be
+                ordered through PostgREST's builder, so use `sort_rows` on
+                their result instead
+        """
+        for column, operator, value in self.filters:
+            query = getattr(query, FILTER_METHODS.get(operator, operator))(column, value)
+        if order:
+            for column, desc, nullsfirst in self.orders:
+                query = add_order(query, column, desc, nullsfirst)
+        return query
+
+    def sort_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return sort_rows(rows, self.orders) if self.orders else rows
+
+    def apply_rows(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Filter and sort rows that are already in memory"""
+        return self.sort_rows(filter_rows(rows, self.filters))
+
+
+@dataclass(frozen=True)
+class Include:
+    """
+    A child resource a detail endpoint can embed
+
+    Children are ordered as the resource's list endpoint returns them, which
+    is also the read replica's order.
+    """
+    name: str
+    table: str
+    order_by: str
+    descending: bool = False
+
+    @property
+    def select(self) -> str:
+        """Embedded resource for the parent's select(), aliased to the response key"""
+        return f"{self.name}(*)" if self.name == self.table else f"{self.name}:{self.table}(*)"
+
+    def apply(self, query: Any, limit: Optional[int]) -> Any:
+        """Add this child's order and limit to a parent query that embeds it"""
+        query = add_order(query, self.order_by, self.descending, foreign_table=self.name)
+        if limit is not None:
+            query = query.limit(limit, foreign_table=self.name)
+        return query
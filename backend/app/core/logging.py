@@ -28,7 +28,8 @@ def configure_logging():
         datefmt="%Y-%m-%d %H:%M:%S",
         handlers=[
             logging.StreamHandler(sys.stdout),
-            logging.FileHandler(log_file)
+            # The file is opened on the first record written to it
+            logging.FileHandler(log_file, delay=True)
         ]
     )
     
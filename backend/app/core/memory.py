@@ -0,0 +1,138 @@
+"""
+Memory footprint reports
+
+With MEMORY_TRACING_ENABLED, tracemalloc is started when each worker starts
+(it slows allocation down noticeably, so leave it off unless investigating)
+and `memory_report` lists the source lines holding the most memory, optionally
+compared with the previous report. Without it, reports still give the
+process's resident size and the deep size of the in-process caches.
+"""
+import gc
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+_previous: Optional[tracemalloc.Snapshot] = None
+_lock = threading.Lock()
+
+
+def start_tracing():
+    if settings.MEMORY_TRACING_ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACING_FRAMES)
+
+
+def rss_bytes() -> int:
+    """Current resident set size, or the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_sizeof(*objects: Any) -> int:
+    """
+    Bytes held by `objects` and everything they reference, counting shared
+    objects (interned strings, for example) once
+    """
+    seen = set()
+    size = 0
+    pending = list(objects)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, (type, type(sys), type(deep_sizeof))):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return size
+
+
+def _rows(values: Iterable[Any]) -> int:
+    rows = 0
+    for value in values:
+        data = getattr(value, "data", None)
+        if data is not None and hasattr(data, "__len__"):
+            rows += len(data)
+    return rows
+
+
+def cache_sizes() -> Dict[str, Dict[str, Any]]:
+    """Entries and deep size of the caches holding rows and tokens"""
+    from app.core.security import token_cache
+    from app.core.supabase import db_policy
+
+    stale = db_policy.stale_cache.values() if db_policy.stale_cache is not None else []
+    stale_bytes = deep_sizeof(stale)
+    rows = _rows(stale)
+    return {
+        "stale_reads": {
+            "entries": len(stale),
+            "rows": rows,
+            "bytes": stale_bytes,
+            "bytes_per_row": round(stale_bytes / rows, 1) if rows else None,
+            "compact": db_policy.stale_cache.compact is not None if db_policy.stale_cache is not None else False,
+        },
+        "verified_tokens": {"entries": len(token_cache), "bytes": deep_sizeof(token_cache._entries)},
+    }
+
+
+def _statistics(stats: List[Any], limit: int) -> List[Dict[str, Any]]:
+    top = []
+    for stat in stats[:limit]:
+        entry = {
+            "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "size": stat.size,
+            "count": stat.count,
+        }
+        if hasattr(stat, "size_diff"):
+            entry["size_diff"] = stat.size_diff
+            entry["count_diff"] = stat.count_diff
+        top.append(entry)
+    return top
+
+
+def memory_report(group_by: str = "lineno", limit: int = 25, compare: bool = False) -> Dict[str, Any]:
+    """
+    Resident size, cache sizes and, when tracing, the largest allocation sites
+
+    Args:
+        group_by: tracemalloc grouping: "lineno", "filename" or "traceback"
+        limit: Number of allocation sites to list
+        compare: List the sites that grew most since the previous report instead
+
+    Blocks for as long as taking the snapshot does; call it from a thread.
+    """
+    global _previous
+    report: Dict[str, Any] = {
+        "rss_bytes": rss_bytes(),
+        "tracing": tracemalloc.is_tracing(),
+        "caches": cache_sizes(),
+    }
+    if not tracemalloc.is_tracing():
+        return report
+
+    current, peak = tracemalloc.get_traced_memory()
+    report["traced"] = {"current": current, "peak": peak, "overhead": tracemalloc.get_tracemalloc_memory()}
+    with _lock:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        previous, _previous = _previous, snapshot
+    if compare and previous is not None:
+        report["compared_to_previous"] = True
+        report["top"] = _statistics(snapshot.compare_to(previous, group_by), limit)
+    else:
+        report["top"] = _statistics(snapshot.statistics(group_by), limit)
+    return report
@@ -0,0 +1,435 @@
+"""
+In-memory backend (DATABASE_BACKEND=memory) for tests and benchmarks
+
+Rows live in per-table dicts keyed by id, with secondary indexes on the
+columns the API looks rows up by (owner and parent ids), so handlers can be
+exercised and profiled without a Supabase project or a Postgres server.
+Queries answer like the real schema in supabase/migrations: missing columns
+take their defaults, ids and timestamps are generated, updated_at is bumped
+on update, foreign keys are checked and deletes cascade to child rows. The
+ownership RPCs and the cascade/move functions are implemented in Python and
+raise the same SQLSTATEs.
+
+Data is per process and lost on restart; pair it with JOBS_BACKEND=memory.
+"""
+import copy
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.database import (
+    FOREIGN_KEYS, Database, Embed, QueryError, QueryResult, RpcQuery, TableQuery, filter_rows, matches,
+    relationship, sort_rows,
+)
+
+
+@dataclass
+class Schema:
+    columns: Tuple[str, ...]
+    required: Tuple[str, ...] = ()
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    indexes: Tuple[str, ...] = ()
+    unique: Tuple[str, ...] = ()
+    # column -> parent table; rows are deleted with their parent
+    references: Dict[str, str] = field(default_factory=dict)
+    touch_updated_at: bool = False
+
+
+SCHEMAS: Dict[str, Schema] = {
+    "home_profiles": Schema(
+        columns=("id", "user_id", "address", "construction_year", "images", "created_at", "updated_at"),
+        required=("user_id", "address", "construction_year"),
+        indexes=("user_id",),
+        touch_updated_at=True,
+    ),
+    "appliances": Schema(
+        columns=(
+            "id", "home_profile_id", "name", "category", "purchase_date", "warranty_expiration_date",
+            "warranty_document", "notes", "created_at", "updated_at",
+        ),
+        required=("home_profile_id", "name", "category", "purchase_date"),
+        indexes=("home_profile_id",),
+        references=FOREIGN_KEYS["appliances"],
+        touch_updated_at=True,
+    ),
+    "service_records": Schema(
+        columns=(
+            "id", "appliance_id", "date", "service_type", "provider_name", "provider_contact", "cost",
+            "notes", "invoice_document", "created_at", "updated_at",
+        ),
+        required=("appliance_id", "date", "service_type", "provider_name", "cost"),
+        indexes=("appliance_id",),
+        references=FOREIGN_KEYS["service_records"],
+        touch_updated_at=True,
+    ),
+    "maintenance_reminders": Schema(
+        columns=(
+            "id", "appliance_id", "title", "description", "due_date", "recurring", "recurrence_pattern",
+            "completed", "created_at", "updated_at",
+        ),
+        required=("appliance_id", "title", "due_date"),
+        defaults={"recurring": False, "completed": False},
+        indexes=("appliance_id",),
+        references=FOREIGN_KEYS["maintenance_reminders"],
+        touch_updated_at=True,
+    ),
+    "file_uploads": Schema(
+        columns=(
+            "id", "user_id", "kind", "path", "filename", "content_type", "size", "checksum", "status",
+            "created_at", "completed_at",
+        ),
+        required=("user_id", "kind", "path", "filename", "content_type"),
+        defaults={"status": "pending"},
+        indexes=("user_id",),
+        unique=("path",),
+    ),
+    "report_jobs": Schema(
+        columns=(
+            "id", "user_id", "home_profile_id", "format", "status", "data_hash", "size", "error",
+            "created_at", "started_at", "finished_at",
+        ),
+        required=("user_id", "home_profile_id", "format"),
+        defaults={"status": "queued"},
+        indexes=("user_id", "home_profile_id"),
+        references=FOREIGN_KEYS["report_jobs"],
+    ),
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _json_value(value: Any) -> Any:
+    """Store values as PostgREST would return them: JSON types only"""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return json.loads(json.dumps(value, default=str))
+
+
+def _copy_row(row: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    names = columns if columns is not None else row.keys()
+    return {
+        name: copy.deepcopy(row[name]) if isinstance(row.get(name), (list, dict)) else row.get(name)
+        for name in names
+    }
+
+
+class Table:
+    """Rows of one table by id, with value -> ids indexes on selected columns"""
+
+    def __init__(self, name: str, schema: Schema):
+        self.name = name
+        self.schema = schema
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Set[str]]] = {
+            column: {} for column in schema.indexes + schema.unique
+        }
+
+    def index(self, row: Dict[str, Any]):
+        for column, index in self.indexes.items():
+            if row.get(column) is not None:
+                index.setdefault(row[column], set()).add(row["id"])
+
+    def unindex(self, row: Dict[str, Any]):
+        for column, index in self.indexes.items():
+            ids = index.get(row.get(column))
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del index[row[column]]
+
+    def candidates(self, filters: List[Tuple[str, str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Rows that may match: narrowed by an id or indexed-column filter when there is one"""
+        for column, operator, value in filters:
+            if operator not in ("eq", "in") or (column != "id" and column not in self.indexes):
+                continue
+            values = value if operator == "in" else [value]
+            if column == "id":
+                ids = [str(item) for item in dict.fromkeys(values)]
+            else:
+                index = self.indexes[column]
+                ids = [row_id for item in dict.fromkeys(values) for row_id in index.get(item, ())]
+            return [self.rows[row_id] for row_id in ids if row_id in self.rows]
+        return list(self.rows.values())
+
+    def select(self, filters: List[Tuple[str, str, Any]]) -> List[Dict[str, Any]]:
+        return [row for row in self.candidates(filters) if matches(row, filters)]
+
+
+class MemoryDatabase(Database):
+    """Database backend over in-process dicts; see the module docstring"""
+
+    def __init__(self, schemas: Optional[Dict[str, Schema]] = None):
+        self.tables = {name: Table(name, schema) for name, schema in (schemas or SCHEMAS).items()}
+        self.functions: Dict[str, Callable[..., Any]] = {
+            "get_user_appliances": self._get_user_appliances,
+            "get_user_service_records": self._get_user_service_records,
+            "get_user_reminders": self._get_user_reminders,
+            "delete_home_profile_cascade": self._delete_home_profile_cascade,
+            "delete_appliance_cascade": self._delete_appliance_cascade,
+            "move_appliances": self._move_appliances,
+        }
+
+    def _table(self, name: str) -> Table:
+        table = self.tables.get(name)
+        if table is None:
+            raise QueryError(f'relation "public.{name}" does not exist', "42P01")
+        return table
+
+    def clear(self):
+        """Delete every row, e.g. between tests"""
+        for table in self.tables.values():
+            table.rows.clear()
+            for index in table.indexes.values():
+                index.clear()
+
+    # Constraints
+
+    def _check_row(self, table: Table, row: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+        for column in table.schema.required:
+            if row.get(column) is None:
+                raise QueryError(
+                    f'null value in column "{column}" of relation "{table.name}" violates not-null constraint', "23502"
+                )
+        for column in table.schema.unique:
+            if previous is not None and previous.get(column) == row.get(column):
+                continue
+            if row.get(column) is not None and table.indexes[column].get(row[column]):
+                raise QueryError(f'duplicate key value violates unique constraint "{table.name}_{column}_key"', "23505")
+        for column, parent in table.schema.references.items():
+            if previous is not None and previous.get(column) == row.get(column):
+                continue
+            if row.get(column) is not None and row[column] not in self.tables[parent].rows:
+                raise QueryError(
+                    f'insert or update on table "{table.name}" violates foreign key constraint '
+                    f'"{table.name}_{column}_fkey"',
+                    "23503",
+                )
+
+    def _new_row(self, table: Table, values: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(values) - set(table.schema.columns)
+        if unknown:
+            raise QueryError(f"Could not find the '{sorted(unknown)[0]}' column of '{table.name}'", "PGRST204")
+        now = _now()
+        row = {column: None for column in table.schema.columns}
+        row.update(table.schema.defaults)
+        row["id"] = str(uuid.uuid4())
+        if "created_at" in row:
+            row["created_at"] = now
+        if "updated_at" in row:
+            row["updated_at"] = now
+        row.update({column: _json_value(value) for column, value in values.items()})
+        row["id"] = str(row["id"])
+        return row
+
+    def _store(self, table: Table, row: Dict[str, Any]):
+        if row["id"] in table.rows:
+            raise QueryError(f'duplicate key value violates unique constraint "{table.name}_pkey"', "23505")
+        self._check_row(table, row)
+        table.rows[row["id"]] = row
+        table.index(row)
+
+    def _update_row(self, table: Table, row: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(values) - set(table.schema.columns)
+        if unknown:
+            raise QueryError(f"Could not find the '{sorted(unknown)[0]}' column of '{table.name}'", "PGRST204")
+        updated = {**row, **{column: _json_value(value) for column, value in values.items()}}
+        if updated["id"] != row["id"]:
+            raise QueryError("Updating primary keys is not supported", "0A000")
+        if table.schema.touch_updated_at:
+            updated["updated_at"] = _now()
+        self._check_row(table, updated, previous=row)
+        table.unindex(row)
+        table.rows[row["id"]] = updated
+        table.index(updated)
+        return updated
+
+    def _delete_rows(self, table: Table, rows: List[Dict[str, Any]]):
+        for row in rows:
+            if table.rows.pop(row["id"], None) is not None:
+                table.unindex(row)
+        ids = [row["id"] for row in rows]
+        if not ids:
+            return
+        # on delete cascade
+        for child in self.tables.values():
+            for column, parent in child.schema.references.items():
+                if parent == table.name:
+                    self._delete_rows(child, child.select([(column, "in", ids)]))
+
+    # Queries
+
+    async def execute(self, query: TableQuery) -> QueryResult:
+        table = self._table(query.table)
+
+        if query.action == "select":
+            rows = table.select(query.filters)
+            if query.orders:
+                rows = sort_rows(rows, query.orders)
+            if query.limit_count is not None:
+                rows = rows[:query.limit_count]
+            columns, embeds = query.selection()
+            result = [_copy_row(row, columns) for row in rows]
+            for embed in embeds:
+                self._embed(table, embed, rows, result)
+            return QueryResult(result)
+
+        if query.action in ("insert", "upsert"):
+            values = query.values if isinstance(query.values, list) else [query.values]
+            if not values:
+                raise ValueError("No rows to insert")
+            conflict = [name.strip() for name in (query.on_conflict or "id").split(",")]
+            new_rows = [self._new_row(table, row) for row in values]
+            returned = []
+            for values_row, row in zip(values, new_rows):
+                if query.action == "upsert":
+                    existing = table.select([(column, "eq", row[column]) for column in conflict])
+                    if existing:
+                        if not query.ignore_duplicates:
+                            updates = {column: value for column, value in values_row.items() if column not in conflict}
+                            returned.append(self._update_row(table, existing[0], updates))
+                        continue
+                self._store(table, row)
+                returned.append(row)
+            return QueryResult([_copy_row(row) for row in returned])
+
+        if query.action == "update":
+            if not query.values:
+                raise ValueError("No values to update")
+            rows = [self._update_row(table, row, query.values) for row in table.select(query.filters)]
+            return QueryResult([_copy_row(row) for row in rows])
+
+        if query.action == "delete":
+            rows = table.select(query.filters)
+            self._delete_rows(table, rows)
+            return QueryResult([_copy_row(row) for row in rows])
+
+        raise ValueError(f"Unsupported query action: {query.action}")
+
+    def _embed(self, table: Table, embed: Embed, rows: List[Dict[str, Any]], result: List[Dict[str, Any]]):
+        """Add an embedded table's rows to each selected row, as PostgREST's resource embedding"""
+        local, remote, many = relationship(table.name, embed.table)
+        embedded = self._table(embed.table)
+        for row, output in zip(rows, result):
+            related = embedded.select([(remote, "eq", row[local])]) if row[local] is not None else []
+            if many:
+                if embed.orders:
+                    related = sort_rows(related, embed.orders)
+                if embed.limit is not None:
+                    related = related[:embed.limit]
+            else:
+                related = related[:1]
+            children = [_copy_row(child, embed.columns) for child in related]
+            for inner in embed.embeds:
+                self._embed(embedded, inner, related, children)
+            output[embed.name] = children if many else (children[0] if children else None)
+
+    async def call(self, query: RpcQuery) -> QueryResult:
+        function = self.functions.get(query.function)
+        if function is None:
+            raise QueryError(f"Could not find the function public.{query.function}", "PGRST202")
+        data = function(**query.params)
+        if query.filters:
+            if not isinstance(data, list):
+                raise QueryError(f"Cannot filter the result of public.{query.function}, it does not return rows", "PGRST100")
+            data = filter_rows(data, query.filters)
+        return QueryResult(data)
+
+    # Database functions (supabase/migrations)
+
+    def _user_appliances(self, user_id: str) -> List[Dict[str, Any]]:
+        profile_ids = list(self.tables["home_profiles"].indexes["user_id"].get(user_id, ()))
+        return self.tables["appliances"].select([("home_profile_id", "in", profile_ids)])
+
+    def _user_children(self, table: str, user_id: str) -> List[Dict[str, Any]]:
+        appliance_ids = [row["id"] for row in self._user_appliances(user_id)]
+        return self.tables[table].select([("appliance_id", "in", appliance_ids)])
+
+    def _get_user_appliances(self, p_user_id: str) -> List[Dict[str, Any]]:
+        return [_copy_row(row) for row in self._user_appliances(p_user_id)]
+
+    def _get_user_service_records(self, p_user_id: str) -> List[Dict[str, Any]]:
+        rows = sort_rows(self._user_children("service_records", p_user_id), [("date", True, False)])
+        return [_copy_row(row) for row in rows]
+
+    def _get_user_reminders(self, p_user_id: str) -> List[Dict[str, Any]]:
+        rows = sort_rows(self._user_children("maintenance_reminders", p_user_id), [("due_date", False, False)])
+        return [_copy_row(row) for row in rows]
+
+    def _owned_profile(self, user_id: str, home_profile_id: str, action: str) -> Dict[str, Any]:
+        profile = self.tables["home_profiles"].rows.get(str(home_profile_id))
+        if profile is None:
+            raise QueryError("Home profile not found", "P0002")
+        if profile["user_id"] != user_id:
+            raise QueryError(f"Not authorized to {action}", "42501")
+        return profile
+
+    def _delete_children(self, appliance_ids: List[str]) -> Dict[str, int]:
+        counts = {}
+        for table in ("maintenance_reminders", "service_records"):
+            rows = self.tables[table].select([("appliance_id", "in", appliance_ids)])
+            self._delete_rows(self.tables[table], rows)
+            counts[table] = len(rows)
+        return counts
+
+    def _delete_home_profile_cascade(self, p_user_id: str, p_home_profile_id: str) -> Dict[str, int]:
+        profile = self._owned_profile(p_user_id, p_home_profile_id, "delete this home profile")
+        appliances = self.tables["appliances"].select([("home_profile_id", "eq", profile["id"])])
+        counts = self._delete_children([row["id"] for row in appliances])
+        self._delete_rows(self.tables["appliances"], appliances)
+        self._delete_rows(self.tables["home_profiles"], [profile])
+        return {
+            "home_profiles": 1,
+            "appliances": len(appliances),
+            "service_records": counts["service_records"],
+            "maintenance_reminders": counts["maintenance_reminders"],
+        }
+
+    def _delete_appliance_cascade(self, p_user_id: str, p_appliance_id: str) -> Dict[str, int]:
+        appliance = self.tables["appliances"].rows.get(str(p_appliance_id))
+        if appliance is None:
+            raise QueryError("Appliance not found", "P0002")
+        profile = self.tables["home_profiles"].rows.get(appliance["home_profile_id"])
+        if profile is None or profile["user_id"] != p_user_id:
+            raise QueryError("Not authorized to delete this appliance", "42501")
+        counts = self._delete_children([appliance["id"]])
+        self._delete_rows(self.tables["appliances"], [appliance])
+        return {
+            "home_profiles": 0,
+            "appliances": 1,
+            "service_records": counts["service_records"],
+            "maintenance_reminders": counts["maintenance_reminders"],
+        }
+
+    def _move_appliances(
+        self,
+        p_user_id: str,
+        p_from_home_profile_id: str,
+        p_to_home_profile_id: str,
+        p_appliance_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        if p_from_home_profile_id == p_to_home_profile_id:
+            raise QueryError("Source and target home profiles must differ", "22023")
+        profiles = self.tables["home_profiles"].rows
+        found = [profiles.get(str(profile_id)) for profile_id in (p_from_home_profile_id, p_to_home_profile_id)]
+        if None in found:
+            raise QueryError("Home profile not found", "P0002")
+        if any(profile["user_id"] != p_user_id for profile in found):
+            raise QueryError("Not authorized to move appliances between these home profiles", "42501")
+
+        table = self.tables["appliances"]
+        filters = [("home_profile_id", "eq", found[0]["id"])]
+        if p_appliance_ids is not None:
+            filters.append(("id", "in", [str(appliance_id) for appliance_id in p_appliance_ids]))
+        rows = table.select(filters)
+        if p_appliance_ids is not None and len(rows) != len(set(p_appliance_ids)):
+            # Checked before writing: the SQL function rolls back instead
+            raise QueryError("Some appliances do not belong to the source home profile", "P0002")
+        moved = [self._update_row(table, row, {"home_profile_id": found[1]["id"]})["id"] for row in rows]
+        return {"moved": len(moved), "appliance_ids": moved}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rows": {name: len(table.rows) for name, table in self.tables.items()}}
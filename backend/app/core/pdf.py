@@ -0,0 +1,112 @@
+"""
+Minimal PDF writer for text reports
+
+Lays out lines of text in a monospaced built-in font (Courier), so tabular
+reports align without font metrics and no PDF library is needed.
+"""
+from typing import List, Sequence, Tuple
+
+PAGE_WIDTH = 612  # US Letter, in points
+PAGE_HEIGHT = 792
+MARGIN = 40
+FONT_SIZE = 8
+LEADING = 10.5
+# Courier glyphs are 0.6 em wide
+CHARS_PER_LINE = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+LINES_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+
+
+def _escape(text: str) -> str:
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(line: str) -> List[str]:
+    if len(line) <= CHARS_PER_LINE:
+        return [line]
+    indent = " " * (len(line) - len(line.lstrip()) + 2)
+    wrapped = [line[:CHARS_PER_LINE]]
+    rest = line[CHARS_PER_LINE:]
+    width = CHARS_PER_LINE - len(indent)
+    while rest:
+        wrapped.append(indent + rest[:width])
+        rest = rest[width:]
+    return wrapped
+
+
+def paginate(lines: Sequence[str]) -> List[List[str]]:
+    """Wrap long lines and split into pages; a line of "\\f" forces a page break"""
+    pages: List[List[str]] = [[]]
+    for line in lines:
+        if line == "\f":
+            if pages[-1]:
+                pages.append([])
+            continue
+        for part in _wrap(line):
+            if len(pages[-1]) >= LINES_PER_PAGE:
+                pages.append([])
+            pages[-1].append(part)
+    return pages
+
+
+def render_text_pdf(lines: Sequence[str], title: str = "") -> bytes:
+    """
+    Render lines of text as a PDF document
+
+    Args:
+        lines: Text lines; long lines are wrapped, "\\f" starts a new page
+        title: Document title metadata
+
+    Returns:
+        PDF file contents
+    """
+    pages = paginate(lines)
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+    info = add(b"<< /Title (%s) /Producer (Home Maintenance API) >>" % _escape(title).encode("latin-1"))
+
+    page_ids: List[int] = []
+    for number, page in enumerate(pages, start=1):
+        footer = f"Page {number} of {len(pages)}"
+        text = [b"BT /F1 %d Tf %.1f TL %d %d Td" % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+        for line in page:
+            text.append(b"(%s) Tj T*" % _escape(line).encode("latin-1"))
+        text.append(b"ET")
+        text.append(
+            b"BT /F1 %d Tf %d %d Td (%s) Tj ET"
+            % (FONT_SIZE, PAGE_WIDTH - MARGIN - int(len(footer) * FONT_SIZE * 0.6), MARGIN // 2, footer.encode())
+        )
+        stream = b"\n".join(text)
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, content, font)
+        ))
+
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids),
+        len(page_ids),
+    )
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets: List[Tuple[int, int]] = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append((number, len(output)))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for _, offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, info, xref
+    )
+    return bytes(output)
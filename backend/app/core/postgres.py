@@ -0,0 +1,357 @@
+"""
+Direct Postgres backend (DATABASE_BACKEND=postgres) over an asyncpg pool
+
+Queries skip PostgREST entirely: no HTTP round trip, no URL-encoded filters
+and no JSON body to parse. uuid, date and timestamp columns travel in Postgres's
+binary format and are formatted here as the strings PostgREST returns, so
+routers see identical rows; numeric (decoded to float) and json/jsonb use
+the text format, which is what their binary forms carry anyway.
+
+Builders compile to parameterized SQL whose text depends only on the query's
+shape (list filters use `= any($n)` and limits are parameters), so every hot
+query - get by id, list by owner, the ownership RPCs - is prepared once per
+connection and reused from asyncpg's statement cache. Behind a transaction-
+mode pooler (e.g. PgBouncer) set POSTGRES_STATEMENT_CACHE_SIZE=0.
+
+Embedded tables, as in select("*, reminders:maintenance_reminders(*)"),
+compile to correlated jsonb subqueries, so a row and its related rows come
+back in one statement, shaped as PostgREST's resource embedding.
+"""
+import asyncio
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import (
+    Database, Embed, QueryError, QueryResult, RpcQuery, TableQuery, check_identifier, parse_timestamp, relationship,
+)
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "like", "ilike": "ilike"}
+IS_VALUES = {None: "null", "null": "null", True: "true", "true": "true", False: "false", "false": "false"}
+
+
+def _quote(name: str) -> str:
+    return f'"{check_identifier(name)}"'
+
+
+# Binary dates and timestamps count from 2000-01-01
+POSTGRES_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+POSTGRES_EPOCH_ORDINAL = date(2000, 1, 1).toordinal()
+# infinity and -infinity
+INFINITE = {2 ** 63 - 1: "infinity", -(2 ** 63): "-infinity", 2 ** 31 - 1: "infinity", -(2 ** 31): "-infinity"}
+
+
+def _encode_uuid(value: Any) -> bytes:
+    return bytes.fromhex(str(value).replace("-", ""))
+
+
+def _decode_uuid(value: bytes) -> str:
+    hex_value = value.hex()
+    return f"{hex_value[:8]}-{hex_value[8:12]}-{hex_value[12:16]}-{hex_value[16:20]}-{hex_value[20:]}"
+
+
+def _encode_date(value: Any) -> Tuple[int]:
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value.toordinal() - POSTGRES_EPOCH_ORDINAL,)
+
+
+def _decode_date(value: Tuple[int]) -> str:
+    days = value[0]
+    if days in INFINITE:
+        return INFINITE[days]
+    return date.fromordinal(days + POSTGRES_EPOCH_ORDINAL).isoformat()
+
+
+def _encode_timestamp(value: Any) -> Tuple[int]:
+    if isinstance(value, str):
+        value = parse_timestamp(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return ((value - POSTGRES_EPOCH) // timedelta(microseconds=1),)
+
+
+def _isoformat(moment: datetime) -> str:
+    # PostgREST prints fractional seconds without trailing zeros
+    value = moment.isoformat()
+    if moment.microsecond % 10 == 0 and moment.microsecond:
+        head, _, tail = value.partition(".")
+        fraction, offset = tail[:6].rstrip("0"), tail[6:]
+        value = f"{head}.{fraction}{offset}"
+    return value
+
+
+def _decode_timestamptz(value: Tuple[int]) -> str:
+    # ISO 8601 in UTC, as PostgREST returns it: "2026-10-19T01:02:03.123456+00:00"
+    microseconds = value[0]
+    if microseconds in INFINITE:
+        return INFINITE[microseconds]
+    return _isoformat(POSTGRES_EPOCH + timedelta(microseconds=microseconds))
+
+
+def _decode_timestamp(value: Tuple[int]) -> str:
+    microseconds = value[0]
+    if microseconds in INFINITE:
+        return INFINITE[microseconds]
+    return _isoformat((POSTGRES_EPOCH + timedelta(microseconds=microseconds)).replace(tzinfo=None))
+
+
+async def _init_connection(connection):
+    """Decode types the way PostgREST serializes them to JSON"""
+    await connection.set_type_codec(
+        "uuid", schema="pg_catalog", encoder=_encode_uuid, decoder=_decode_uuid, format="binary"
+    )
+    # "tuple" is the binary format, split into its integer fields
+    for type_name, decoder in (
+        ("date", _decode_date),
+        ("timestamptz", _decode_timestamptz),
+        ("timestamp", _decode_timestamp),
+    ):
+        encoder = _encode_date if type_name == "date" else _encode_timestamp
+        await connection.set_type_codec(
+            type_name, schema="pg_catalog", encoder=encoder, decoder=decoder, format="tuple"
+        )
+    await connection.set_type_codec(
+        "numeric", schema="pg_catalog", encoder=str, decoder=float, format="text"
+    )
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            type_name, schema="pg_catalog", encoder=json.dumps, decoder=json.loads, format="text"
+        )
+
+
+class Compiler:
+    """Turns a TableQuery into SQL text and positional arguments"""
+
+    def __init__(self):
+        self.args: List[Any] = []
+        self.aliases = 0
+
+    def param(self, value: Any) -> str:
+        self.args.append(value)
+        return f"${len(self.args)}"
+
+    def where(self, filters: List[Tuple[str, str, Any]]) -> str:
+        conditions = []
+        for column, operator, value in filters:
+            if operator == "in":
+                conditions.append(f"{_quote(column)} = any({self.param(list(value))})")
+            elif operator == "is":
+                keyword = IS_VALUES.get(value if not isinstance(value, str) else value.lower())
+                if keyword is None:
+                    raise ValueError(f"Invalid is_ value: {value!r}")
+                conditions.append(f"{_quote(column)} is {keyword}")
+            else:
+                conditions.append(f"{_quote(column)} {OPERATORS[operator]} {self.param(value)}")
+        return f" where {' and '.join(conditions)}" if conditions else ""
+
+    @staticmethod
+    def order_by(orders: List[Tuple[str, bool, bool]]) -> str:
+        if not orders:
+            return ""
+        return " order by " + ", ".join(
+            f"{_quote(column)} {'desc' if desc else 'asc'} nulls {'first' if nullsfirst else 'last'}"
+            for column, desc, nullsfirst in orders
+        )
+
+    @staticmethod
+    def select_list(columns: Optional[List[str]]) -> str:
+        return ", ".join(_quote(column) for column in columns) if columns else "*"
+
+    def embed(self, table: str, embed: Embed, source: str = "source") -> str:
+        """
+        Correlated subquery returning an embedded table as JSON: one object
+        (or null) for a referenced row, an array for referencing rows
+        """
+        local, remote, many = relationship(table, embed.table)
+        self.aliases += 1
+        alias = f"embed_{self.aliases}"
+        select = ", ".join(
+            ([self.select_list(embed.columns)] if embed.columns != [] else [])
+            + [self.embed(embed.table, inner, alias) for inner in embed.embeds]
+        )
+        rows = (
+            f"select {select} from public.{_quote(embed.table)} {alias}"
+            f" where {alias}.{_quote(remote)} = {source}.{_quote(local)}"
+        )
+        if not many:
+            return f"(select to_jsonb(e) from ({rows}) e) as {_quote(embed.name)}"
+        rows += self.order_by(embed.orders)
+        if embed.limit is not None:
+            rows += f" limit {self.param(embed.limit)}"
+        return f"coalesce((select jsonb_agg(to_jsonb(e)) from ({rows}) e), '[]'::jsonb) as {_quote(embed.name)}"
+
+    @staticmethod
+    def _rows(values: Any) -> List[Dict[str, Any]]:
+        rows = values if isinstance(values, list) else [values]
+        if not rows:
+            raise ValueError("No rows to insert")
+        return rows
+
+    def compile(self, query: TableQuery) -> str:
+        table = f"public.{_quote(query.table)}"
+        if query.action == "select":
+            columns, embeds = query.selection()
+            select = ", ".join(
+                ([self.select_list(columns)] if columns != [] else []) + [self.embed(query.table, embed) for embed in embeds]
+            )
+            sql = f"select {select} from {table} source{self.where(query.filters)}{self.order_by(query.orders)}"
+            if query.limit_count is not None:
+                sql += f" limit {self.param(query.limit_count)}"
+            return sql
+
+        if query.action in ("insert", "upsert"):
+            rows = self._rows(query.values)
+            columns = list(dict.fromkeys(column for row in rows for column in row))
+            values = ", ".join(
+                "(" + ", ".join(self.param(row[column]) if column in row else "default" for column in columns) + ")"
+                for row in rows
+            )
+            sql = f"insert into {table} ({', '.join(_quote(column) for column in columns)}) values {values}"
+            if query.action == "upsert":
+                conflict = [check_identifier(name.strip()) for name in (query.on_conflict or "id").split(",")]
+                target = ", ".join(_quote(name) for name in conflict)
+                updates = [column for column in columns if column not in conflict]
+                if query.ignore_duplicates or not updates:
+                    sql += f" on conflict ({target}) do nothing"
+                else:
+                    sql += f" on conflict ({target}) do update set " + ", ".join(
+                        f"{_quote(column)} = excluded.{_quote(column)}" for column in updates
+                    )
+            return sql + " returning *"
+
+        if query.action == "update":
+            if not query.values:
+                raise ValueError("No values to update")
+            assignments = ", ".join(f"{_quote(column)} = {self.param(value)}" for column, value in query.values.items())
+            return f"update {table} set {assignments}{self.where(query.filters)} returning *"
+
+        if query.action == "delete":
+            return f"delete from {table}{self.where(query.filters)} returning *"
+
+        raise ValueError(f"Unsupported query action: {query.action}")
+
+
+def _query_error(error: Exception) -> QueryError:
+    import asyncpg
+
+    if isinstance(error, asyncpg.PostgresError):
+        return QueryError(getattr(error, "message", None) or str(error), getattr(error, "sqlstate", None))
+    # Connection dropped, refused or closed underneath the query
+    return QueryError(str(error) or type(error).__name__, transient=True)
+
+
+class PostgresDatabase(Database):
+    """Database backend over an asyncpg connection pool, created on first query"""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, statement_cache_size: int = 256):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+        self._returns_set: Dict[str, bool] = {}
+
+    @classmethod
+    def from_settings(cls) -> "PostgresDatabase":
+        from fastapi import HTTPException, status
+
+        if not settings.POSTGRES_DSN:
+            logger.warning("POSTGRES_DSN not provided. Direct database access will be unavailable.")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database not configured")
+        return cls(
+            settings.POSTGRES_DSN,
+            min_size=settings.POSTGRES_POOL_MIN_SIZE,
+            max_size=settings.POSTGRES_POOL_MAX_SIZE,
+            statement_cache_size=settings.POSTGRES_STATEMENT_CACHE_SIZE,
+        )
+
+    async def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                import asyncpg
+
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    init=_init_connection,
+                )
+                logger.info(f"Postgres pool created ({self.min_size}-{self.max_size} connections)")
+        return self._pool
+
+    async def fetch(self, sql: str, *args) -> List[Any]:
+        try:
+            pool = await self._get_pool()
+            return await pool.fetch(sql, *args)
+        except QueryError:
+            raise
+        except (OSError, asyncio.TimeoutError) as e:
+            raise _query_error(e) from e
+        except Exception as e:
+            import asyncpg
+
+            if isinstance(e, (asyncpg.PostgresError, asyncpg.InterfaceError)):
+                raise _query_error(e) from e
+            raise
+
+    async def execute(self, query: TableQuery) -> QueryResult:
+        compiler = Compiler()
+        sql = compiler.compile(query)
+        rows = await self.fetch(sql, *compiler.args)
+        return QueryResult([dict(row) for row in rows])
+
+    async def _function_returns_set(self, function: str) -> bool:
+        returns_set = self._returns_set.get(function)
+        if returns_set is None:
+            rows = await self.fetch(
+                "select p.proretset from pg_catalog.pg_proc p"
+                " join pg_catalog.pg_namespace n on n.oid = p.pronamespace"
+                " where n.nspname = 'public' and p.proname = $1 limit 1",
+                function,
+            )
+            if not rows:
+                raise QueryError(f"Could not find the function public.{function}", "PGRST202")
+            returns_set = self._returns_set[function] = rows[0]["proretset"]
+        return returns_set
+
+    async def call(self, query: RpcQuery) -> QueryResult:
+        compiler = Compiler()
+        arguments = ", ".join(f"{_quote(name)} => {compiler.param(value)}" for name, value in query.params.items())
+        function = f"public.{_quote(query.function)}({arguments})"
+        if await self._function_returns_set(query.function):
+            rows = await self.fetch(f"select * from {function}{compiler.where(query.filters)}", *compiler.args)
+            return QueryResult([dict(row) for row in rows])
+        if query.filters:
+            raise QueryError(f"Cannot filter the result of public.{query.function}, it does not return rows", "PGRST100")
+        rows = await self.fetch(f"select {function} as result", *compiler.args)
+        return QueryResult(rows[0]["result"] if rows else None)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._pool is None:
+            return {"created": False}
+        return {
+            "created": True,
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "max_size": self.max_size,
+        }
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
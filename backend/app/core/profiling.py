@@ -0,0 +1,252 @@
+"""
+On-demand sampling profiles of single requests
+
+With PROFILING_ENABLED, ProfilingMiddleware profiles a request when an admin
+sends `X-Profile: true` (the caller is identified without a network call, as
+for rate limiting) or at random with probability PROFILING_SAMPLE_RATE. The
+response then carries an `X-Profile-Id` header. While any request is being
+profiled, a sampler thread wakes every PROFILING_INTERVAL seconds and records
+where each profiled request is:
+- while its task is running, the event loop thread's stack from the
+  middleware down, so handler code, dependencies and pydantic validation show
+  up as they execute
+- while it is suspended, the chain of coroutines it is awaiting, ending in
+  "[awaiting <type>]", so upstream round trips and threadpool work appear as
+  waits under the code that started them; work the request hands to other
+  tasks (asyncio.wait_for, streaming responses) also shows as a wait
+
+Finished profiles are kept in a bounded ring buffer per worker
+(PROFILING_BUFFER_SIZE) and served to admins by /admin/profiles in the
+collapsed-stack format read by flamegraph.pl, speedscope and inferno. With
+PROFILING_ENABLED=false the middleware is not installed and nothing runs.
+"""
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.security import cached_user_id
+
+logger = logging.getLogger(__name__)
+
+profiled_requests = registry.counter("profiled_requests_total", "Requests profiled by trigger", ["trigger"])
+
+HEADER = b"x-profile"
+ID_HEADER = b"x-profile-id"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Profile:
+    """Samples of one request, as counts per collapsed stack"""
+
+    def __init__(self, method: str, path: str, trigger: str, root_frame, thread_id: int, task: Optional[asyncio.Task]):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.route = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.status_code: Optional[int] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._root_frame = root_frame
+        self._thread_id = thread_id
+        self._task = task
+
+    def sample(self, frames: Dict[int, Any]):
+        """Record one sample; called by the sampler thread"""
+        names: List[str] = []
+        frame = frames.get(self._thread_id)
+        while frame is not None and frame is not self._root_frame:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if frame is not None:
+            # The request is running on the event loop thread
+            names.append(_frame_name(frame))
+            names.reverse()
+        else:
+            names = self._await_chain()
+        if names:
+            self.stacks[";".join(names)] += 1
+            self.samples += 1
+
+    def _await_chain(self) -> List[str]:
+        """Where the suspended request is waiting, from the middleware down"""
+        if self._task is None:
+            return []
+        names: List[str] = []
+        awaitable = self._task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                break
+            if frame is self._root_frame or names:
+                names.append(_frame_name(frame))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        if names:
+            # asyncio futures are awaited through an iterator named FutureIter
+            waiting = type(awaitable).__qualname__.replace("FutureIter", "Future") if awaitable is not None else "wakeup"
+            names.append(f"[awaiting {waiting}]")
+        return names
+
+    def finish(self, status_code: Optional[int], duration: float, route: Optional[str]):
+        self.status_code = status_code
+        self.duration = duration
+        if route:
+            self.route = route
+        self._root_frame = self._task = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "trigger": self.trigger,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+        }
+
+
+def collapsed(profiles: Iterable[Profile]) -> str:
+    """Collapsed stacks ("frame;frame;frame count" per line), merged over profiles"""
+    stacks: Counter = Counter()
+    for profile in profiles:
+        stacks.update(profile.stacks)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class Sampler:
+    """A thread sampling the active profiles, idle while there are none"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._switch_interval: Optional[float] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active[profile.id] = profile
+            if len(self._active) == 1:
+                # The sampler needs the GIL to see CPU-bound code: shorten the switch interval while profiling
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.interval))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._active.pop(profile.id, None)
+            if not self._active:
+                self._wake.clear()
+                if self._switch_interval is not None:
+                    sys.setswitchinterval(self._switch_interval)
+                    self._switch_interval = None
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for profile in self._active.values():
+                    try:
+                        profile.sample(frames)
+                    except Exception as e:  # pragma: no cover - a racing frame must not stop the sampler
+                        logger.debug(f"Profile sample failed: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+
+sampler = Sampler(settings.PROFILING_INTERVAL)
+profiles: Deque[Profile] = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    for profile in profiles:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+def profiling_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.PROFILING_ENABLED,
+        "sample_rate": settings.PROFILING_SAMPLE_RATE,
+        "active": len(sampler),
+        "buffered": len(profiles),
+        "buffer_size": profiles.maxlen,
+    }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling admin-requested and randomly sampled requests"""
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def _trigger(self, scope) -> Optional[str]:
+        requested = authorization = None
+        for name, value in scope["headers"]:
+            if name == HEADER:
+                requested = value
+            elif name == b"authorization":
+                authorization = value
+        if requested is not None and requested.lower() in (b"1", b"true") and authorization:
+            scheme, _, token = authorization.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and cached_user_id(token.strip()) in settings.ADMIN_USERS:
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(
+            scope["method"], scope["path"], trigger, sys._getframe(), threading.get_ident(), asyncio.current_task()
+        )
+        status_code = None
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(ID_HEADER, profile.id.encode())]}
+            await send(message)
+
+        profiled_requests.inc(trigger=trigger)
+        sampler.add(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.remove(profile)
+            route = scope.get("route")
+            profile.finish(status_code, time.perf_counter() - started, getattr(route, "path", None))
+            profiles.append(profile)
@@ -0,0 +1,240 @@
+"""
+Token-bucket rate limiting per user (or client IP) and route group
+
+Each identity gets one bucket per route group holding up to `burst` tokens,
+refilled at `rate` tokens per second; a request takes one token or is rejected
+with 429 and a Retry-After header. Buckets live in process memory by default,
+or in Redis (RATE_LIMIT_STORE=redis) so all workers and nodes share them.
+
+The middleware is pure ASGI and never makes a network call to identify the
+caller: the user id comes from the verified-token cache or local JWT
+verification, the same path get_current_user takes, otherwise the client IP.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.security import cached_user_id
+
+logger = logging.getLogger(__name__)
+
+rate_limited = registry.counter("rate_limited_requests_total", "Requests rejected by the rate limiter", ["group"])
+store_errors = registry.counter("rate_limit_store_errors_total", "Rate limit store failures (requests allowed)")
+
+# Paths that are never limited: probes, metrics and static content
+EXEMPT_PREFIXES = ("/health", "/metrics", "/thumbnails", "/storage/local", "/docs", "/redoc", "/openapi.json")
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    """Rate limit group for a request, or None if it is not limited"""
+    if method == "OPTIONS" or path == "/" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/uploads"):
+        return "uploads"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+def configured_limits() -> Dict[str, Tuple[float, int]]:
+    """(tokens per second, burst) for each route group, from settings"""
+    return {
+        "read": (settings.RATE_LIMIT_READ_PER_SECOND, settings.RATE_LIMIT_READ_BURST),
+        "write": (settings.RATE_LIMIT_WRITE_PER_SECOND, settings.RATE_LIMIT_WRITE_BURST),
+        "uploads": (settings.RATE_LIMIT_UPLOADS_PER_SECOND, settings.RATE_LIMIT_UPLOADS_BURST),
+    }
+
+
+class BucketStore:
+    """Storage for token buckets"""
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """
+        Take one token from a bucket
+
+        Returns:
+            Whether the request is allowed, and if not, seconds until a token is available
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryBucketStore(BucketStore):
+    """
+    Buckets in process memory, bounded by least-recent use
+
+    Limits apply per worker process. An evicted bucket is recreated full,
+    which only ever errs towards allowing requests.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(burst)
+            bucket = self._buckets[key] = [tokens, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            self._buckets.move_to_end(key)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1.0 - tokens) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Refill and take atomically, using the Redis server clock so that workers on
+# different hosts agree on elapsed time
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """
+    Buckets shared through Redis, so limits hold across workers and nodes
+
+    If Redis is unreachable requests are allowed rather than failed; the
+    limiter protects the upstream quota and must not become an outage itself.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self._client: Optional[Any] = None
+        self._script: Optional[Any] = None
+
+    def _get_script(self):
+        if self._script is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("RATE_LIMIT_STORE=redis requires the redis package") from e
+            self._client = redis.from_url(self.url, socket_timeout=0.25, socket_connect_timeout=0.25)
+            self._script = self._client.register_script(TAKE_SCRIPT)
+        return self._script
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._get_script()(keys=[self.prefix + key], args=[rate, burst])
+        except Exception as e:
+            store_errors.inc()
+            logger.warning(f"Rate limit store unavailable, allowing request: {str(e)}")
+            return True, 0.0
+        return bool(allowed), float(retry_after)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._script = None
+
+
+_store: Optional[BucketStore] = None
+
+
+def get_bucket_store() -> BucketStore:
+    global _store
+    if _store is None:
+        if settings.RATE_LIMIT_STORE == "redis":
+            _store = RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+        else:
+            _store = MemoryBucketStore(settings.RATE_LIMIT_MAX_KEYS)
+    return _store
+
+
+async def close_bucket_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+def client_identity(scope: Dict[str, Any]) -> str:
+    """Bucket identity for a request: the authenticated user id, or the client IP"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                user_id = cached_user_id(token.strip())
+                if user_id:
+                    return f"user:{user_id}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the configured per-group token buckets"""
+
+    def __init__(self, app, limits: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.app = app
+        self.limits = {
+            group: limit
+            for group, limit in (limits if limits is not None else configured_limits()).items()
+            if limit[0] > 0 and limit[1] > 0
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        group = route_group(scope["method"], scope["path"])
+        limit = self.limits.get(group) if group else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        rate, burst = limit
+        allowed, retry_after = await get_bucket_store().take(f"{group}:{client_identity(scope)}", rate, burst)
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        rate_limited.inc(group=group)
+        retry_after_seconds = max(1, math.ceil(retry_after))
+        response = JSONResponse(
+            {"detail": "Rate limit exceeded"},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={
+                "Retry-After": str(retry_after_seconds),
+                "RateLimit-Limit": str(burst),
+                "RateLimit-Remaining": "0",
+                "RateLimit-Reset": str(retry_after_seconds),
+            },
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,305 @@
+"""
+Compact in-process representations of appliance, service record and reminder rows
+
+Rows from PostgREST or Postgres are dicts of strings: each row pays for a hash
+table, and every copy of a category, date or parent id is its own string.
+Caches that hold many rows (the stale read cache, and any ownership map or
+agenda kept in process) store them in these forms instead:
+- a record type per table with `__slots__`, whose repeated values (foreign
+  keys, categories, service types, dates) are interned so equal strings are
+  stored once per process
+- RecordArray, a column store for a list of rows: one tuple per column, with
+  ids packed as 16-byte UUIDs and UTC timestamps as 64-bit integers
+
+Both round-trip exactly: `to_row()` returns a dict equal to the one compacted,
+including which columns were absent. Keys outside the table's columns (such
+as embedded resources) are kept per row in a dict.
+"""
+import copy
+import re
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, ClassVar, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Tuple, Type
+
+
+class _Missing:
+    """Marks a column absent from the row, as opposed to a null value"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class Record:
+    """Base of the compact record types; subclasses are built by `record_type`"""
+    __slots__ = ("_extra",)
+
+    table: ClassVar[str]
+    columns: ClassVar[Tuple[str, ...]]
+    column_set: ClassVar[FrozenSet[str]]
+    interned: ClassVar[FrozenSet[str]]
+
+    def __init__(self, row: Dict[str, Any]):
+        extra = None
+        for column in self.columns:
+            value = row.get(column, MISSING)
+            setattr(self, column, _intern(value) if column in self.interned else value)
+        if len(row) > len(self.columns) or not self.column_set.issuperset(row):
+            extra = {key: value for key, value in row.items() if key not in self.column_set}
+        self._extra = extra or None
+
+    def to_row(self) -> Dict[str, Any]:
+        row = {}
+        for column in self.columns:
+            value = getattr(self, column)
+            if value is not MISSING:
+                row[column] = value
+        if self._extra:
+            row.update(self._extra)
+        return row
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and self.to_row() == other.to_row()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_row()!r})"
+
+
+def record_type(name: str, table: str, columns: Tuple[str, ...], interned: Iterable[str]) -> Type[Record]:
+    """Build a `__slots__` record class for `table`"""
+    return type(name, (Record,), {
+        "__slots__": columns,
+        "table": table,
+        "columns": columns,
+        "column_set": frozenset(columns),
+        "interned": frozenset(interned),
+    })
+
+
+ApplianceRecord = record_type(
+    "ApplianceRecord", "appliances",
+    (
+        "id", "home_profile_id", "name", "category", "purchase_date", "warranty_expiration_date",
+        "warranty_document", "notes", "created_at", "updated_at",
+    ),
+    ("home_profile_id", "category", "purchase_date", "warranty_expiration_date"),
+)
+
+ServiceRecordRecord = record_type(
+    "ServiceRecordRecord", "service_records",
+    (
+        "id", "appliance_id", "date", "service_type", "provider_name", "provider_contact", "cost",
+        "notes", "invoice_document", "created_at", "updated_at",
+    ),
+    ("appliance_id", "date", "service_type", "provider_name", "provider_contact"),
+)
+
+ReminderRecord = record_type(
+    "ReminderRecord", "maintenance_reminders",
+    (
+        "id", "appliance_id", "title", "description", "due_date", "recurring", "recurrence_pattern",
+        "completed", "created_at", "updated_at",
+    ),
+    ("appliance_id", "title", "due_date", "recurrence_pattern"),
+)
+
+RECORD_TYPES: Dict[str, Type[Record]] = {
+    record.table: record for record in (ApplianceRecord, ServiceRecordRecord, ReminderRecord)
+}
+
+# Database functions returning the rows of one table
+RPC_TABLES = {
+    "get_user_appliances": "appliances",
+    "get_user_service_records": "service_records",
+    "get_user_reminders": "maintenance_reminders",
+}
+
+
+UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+UTC_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?\+00:00")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Stands for null in a packed timestamp column
+NULL_TIMESTAMP = -(2 ** 63)
+
+
+class UuidColumn:
+    """Canonical UUID strings packed as 16 bytes each"""
+    __slots__ = ("_packed",)
+
+    def __init__(self, packed: bytes):
+        self._packed = packed
+
+    @classmethod
+    def pack(cls, values: List[Any]) -> Optional["UuidColumn"]:
+        if not all(type(value) is str and UUID.fullmatch(value) for value in values):
+            return None
+        return cls(bytes.fromhex("".join(values).replace("-", "")))
+
+    def __len__(self) -> int:
+        return len(self._packed) // 16
+
+    def __getitem__(self, index: int) -> str:
+        value = self._packed[index * 16:index * 16 + 16].hex()
+        return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+class TimestampColumn:
+    """UTC timestamp strings packed as microseconds since the epoch, 8 bytes each"""
+    __slots__ = ("_packed",)
+
+    def __init__(self, packed: array):
+        self._packed = packed
+
+    @classmethod
+    def pack(cls, values: List[Any]) -> Optional["TimestampColumn"]:
+        packed = []
+        for value in values:
+            if value is None:
+                packed.append(NULL_TIMESTAMP)
+                continue
+            # Only strings in the form isoformat() produces, so the row round-trips exactly
+            if type(value) is not str or not UTC_TIMESTAMP.fullmatch(value):
+                return None
+            try:
+                moment = datetime.fromisoformat(value)
+            except ValueError:
+                return None
+            # Exact: current timestamps in microseconds are far below 2 ** 53
+            packed.append(round(moment.timestamp() * 1000000))
+        return cls(array("q", packed))
+
+    def __len__(self) -> int:
+        return len(self._packed)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        value = self._packed[index]
+        return None if value == NULL_TIMESTAMP else (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+# Packed representations tried for a column, by name
+PACKERS = {
+    "id": UuidColumn.pack,
+    "created_at": TimestampColumn.pack,
+    "updated_at": TimestampColumn.pack,
+}
+
+
+class RecordArray:
+    """
+    Rows of one table stored column-wise: a tuple per column, or a packed
+    column where every value allows it (ids are unique, so interning cannot
+    help them; packing saves ~60 bytes per id and ~75 per timestamp)
+    """
+    __slots__ = ("record", "_columns", "_extra", "_length")
+
+    def __init__(self, record: Type[Record], rows: List[Dict[str, Any]]):
+        self.record = record
+        self._length = len(rows)
+        columns = []
+        for column in record.columns:
+            values = [row.get(column, MISSING) for row in rows]
+            if values.count(MISSING) == len(values):
+                # A column no row has, as from a partial select
+                columns.append(())
+                continue
+            packer = PACKERS.get(column)
+            packed = packer(values) if packer is not None else None
+            if packed is not None:
+                columns.append(packed)
+            elif column in record.interned:
+                columns.append(tuple([sys.intern(value) if type(value) is str else value for value in values]))
+            else:
+                columns.append(tuple(values))
+        self._columns = tuple(columns)
+        extra = {}
+        column_set = record.column_set
+        for index, row in enumerate(rows):
+            if len(row) > len(column_set) or not column_set.issuperset(row):
+                extra[index] = {key: value for key, value in row.items() if key not in column_set}
+        self._extra = extra or None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def row(self, index: int) -> Dict[str, Any]:
+        if not -self._length <= index < self._length:
+            raise IndexError(index)
+        index %= self._length
+        row = {}
+        for column, values in zip(self.record.columns, self._columns):
+            if not values:
+                continue
+            value = values[index]
+            if value is not MISSING:
+                row[column] = value
+        if self._extra and index in self._extra:
+            row.update(self._extra[index])
+        return row
+
+    def __getitem__(self, index: int) -> Record:
+        return self.record(self.row(index))
+
+    def __iter__(self) -> Iterator[Record]:
+        for index in range(self._length):
+            yield self.record(self.row(index))
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        return [self.row(index) for index in range(self._length)]
+
+
+def table_for_key(cache_key: Hashable) -> Optional[str]:
+    """The table whose rows a read returns, from its stale-cache key (see `run_query`)"""
+    if not isinstance(cache_key, tuple) or not cache_key or not isinstance(cache_key[0], str):
+        return None
+    if cache_key[0] == "rpc":
+        return RPC_TABLES.get(cache_key[1]) if len(cache_key) > 1 else None
+    if cache_key[0] in RECORD_TYPES:
+        return cache_key[0]
+    # PostgREST request path: .../rest/v1/<table> or .../rest/v1/rpc/<function>
+    name = cache_key[0].rstrip("/").rsplit("/", 1)[-1]
+    return name if name in RECORD_TYPES else RPC_TABLES.get(name)
+
+
+def compact_rows(table: Optional[str], rows: Any) -> Any:
+    """`rows` as a RecordArray when they are a list of rows of a table with a record type"""
+    record = RECORD_TYPES.get(table) if table else None
+    if record is None or type(rows) is not list or not all(type(row) is dict for row in rows):
+        return rows
+    return RecordArray(record, rows)
+
+
+def expand_rows(rows: Any) -> Any:
+    return rows.to_rows() if isinstance(rows, RecordArray) else rows
+
+
+def compact_result(cache_key: Hashable, result: Any, min_rows: int = 0) -> Any:
+    """
+    A copy of a query result with its rows compacted, for the stale cache;
+    results of fewer than `min_rows` rows are returned as they are
+    """
+    data = getattr(result, "data", None)
+    if type(data) is not list or len(data) < min_rows:
+        return result
+    rows = compact_rows(table_for_key(cache_key), data)
+    if not isinstance(rows, RecordArray):
+        return result
+    compacted = copy.copy(result)
+    compacted.data = rows
+    return compacted
+
+
+def expand_result(result: Any) -> Any:
+    """The query result `compact_result` was given, with plain dict rows"""
+    if not isinstance(getattr(result, "data", None), RecordArray):
+        return result
+    expanded = copy.copy(result)
+    expanded.data = result.data.to_rows()
+    return expanded
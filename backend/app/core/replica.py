@@ -0,0 +1,463 @@
+"""
+Local read replica (REPLICA_ENABLED=true): a SQLite copy of each served user's rows
+
+Most traffic reads slowly changing data. With the replica on, the GET
+handlers of the home profile, appliance, service record and reminder routers
+answer from a SQLite file on local disk (WAL mode, memory-mapped) holding the
+rows of the users this host has served:
+- A user's rows are pulled from the database on their first read and pulled
+  again once the copy is older than REPLICA_MAX_STALENESS seconds
+- Writes still go to the database; each one is applied to the copy when it
+  is published as a change (write-through), so users read their own writes
+- Worker processes on a host share the file, so a write through any of them
+  is visible to all; changes made on other hosts show up within
+  REPLICA_MAX_STALENESS
+
+A row that is not in the user's copy (another user's, or one that does not
+exist) is looked up upstream as before, so 403 and 404 responses are
+unchanged. Lookups are indexed and run inline on the event loop: they take
+microseconds, less than a hop to the threadpool. Users not read for
+REPLICA_IDLE_TTL seconds are dropped by the hourly replica.prune job.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.jobs import job_runner
+from app.core.metrics import registry
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+replica_reads = registry.counter(
+    "replica_reads_total", "Reads answered by the local replica (hit) or passed upstream (miss)", ["resource", "outcome"]
+)
+replica_syncs = registry.counter("replica_syncs_total", "Pulls of a user's rows into the replica by outcome", ["outcome"])
+replica_sync_seconds = registry.histogram(
+    "replica_sync_seconds", "Time to pull a user's rows and store them in the replica",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class Resource(NamedTuple):
+    parent: Optional[str]
+    parent_column: Optional[str]
+    # Lists come back in the order of the ownership RPCs
+    sort_column: str
+    descending: bool = False
+
+
+RESOURCES: Dict[str, Resource] = {
+    "home_profiles": Resource(None, None, "created_at"),
+    "appliances": Resource("home_profiles", "home_profile_id", "created_at"),
+    "service_records": Resource("appliances", "appliance_id", "date", descending=True),
+    "maintenance_reminders": Resource("appliances", "appliance_id", "due_date"),
+}
+
+SCHEMA = """
+    create table if not exists replica_users (
+        user_id text primary key,
+        synced_at real not null default 0,
+        changed_at real not null default 0
+    );
+    create table if not exists replica_rows (
+        resource text not null,
+        id text not null,
+        user_id text not null,
+        parent_id text,
+        sort_key text,
+        data text not null,
+        primary key (resource, id)
+    ) without rowid;
+    create index if not exists replica_rows_user_idx on replica_rows (user_id, resource, sort_key);
+    create index if not exists replica_rows_parent_idx on replica_rows (resource, parent_id);
+"""
+
+
+def _record(user_id: str, resource: str, row: Dict[str, Any]) -> tuple:
+    spec = RESOURCES[resource]
+    sort_key = row.get(spec.sort_column)
+    return (
+        resource,
+        str(row["id"]),
+        user_id,
+        row.get(spec.parent_column) if spec.parent_column else None,
+        None if sort_key is None else str(sort_key),
+        dumps(row).decode(),
+    )
+
+
+async def pull_user_rows(user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """All of a user's rows in the replicated tables, read from the database"""
+    from app.core.database import get_db
+    from app.core.supabase import run_query
+
+    db = get_db()
+    if settings.USE_DB_RPC:
+        profiles, appliances, records, reminders = await asyncio.gather(
+            run_query(db.table("home_profiles").select("*").eq("user_id", user_id)),
+            run_query(db.rpc("get_user_appliances", {"p_user_id": user_id})),
+            run_query(db.rpc("get_user_service_records", {"p_user_id": user_id})),
+            run_query(db.rpc("get_user_reminders", {"p_user_id": user_id})),
+        )
+        return {
+            "home_profiles": profiles.data,
+            "appliances": appliances.data,
+            "service_records": records.data,
+            "maintenance_reminders": reminders.data,
+        }
+
+    rows: Dict[str, List[Dict[str, Any]]] = {resource: [] for resource in RESOURCES}
+    profiles = await run_query(db.table("home_profiles").select("*").eq("user_id", user_id))
+    rows["home_profiles"] = profiles.data
+    if profiles.data:
+        appliances = await run_query(
+            db.table("appliances").select("*").in_("home_profile_id", [profile["id"] for profile in profiles.data])
+        )
+        rows["appliances"] = appliances.data
+        if appliances.data:
+            appliance_ids = [appliance["id"] for appliance in appliances.data]
+            records, reminders = await asyncio.gather(
+                run_query(db.table("service_records").select("*").in_("appliance_id", appliance_ids)),
+                run_query(db.table("maintenance_reminders").select("*").in_("appliance_id", appliance_ids)),
+            )
+            rows["service_records"] = records.data
+            rows["maintenance_reminders"] = reminders.data
+    return rows
+
+
+class ReadReplica:
+    """Per-host SQLite copy of served users' rows; see the module docstring"""
+
+    def __init__(self, path: str, max_staleness: float, idle_ttl: float, mmap_size: int, enabled: bool = True):
+        self.path = path
+        self.max_staleness = max_staleness
+        self.idle_ttl = idle_ttl
+        self.mmap_size = mmap_size
+        self.enabled = enabled
+        self._reader = None
+        self._writer = None
+        self._lock = threading.Lock()
+        # user id -> when this worker last saw the user's copy synced
+        self._synced: Dict[str, float] = {}
+        self._syncing: Dict[str, "asyncio.Future[bool]"] = {}
+
+    def _connect(self, query_only: bool):
+        import sqlite3
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        connection.execute("pragma journal_mode=wal")
+        connection.execute("pragma synchronous=normal")
+        connection.execute(f"pragma mmap_size={int(self.mmap_size)}")
+        if query_only:
+            connection.execute("pragma query_only=1")
+        else:
+            connection.executescript(SCHEMA)
+        return connection
+
+    def _read(self):
+        if self._reader is None:
+            if self._writer is None:
+                self._call(lambda connection: None)  # creates the schema
+            self._reader = self._connect(query_only=True)
+        return self._reader
+
+    def _call(self, function, *args):
+        with self._lock:
+            if self._writer is None:
+                self._writer = self._connect(query_only=False)
+            return function(self._writer, *args)
+
+    # Sync
+
+    def _store(self, connection, user_id: str, rows: Dict[str, List[Dict[str, Any]]], started: float) -> bool:
+        connection.execute("begin immediate")
+        try:
+            changed = connection.execute("select changed_at from replica_users where user_id = ?", (user_id,)).fetchone()
+            if changed is not None and changed[0] >= started:
+                # Written through since the pull began, so the pull may predate the write
+                connection.execute("rollback")
+                return False
+            connection.execute("delete from replica_rows where user_id = ?", (user_id,))
+            connection.executemany(
+                "insert or replace into replica_rows (resource, id, user_id, parent_id, sort_key, data)"
+                " values (?, ?, ?, ?, ?, ?)",
+                [_record(user_id, resource, row) for resource, resource_rows in rows.items() for row in resource_rows],
+            )
+            connection.execute(
+                "insert into replica_users (user_id, synced_at) values (?, ?)"
+                " on conflict (user_id) do update set synced_at = excluded.synced_at",
+                (user_id, started),
+            )
+            connection.execute("commit")
+            return True
+        except BaseException:
+            connection.execute("rollback")
+            raise
+
+    async def _sync(self, user_id: str) -> bool:
+        started = time.time()
+        timer = time.perf_counter()
+        try:
+            rows = await pull_user_rows(user_id)
+        except Exception as e:
+            replica_syncs.inc(outcome="error")
+            if user_id in self._synced:
+                logger.warning(f"Replica refresh for user {user_id} failed, serving the previous copy: {str(e)}")
+                return True
+            logger.warning(f"Replica pull for user {user_id} failed, reading upstream: {str(e)}")
+            return False
+        stored = await run_in_threadpool(self._call, self._store, user_id, rows, started)
+        replica_sync_seconds.observe(time.perf_counter() - timer)
+        replica_syncs.inc(outcome="stored" if stored else "conflict")
+        if stored:
+            self._synced[user_id] = started
+        return stored
+
+    async def _ensure_synced(self, user_id: str) -> bool:
+        now = time.time()
+        synced = self._synced.get(user_id)
+        if synced is not None and now - synced < self.max_staleness:
+            return True
+        # Another worker on this host may have pulled the user recently
+        row = self._read().execute("select synced_at from replica_users where user_id = ?", (user_id,)).fetchone()
+        if row is not None and row[0] and now - row[0] < self.max_staleness:
+            self._synced[user_id] = row[0]
+            return True
+
+        future = self._syncing.get(user_id)
+        if future is None:
+            future = self._syncing[user_id] = asyncio.ensure_future(self._sync(user_id))
+            future.add_done_callback(lambda _: self._syncing.pop(user_id, None))
+        # Shielded: a cancelled request must not cancel a pull others wait on
+        return await asyncio.shield(future)
+
+    # Reads
+
+    async def list_rows(self, user_id: str, resource: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        All of a user's rows of one resource from the replica
+
+        Returns:
+            The rows, or None if the replica is off or has no current copy
+            (the caller reads upstream instead)
+        """
+        if not self.enabled:
+            return None
+        if not await self._ensure_synced(user_id):
+            replica_reads.inc(resource=resource, outcome="miss")
+            return None
+        order = "desc" if RESOURCES[resource].descending else "asc"
+        rows = self._read().execute(
+            f"select data from replica_rows where user_id = ? and resource = ? order by sort_key {order}",
+            (user_id, resource),
+        ).fetchall()
+        replica_reads.inc(resource=resource, outcome="hit")
+        # One parse for the whole list instead of one per row
+        return json.loads("[" + ",".join(row[0] for row in rows) + "]")
+
+    async def get_row(self, user_id: str, resource: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """
+        One of a user's rows from the replica
+
+        Returns:
+            The row, or None if the replica is off, has no current copy or the
+            row is not the user's (the caller reads upstream instead)
+        """
+        if not self.enabled:
+            return None
+        if await self._ensure_synced(user_id):
+            row = self._read().execute(
+                "select data from replica_rows where resource = ? and id = ? and user_id = ?",
+                (resource, str(record_id), user_id),
+            ).fetchone()
+            if row is not None:
+                replica_reads.inc(resource=resource, outcome="hit")
+                return json.loads(row[0])
+        replica_reads.inc(resource=resource, outcome="miss")
+        return None
+
+    async def get_rows(self, user_id: str, resource: str, record_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Several of a user's rows from the replica, in the order requested
+
+        Returns:
+            The rows, or None if the replica is off, has no current copy or any
+            of the ids is not one of the user's rows (the caller reads upstream
+            instead, to tell missing rows from other users' rows)
+        """
+        if not self.enabled:
+            return None
+        if await self._ensure_synced(user_id):
+            placeholders = ", ".join("?" * len(record_ids))
+            rows = dict(self._read().execute(
+                f"select id, data from replica_rows where resource = ? and user_id = ? and id in ({placeholders})",
+                (resource, user_id, *record_ids),
+            ).fetchall())
+            if len(rows) == len(record_ids):
+                replica_reads.inc(resource=resource, outcome="hit")
+                return [json.loads(rows[record_id]) for record_id in record_ids]
+        replica_reads.inc(resource=resource, outcome="miss")
+        return None
+
+    async def list_children(self, user_id: str, resource: str, parent_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        A user's rows of one resource under a single parent row, e.g. the
+        service records of an appliance, in the resource's list order
+
+        Returns:
+            The rows, or None if the replica is off or has no current copy
+        """
+        if not self.enabled:
+            return None
+        if not await self._ensure_synced(user_id):
+            replica_reads.inc(resource=resource, outcome="miss")
+            return None
+        order = "desc" if RESOURCES[resource].descending else "asc"
+        rows = self._read().execute(
+            "select data from replica_rows where resource = ? and parent_id = ? and user_id = ?"
+            f" order by sort_key {order}",
+            (resource, str(parent_id), user_id),
+        ).fetchall()
+        replica_reads.inc(resource=resource, outcome="hit")
+        return json.loads("[" + ",".join(row[0] for row in rows) + "]")
+
+    # Write-through
+
+    def _delete(self, connection, resource: str, ids: List[str]):
+        placeholders = ", ".join("?" * len(ids))
+        for child, spec in RESOURCES.items():
+            if spec.parent == resource:
+                child_ids = [
+                    row[0] for row in connection.execute(
+                        f"select id from replica_rows where resource = ? and parent_id in ({placeholders})", (child, *ids)
+                    )
+                ]
+                if child_ids:
+                    self._delete(connection, child, child_ids)
+        connection.execute(f"delete from replica_rows where resource = ? and id in ({placeholders})", (resource, *ids))
+
+    def _apply(self, connection, user_id: str, resource: str, action: str, record_id: str, data: Optional[Dict[str, Any]]):
+        connection.execute("begin immediate")
+        try:
+            connection.execute(
+                "insert into replica_users (user_id, changed_at) values (?, ?)"
+                " on conflict (user_id) do update set changed_at = excluded.changed_at",
+                (user_id, time.time()),
+            )
+            if action == "deleted":
+                self._delete(connection, resource, [record_id])
+            elif action == "moved" and data:
+                row = connection.execute(
+                    "select data from replica_rows where resource = ? and id = ?", (resource, record_id)
+                ).fetchone()
+                if row is not None:
+                    moved = json.loads(row[0])
+                    moved[RESOURCES[resource].parent_column] = data["to_home_profile_id"]
+                    connection.execute(
+                        "insert or replace into replica_rows (resource, id, user_id, parent_id, sort_key, data)"
+                        " values (?, ?, ?, ?, ?, ?)",
+                        _record(user_id, resource, moved),
+                    )
+            elif data:
+                connection.execute(
+                    "insert or replace into replica_rows (resource, id, user_id, parent_id, sort_key, data)"
+                    " values (?, ?, ?, ?, ?, ?)",
+                    _record(user_id, resource, data),
+                )
+            connection.execute("commit")
+        except BaseException:
+            connection.execute("rollback")
+            raise
+
+    async def apply_change(
+        self, user_id: str, resource: str, action: str, record_id: Any, data: Optional[Dict[str, Any]] = None
+    ):
+        """Apply a write that has succeeded upstream to the user's copy"""
+        if not self.enabled or resource not in RESOURCES:
+            return
+        try:
+            await run_in_threadpool(self._call, self._apply, user_id, resource, action, str(record_id), data)
+        except Exception as e:
+            # The copy may now be wrong: make the next read pull it again
+            self._synced.pop(user_id, None)
+            await run_in_threadpool(self._call, self._mark_stale, user_id)
+            logger.error(f"Error applying {resource}.{action} to the replica: {str(e)}")
+
+    # Maintenance
+
+    def _mark_stale(self, connection, user_id: str):
+        connection.execute("update replica_users set synced_at = 0 where user_id = ?", (user_id,))
+
+    def _forget(self, connection, user_ids: List[str]):
+        placeholders = ", ".join("?" * len(user_ids))
+        connection.execute("begin immediate")
+        connection.execute(f"delete from replica_rows where user_id in ({placeholders})", user_ids)
+        connection.execute(f"delete from replica_users where user_id in ({placeholders})", user_ids)
+        connection.execute("commit")
+
+    def _prune(self, connection, before: float) -> int:
+        user_ids = [
+            row[0] for row in connection.execute(
+                "select user_id from replica_users where max(synced_at, changed_at) < ?", (before,)
+            )
+        ]
+        for start in range(0, len(user_ids), 500):
+            self._forget(connection, user_ids[start:start + 500])
+        return len(user_ids)
+
+    async def prune(self) -> int:
+        """Drop the copies of users not read for REPLICA_IDLE_TTL seconds"""
+        before = time.time() - max(self.idle_ttl, 2 * self.max_staleness)
+        removed = await run_in_threadpool(self._call, self._prune, before)
+        for user_id, synced in list(self._synced.items()):
+            if synced < before:
+                del self._synced[user_id]
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        stats = {"enabled": True, "path": self.path, "users_synced_in_worker": len(self._synced)}
+        if self._reader is not None:
+            stats["users"] = self._reader.execute("select count(*) from replica_users").fetchone()[0]
+            stats["rows"] = self._reader.execute("select count(*) from replica_rows").fetchone()[0]
+        return stats
+
+    def close(self):
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = None
+        self._synced.clear()
+
+
+read_replica = ReadReplica(
+    settings.REPLICA_PATH,
+    max_staleness=settings.REPLICA_MAX_STALENESS,
+    idle_ttl=settings.REPLICA_IDLE_TTL,
+    mmap_size=settings.REPLICA_MMAP_SIZE,
+    enabled=settings.REPLICA_ENABLED,
+)
+
+
+@job_runner.task("replica.prune", max_attempts=1)
+async def prune_replica(payload: Dict[str, Any]):
+    """Drop replicated users not read for REPLICA_IDLE_TTL"""
+    removed = await read_replica.prune()
+    if removed:
+        logger.info(f"Dropped {removed} idle users from the read replica")
+
+
+if settings.REPLICA_ENABLED:
+    job_runner.schedule("23 * * * *", "replica.prune")
@@ -0,0 +1,389 @@
+"""
+Appliance lifecycle and total-cost-of-ownership reports, generated in the background
+
+Submitting a report records a job row and enqueues a background job; the job
+runner picks it up, gathers the home's data with four bulk queries and
+renders the PDF or CSV in a process pool, so neither the event loop nor the
+request that submitted it waits for rendering.
+
+Rendered files are cached under a hash of the data they were built from (and
+the report date, since ages and due dates depend on it). Re-requesting a
+report for an unchanged home returns the cached file without rendering.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.events import publish_change
+from app.core.jobs import job_runner
+from app.core.metrics import registry
+from app.core.database import get_db, parse_timestamp
+from app.core.supabase import run_query
+
+logger = logging.getLogger(__name__)
+
+# Bump when the report layout changes so cached files are not reused
+REPORT_VERSION = 1
+REPORT_MEDIA_TYPES = {"pdf": "application/pdf", "csv": "text/csv; charset=utf-8"}
+UNFINISHED = ("queued", "running")
+
+report_jobs = registry.counter("report_jobs_total", "Report jobs finished by format and outcome", ["format", "outcome"])
+report_render_seconds = registry.histogram(
+    "report_render_seconds", "Time to render a report in the process pool", ["format"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+async def gather_report_data(home_profile_id: str) -> Dict[str, Any]:
+    """
+    Load everything a report needs in four queries
+
+    Returns:
+        The home profile with its appliances, and their service records and
+        open reminders, in a stable order
+    """
+    db = get_db()
+    profile = await run_query(
+        db.table("home_profiles").select("id,address,construction_year").eq("id", home_profile_id)
+    )
+    appliances = await run_query(
+        db.table("appliances")
+        .select("id,name,category,purchase_date,warranty_expiration_date")
+        .eq("home_profile_id", home_profile_id)
+        .order("name")
+    )
+    appliance_ids = [appliance["id"] for appliance in appliances.data]
+    service_records: List[Dict[str, Any]] = []
+    reminders: List[Dict[str, Any]] = []
+    if appliance_ids:
+        service_result, reminder_result = await asyncio.gather(
+            run_query(
+                db.table("service_records")
+                .select("id,appliance_id,date,service_type,provider_name,cost")
+                .in_("appliance_id", appliance_ids)
+                .order("date")
+            ),
+            run_query(
+                db.table("maintenance_reminders")
+                .select("id,appliance_id,title,due_date,recurring")
+                .in_("appliance_id", appliance_ids)
+                .eq("completed", False)
+                .order("due_date")
+            ),
+        )
+        # Ties within a date would otherwise make the data hash unstable
+        service_records = sorted(service_result.data, key=lambda r: (r["date"], r["id"]))
+        reminders = sorted(reminder_result.data, key=lambda r: (r["due_date"], r["id"]))
+    return {
+        "home_profile": profile.data[0] if profile.data else {"id": home_profile_id},
+        "appliances": appliances.data,
+        "service_records": service_records,
+        "reminders": reminders,
+    }
+
+
+def report_hash(data: Dict[str, Any], report_format: str, as_of: date) -> str:
+    """Data-version hash identifying a rendered report"""
+    canonical = json.dumps(
+        {"version": REPORT_VERSION, "format": report_format, "as_of": as_of.isoformat(), "data": data},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def report_path(digest: str, report_format: str) -> Path:
+    """Location of a rendered report in the cache"""
+    return Path(settings.REPORT_CACHE_DIR) / digest[:2] / f"{digest}.{report_format}"
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value[:10]) if value else None
+
+
+def summarize(data: Dict[str, Any], as_of: date) -> List[Dict[str, Any]]:
+    """Per-appliance age, warranty, service history, cost and upcoming reminders"""
+    records: Dict[str, List[Dict[str, Any]]] = {}
+    for record in data["service_records"]:
+        records.setdefault(record["appliance_id"], []).append(record)
+    reminders: Dict[str, List[Dict[str, Any]]] = {}
+    for reminder in data["reminders"]:
+        reminders.setdefault(reminder["appliance_id"], []).append(reminder)
+
+    rows = []
+    for appliance in data["appliances"]:
+        purchased = _parse_date(appliance["purchase_date"])
+        warranty_ends = _parse_date(appliance.get("warranty_expiration_date"))
+        if warranty_ends is None:
+            warranty = "none"
+        elif warranty_ends >= as_of:
+            warranty = "active"
+        else:
+            warranty = "expired"
+        history = records.get(appliance["id"], [])
+        upcoming = reminders.get(appliance["id"], [])
+        rows.append({
+            "id": appliance["id"],
+            "name": appliance["name"],
+            "category": appliance["category"],
+            "purchase_date": purchased,
+            "age_years": round((as_of - purchased).days / 365.25, 1) if purchased else None,
+            "warranty_status": warranty,
+            "warranty_expiration_date": warranty_ends,
+            "service_history": history,
+            "service_count": len(history),
+            "total_cost": round(sum(float(record["cost"] or 0) for record in history), 2),
+            "last_service_date": _parse_date(history[-1]["date"]) if history else None,
+            "upcoming_reminders": upcoming,
+            "overdue_reminders": sum(1 for reminder in upcoming if _parse_date(reminder["due_date"]) < as_of),
+        })
+    return rows
+
+
+CSV_COLUMNS = [
+    "appliance_id", "name", "category", "purchase_date", "age_years", "warranty_status",
+    "warranty_expiration_date", "service_count", "total_cost", "last_service_date",
+    "next_reminder", "next_reminder_due", "overdue_reminders", "service_history", "upcoming_reminders",
+]
+
+
+def render_csv(data: Dict[str, Any], as_of: date) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+    for row in summarize(data, as_of):
+        upcoming = row["upcoming_reminders"]
+        writer.writerow([
+            row["id"], row["name"], row["category"], row["purchase_date"], row["age_years"],
+            row["warranty_status"], row["warranty_expiration_date"] or "", row["service_count"],
+            f"{row['total_cost']:.2f}", row["last_service_date"] or "",
+            upcoming[0]["title"] if upcoming else "", upcoming[0]["due_date"] if upcoming else "",
+            row["overdue_reminders"],
+            "; ".join(
+                f"{r['date']} {r['service_type']} ({r['provider_name']}) {float(r['cost'] or 0):.2f}"
+                for r in row["service_history"]
+            ),
+            "; ".join(f"{r['due_date']} {r['title']}" for r in upcoming),
+        ])
+    # BOM so spreadsheet applications detect UTF-8
+    return output.getvalue().encode("utf-8-sig")
+
+
+def render_pdf(data: Dict[str, Any], as_of: date) -> bytes:
+    from app.core.pdf import render_text_pdf
+
+    rows = summarize(data, as_of)
+    profile = data["home_profile"]
+    address = profile.get("address") or profile["id"]
+    built = f" (built {profile['construction_year']})" if profile.get("construction_year") else ""
+    total_cost = sum(row["total_cost"] for row in rows)
+    overdue = sum(row["overdue_reminders"] for row in rows)
+
+    lines = [
+        "APPLIANCE LIFECYCLE AND COST REPORT",
+        f"{address}{built}",
+        f"As of {as_of.isoformat()}: {len(rows)} appliances, total service cost {total_cost:,.2f}, "
+        f"{overdue} overdue reminders",
+        "",
+        f"{'Appliance':<26} {'Category':<14} {'Purchased':<10} {'Age':>5} {'Warranty':<19} "
+        f"{'Svc':>4} {'Cost':>11} {'Next due':<10}",
+        "-" * 106,
+    ]
+    for row in rows:
+        warranty = row["warranty_status"]
+        if row["warranty_expiration_date"]:
+            warranty = f"{warranty} {row['warranty_expiration_date'].isoformat()}"
+        next_due = row["upcoming_reminders"][0]["due_date"] if row["upcoming_reminders"] else "-"
+        age = f"{row['age_years']:.1f}" if row["age_years"] is not None else "-"
+        lines.append(
+            f"{row['name'][:26]:<26} {row['category'][:14]:<14} {str(row['purchase_date'] or '-'):<10} {age:>5} "
+            f"{warranty:<19} {row['service_count']:>4} {row['total_cost']:>11,.2f} {next_due:<10}"
+        )
+
+    # Detail pages follow the summary table
+    lines.append("\f")
+    for row in rows:
+        lines += [f"== {row['name']} ({row['category']}) =="]
+        lines.append(
+            f"Purchased {row['purchase_date'] or '-'}, age {row['age_years']} years, warranty {row['warranty_status']}"
+            + (f" until {row['warranty_expiration_date']}" if row["warranty_expiration_date"] else "")
+        )
+        lines.append(f"Service history ({row['service_count']} visits, {row['total_cost']:,.2f} total):")
+        for record in row["service_history"]:
+            lines.append(
+                f"  {record['date'][:10]}  {record['service_type'][:30]:<30} {record['provider_name'][:30]:<30} "
+                f"{float(record['cost'] or 0):>11,.2f}"
+            )
+        if not row["service_history"]:
+            lines.append("  none")
+        lines.append("Upcoming reminders:")
+        for reminder in row["upcoming_reminders"]:
+            flag = "  OVERDUE" if _parse_date(reminder["due_date"]) < as_of else ""
+            repeat = " (recurring)" if reminder.get("recurring") else ""
+            lines.append(f"  {reminder['due_date'][:10]}  {reminder['title']}{repeat}{flag}")
+        if not row["upcoming_reminders"]:
+            lines.append("  none")
+        lines.append("")
+    return render_text_pdf(lines, title=f"Report for {address}")
+
+
+RENDERERS = {"pdf": render_pdf, "csv": render_csv}
+
+
+def render_report(data: Dict[str, Any], report_format: str, as_of: str) -> bytes:
+    """Render a report (runs in a worker process)"""
+    return RENDERERS[report_format](data, date.fromisoformat(as_of))
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def update_job(job_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    result = await run_query(get_db().table("report_jobs").update(values).eq("id", job_id), "update")
+    return result.data[0] if result.data else None
+
+
+class ReportRenderer:
+    """
+    Runs report jobs: gathers data, renders in a process pool and records the result
+
+    Jobs are queued through the background job runner (`reports.generate`),
+    at most REPORT_WORKERS at a time per worker. A job left unfinished by a
+    worker that exited is reported as failed once twice REPORT_JOB_TIMEOUT
+    has passed (see `expire_if_stale`).
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._rendering: Dict[str, asyncio.Task] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=settings.REPORT_PROCESSES)
+        return self._pool
+
+    def shutdown(self):
+        """Stop the render processes, if started"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _render(self, data: Dict[str, Any], report_format: str, as_of: date, path: Path) -> bool:
+        """Render into the cache; True if the file was already there"""
+        if path.exists():
+            return True
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        content = await loop.run_in_executor(
+            self._get_pool(), render_report, data, report_format, as_of.isoformat()
+        )
+        report_render_seconds.observe(time.perf_counter() - started, format=report_format)
+        await loop.run_in_executor(None, _write_atomic, path, content)
+        return False
+
+    async def run(self, job: Dict[str, Any]):
+        """Gather, render and record one job"""
+        job_id, report_format = job["id"], job["format"]
+        await update_job(job_id, {"status": "running", "started_at": _now()})
+        try:
+            data = await gather_report_data(job["home_profile_id"])
+            as_of = date.today()
+            digest = report_hash(data, report_format, as_of)
+            path = report_path(digest, report_format)
+            # Concurrent jobs for the same data share one render
+            task = self._rendering.get(digest)
+            if task is None:
+                task = asyncio.ensure_future(self._render(data, report_format, as_of, path))
+                self._rendering[digest] = task
+                task.add_done_callback(lambda _: self._rendering.pop(digest, None))
+            cached = await asyncio.wait_for(asyncio.shield(task), settings.REPORT_JOB_TIMEOUT)
+            values = {"status": "succeeded", "data_hash": digest, "size": path.stat().st_size, "finished_at": _now()}
+            outcome = "cached" if cached else "rendered"
+        except Exception as e:
+            error = "Report generation timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logger.error(f"Report job {job_id} failed: {error}")
+            values = {"status": "failed", "error": error[:500], "finished_at": _now()}
+            outcome = "failed"
+        report_jobs.inc(format=report_format, outcome=outcome)
+        row = await update_job(job_id, values)
+        logger.info(f"Report job {job_id} {values['status']} ({outcome})")
+        await publish_change(job["user_id"], "report_jobs", "updated", job_id, row)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rendering": len(self._rendering),
+            "processes": settings.REPORT_PROCESSES if self._pool is not None else 0,
+        }
+
+
+report_renderer = ReportRenderer()
+
+
+@job_runner.task(
+    "reports.generate",
+    max_attempts=1,
+    concurrency=settings.REPORT_WORKERS,
+    # Outlasts the render deadline so the job is always recorded as finished
+    timeout=settings.REPORT_JOB_TIMEOUT + 30,
+)
+async def generate_report(payload: Dict[str, Any]):
+    await report_renderer.run(payload)
+
+
+def _prune_cache(max_age: float) -> int:
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in Path(settings.REPORT_CACHE_DIR).glob("*/*.*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+@job_runner.task("reports.prune_cache", max_attempts=1)
+async def prune_report_cache(payload: Dict[str, Any]):
+    """Delete rendered reports older than REPORT_CACHE_MAX_AGE_DAYS"""
+    removed = await asyncio.get_running_loop().run_in_executor(
+        None, _prune_cache, settings.REPORT_CACHE_MAX_AGE_DAYS * 86400
+    )
+    if removed:
+        logger.info(f"Pruned {removed} cached reports")
+
+
+job_runner.schedule("47 3 * * *", "reports.prune_cache")
+
+
+async def expire_if_stale(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Mark a job failed if it has been unfinished longer than any worker would run it"""
+    if job["status"] not in UNFINISHED or not job.get("created_at"):
+        return job
+    created = parse_timestamp(job["created_at"])
+    age = (datetime.now(timezone.utc) - created).total_seconds()
+    if age < 2 * settings.REPORT_JOB_TIMEOUT:
+        return job
+    logger.warning(f"Report job {job['id']} was interrupted")
+    return await update_job(
+        job["id"], {"status": "failed", "error": "Report job was interrupted", "finished_at": _now()}
+    ) or job
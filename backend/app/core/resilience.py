@@ -0,0 +1,399 @@
+"""
+Upstream call policies: per-operation deadlines, retries with jittered backoff,
+circuit breaking and stale read fallback
+"""
+import asyncio
+import copy
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.core.database import TRANSIENT_SQLSTATES
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+upstream_requests = registry.counter(
+    "upstream_requests_total", "Upstream calls by outcome", ["upstream", "operation", "outcome"]
+)
+upstream_latency = registry.histogram(
+    "upstream_request_duration_seconds", "Upstream call latency including retries", ["upstream", "operation"]
+)
+upstream_retries = registry.counter("upstream_retries_total", "Upstream call retries", ["upstream", "operation"])
+upstream_stale_served = registry.counter(
+    "upstream_stale_served_total", "Reads served from the stale cache", ["upstream"]
+)
+circuit_state = registry.gauge(
+    "upstream_circuit_state", "Circuit breaker state (0=closed, 1=half-open, 2=open)", ["upstream"]
+)
+
+
+class UpstreamError(Exception):
+    """Base class for failures attributed to an upstream dependency"""
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """The operation deadline elapsed before the upstream answered"""
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """The upstream is failing or the circuit is open; callers should back off"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# PostgREST's own codes for a database it cannot reach (PGRST000-PGRST003), and
+# the SQLSTATE of a statement cancelled by statement_timeout
+TRANSIENT_POSTGREST_CODES = ("PGRST00", "57014")
+
+
+def is_transient_api_error(error: BaseException) -> bool:
+    """
+    Whether a PostgREST APIError reports an outage rather than a bad request
+
+    postgrest-py raises APIError for every non-2xx response: `code` is the
+    HTTP status (an int) when the body was not a PostgREST error, as from a
+    gateway's 502/503/504 page, and otherwise PostgREST's code or the SQLSTATE.
+    """
+    try:
+        from postgrest.exceptions import APIError
+    except ImportError:
+        return False
+    if not isinstance(error, APIError):
+        return False
+    code = error.code
+    if isinstance(code, int):
+        return code >= 500 or code == 429
+    return isinstance(code, str) and code.startswith(TRANSIENT_POSTGREST_CODES + TRANSIENT_SQLSTATES)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error indicates a transient upstream fault rather than a bad request"""
+    import httpx
+
+    if isinstance(error, (asyncio.TimeoutError, UpstreamTimeoutError, httpx.TransportError)):
+        return True
+    if getattr(error, "transient", False):
+        # Direct database errors flag dropped connections, deadlocks and the like
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return is_transient_api_error(error)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    Opens after `failure_threshold` consecutive upstream failures, rejects calls for
+    `recovery_timeout` seconds, then lets a limited number of trial calls through
+    (half-open). A successful trial closes the circuit; a failed one re-opens it.
+    """
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        circuit_state.set_function(lambda: self._STATE_VALUES[self.state], upstream=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the circuit will admit a trial call"""
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may proceed right now"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN:
+                if self._state == self.OPEN:
+                    self._state = self.HALF_OPEN
+                    self._half_open_calls = 0
+                if self._half_open_calls < self.half_open_max_calls:
+                    self._half_open_calls += 1
+                    return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after, 3),
+        }
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    attempts: int = 3
+    base_delay: float = 0.05
+    max_delay: float = 1.0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def _snapshot(value: Any) -> Any:
+    """
+    A copy of a query result whose rows are new dicts, so a caller that pops
+    or sets keys on the rows it was returned cannot change the copy
+    """
+    data = getattr(value, "data", None)
+    if type(data) is not list:
+        return value
+    snapshot = copy.copy(value)
+    snapshot.data = [dict(row) if type(row) is dict else row for row in data]
+    return snapshot
+
+
+class StaleCache:
+    """
+    Bounded LRU of last-known-good read results, used while the circuit is open
+
+    The caller keeps, and may modify, the result it stored, so a copy of its
+    rows is stored; served values are deep copies of the stored ones.
+
+    `compact(key, value)` may convert values to a smaller form, which
+    `expand(value)` converts back when served. Values are compacted later by
+    a background thread, so reads never wait for it; when compaction falls
+    more than `max_entries` values behind, the rest stay uncompacted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_age: float = 300.0,
+        compact: Optional[Callable[[Hashable, Any], Any]] = None,
+        expand: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.compact = compact
+        self.expand = expand
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compactor: Optional[ThreadPoolExecutor] = None
+        self._compactions_pending = 0
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        value = _snapshot(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.compact is None or self._compactions_pending >= self.max_entries:
+                return
+            self._compactions_pending += 1
+            if self._compactor is None:
+                # Created on first use, in the worker after any fork
+                self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stale-cache-compact")
+        self._compactor.submit(self._compact_entry, key, value)
+
+    def _compact_entry(self, key: Hashable, value: Any) -> None:
+        try:
+            compacted = self.compact(key, value)
+        except Exception as e:
+            logger.warning(f"Could not compact stale cache entry: {str(e)}")
+            compacted = value
+        with self._lock:
+            self._compactions_pending -= 1
+            entry = self._entries.get(key)
+            # Unless the entry was replaced or evicted in the meantime
+            if compacted is not value and entry is not None and entry[1] is value:
+                self._entries[key] = (entry[0], compacted)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.max_age:
+                del self._entries[key]
+                return None
+        # Only served while the upstream is failing, so the full copy is affordable
+        return copy.deepcopy(self.expand(value) if self.expand is not None else value)
+
+    def values(self) -> List[Any]:
+        """The stored values, as stored"""
+        with self._lock:
+            return [value for _, value in self._entries.values()]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class UpstreamPolicy:
+    """
+    Wraps calls to one upstream dependency
+
+    Each call runs under an overall deadline for its operation type. Only idempotent
+    operations are retried, and retries never extend past the deadline, so tail
+    latency during an incident is bounded by the deadline (or, for attempts in
+    a thread, by the client's own timeout) rather than by the upstream. Failures feed a circuit breaker; while it is open, calls fail fast
+    and reads with a cache key are answered from the stale cache if possible.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadlines: Dict[str, float],
+        idempotent_operations: Tuple[str, ...],
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        stale_cache: Optional[StaleCache] = None,
+    ):
+        self.name = name
+        self.deadlines = deadlines
+        self.idempotent_operations = idempotent_operations
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(name)
+        self.stale_cache = stale_cache
+
+    def _serve_stale(self, cache_key: Optional[Hashable]) -> Optional[Any]:
+        if cache_key is None or self.stale_cache is None:
+            return None
+        value = self.stale_cache.get(cache_key)
+        if value is not None:
+            upstream_stale_served.inc(upstream=self.name)
+            logger.info(f"Serving stale result for {cache_key!r} from '{self.name}'")
+        return value
+
+    async def call(
+        self,
+        function: Callable[[], Awaitable[Any]],
+        operation: str,
+        cache_key: Optional[Hashable] = None,
+        cancellable: bool = True,
+    ) -> Any:
+        """
+        Run `function` under this policy
+
+        Args:
+            function: Zero-argument coroutine factory performing one attempt
+            operation: Operation type, selects the deadline and retry eligibility
+            cache_key: Key for stale-read fallback; only set for reads
+            cancellable: False for attempts running in a thread, which a timeout
+                cannot stop: each attempt then runs to its client's own timeout,
+                rather than being abandoned with its thread still blocked, and
+                the deadline only limits further retries
+
+        Returns:
+            The result of the first successful attempt, or a stale cached result
+
+        Raises:
+            UpstreamUnavailableError: If the circuit is open or all attempts failed
+            Exception: Non-retryable errors from `function` are re-raised unchanged
+        """
+        if not self.breaker.allow():
+            stale = self._serve_stale(cache_key)
+            if stale is not None:
+                return stale
+            upstream_requests.inc(upstream=self.name, operation=operation, outcome="rejected")
+            raise UpstreamUnavailableError(f"{self.name} circuit is open", retry_after=self.breaker.retry_after)
+
+        deadline = self.deadlines.get(operation, max(self.deadlines.values()))
+        attempts = self.retry.attempts if operation in self.idempotent_operations else 1
+        started = time.monotonic()
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(attempts):
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            try:
+                if cancellable:
+                    result = await asyncio.wait_for(function(), timeout=remaining)
+                else:
+                    result = await function()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was rejected
+                    self.breaker.record_success()
+                    upstream_requests.inc(upstream=self.name, operation=operation, outcome="error")
+                    upstream_latency.observe(time.monotonic() - started, upstream=self.name, operation=operation)
+                    raise
+                last_error = e
+                logger.warning(f"{self.name} {operation} attempt {attempt + 1}/{attempts} failed: {e!r}")
+                if attempt + 1 < attempts:
+                    delay = min(self.retry.backoff(attempt), deadline - (time.monotonic() - started))
+                    if delay > 0:
+                        upstream_retries.inc(upstream=self.name, operation=operation)
+                        await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            upstream_requests.inc(upstream=self.name, operation=operation, outcome="success")
+            upstream_latency.observe(time.monotonic() - started, upstream=self.name, operation=operation)
+            if cache_key is not None and self.stale_cache is not None:
+                self.stale_cache.put(cache_key, result)
+            return result
+
+        self.breaker.record_failure()
+        outcome = "timeout" if last_error is None or isinstance(last_error, asyncio.TimeoutError) else "failure"
+        upstream_requests.inc(upstream=self.name, operation=operation, outcome=outcome)
+        upstream_latency.observe(time.monotonic() - started, upstream=self.name, operation=operation)
+
+        stale = self._serve_stale(cache_key)
+        if stale is not None:
+            return stale
+        raise UpstreamUnavailableError(
+            f"{self.name} {operation} failed after {deadline:.2f}s: {last_error!r}",
+            retry_after=max(1.0, self.breaker.retry_after),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.breaker.stats(),
+            "stale_entries": len(self.stale_cache) if self.stale_cache is not None else 0,
+            "deadlines": dict(self.deadlines),
+        }
@@ -0,0 +1,159 @@
+"""
+Access token verification helpers: local JWT claim checks and a verified-token cache
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JWT_SECRET = "your-jwt-secret-key"
+
+token_cache_lookups = registry.counter("auth_token_cache_lookups_total", "Verified-token cache lookups", ["outcome"])
+
+
+def local_verification_enabled() -> bool:
+    """Whether tokens can be verified locally with the project's JWT secret"""
+    return settings.AUTH_LOCAL_VERIFY and bool(settings.JWT_SECRET) and settings.JWT_SECRET != DEFAULT_JWT_SECRET
+
+
+def user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the user object handlers expect (the /auth/v1/user shape) from JWT claims"""
+    return {
+        "id": claims["sub"],
+        "aud": claims.get("aud"),
+        "role": claims.get("role"),
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "app_metadata": claims.get("app_metadata", {}),
+        "user_metadata": claims.get("user_metadata", {}),
+    }
+
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token's signature, expiry and audience locally
+
+    Args:
+        token: JWT access token
+
+    Returns:
+        The token's claims if valid, otherwise None
+    """
+    from jose import JWTError, jwt
+
+    try:
+        claims = jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            audience=settings.JWT_AUDIENCE,
+        )
+    except JWTError as e:
+        logger.warning(f"Rejected access token: {str(e)}")
+        return None
+    if not claims.get("sub"):
+        logger.warning("Rejected access token without subject")
+        return None
+    return claims
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """Expiry timestamp from a token's claims, without verifying it"""
+    from jose import JWTError, jwt
+
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+    return float(exp) if exp else None
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens
+
+    Entries never outlive the token's own expiry. Keys are token digests so raw
+    tokens are not kept in memory.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                token_cache_lookups.inc(outcome="miss")
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                token_cache_lookups.inc(outcome="expired")
+                return None
+            self._entries.move_to_end(key)
+        token_cache_lookups.inc(outcome="hit")
+        return user
+
+    def peek(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached user for a token, without recording a lookup or refreshing its recency"""
+        entry = self._entries.get(self._key(token))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def put(self, token: str, user: Dict[str, Any], expires_at: Optional[float] = None):
+        if self.max_entries <= 0:
+            return
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[self._key(token)] = (deadline, user)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+def verify_token_locally(token: str) -> Optional[Dict[str, Any]]:
+    """Verify a token against the JWT secret and cache the resulting user"""
+    claims = decode_access_token(token)
+    if claims is None:
+        return None
+    user = user_from_claims(claims)
+    token_cache.put(token, user, expires_at=claims.get("exp"))
+    return user
+
+
+def cached_user_id(token: str) -> Optional[str]:
+    """
+    User id for a token without any network call
+
+    Uses the verified-token cache, or local verification when enabled (which
+    fills the cache for the request's own authentication). Returns None when
+    the token cannot be attributed to a user this way.
+    """
+    user = token_cache.peek(token)
+    if user is None and local_verification_enabled():
+        user = verify_token_locally(token)
+    return user["id"] if user else None
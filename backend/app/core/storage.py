@@ -0,0 +1,317 @@
+"""
+Object storage for user files: presigned upload and download URLs
+
+File bytes never pass through the API workers. Clients upload directly to the
+storage backend with a short-lived URL and the API only records metadata.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker, RetryPolicy, UpstreamPolicy
+from app.core.supabase import get_http_client
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_SIGNING_SECRET = "your-storage-signing-secret"
+
+
+@dataclass
+class PresignedUrl:
+    """A short-lived URL the client uses directly against storage"""
+    url: str
+    method: str
+    expires_at: int
+    headers: Dict[str, str]
+
+
+@dataclass
+class ObjectInfo:
+    """Metadata of a stored object"""
+    size: int
+    content_type: Optional[str] = None
+    checksum: Optional[str] = None
+    etag: Optional[str] = None
+
+
+@dataclass
+class ObjectSource:
+    """Where another process can fetch an object's bytes itself: a URL or a local file"""
+    url: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    file: Optional[str] = None
+
+
+def read_object_source(source: ObjectSource, max_bytes: int, timeout: float) -> bytes:
+    """
+    Fetch an object's bytes, for processing outside the API workers (such as
+    thumbnails in their process pool)
+
+    Raises:
+        ValueError: If the object is larger than max_bytes
+    """
+    if source.file is not None:
+        with open(source.file, "rb") as stored:
+            data = stored.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise ValueError(f"Object exceeds {max_bytes} bytes")
+        return data
+
+    import httpx
+
+    chunks = []
+    size = 0
+    with httpx.stream("GET", source.url, headers=source.headers, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"Object exceeds {max_bytes} bytes")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class ObjectStorage:
+    """Interface implemented by storage backends"""
+
+    async def create_upload_url(self, path: str, content_type: str, max_size: int) -> PresignedUrl:
+        """
+        Issue an upload URL for at most `max_size` bytes of `content_type`
+
+        Backends that cannot bind the size or type to the URL leave them to be
+        checked against `stat()` when the upload is completed.
+        """
+        raise NotImplementedError
+
+    async def create_download_url(self, path: str) -> PresignedUrl:
+        raise NotImplementedError
+
+    async def stat(self, path: str) -> Optional[ObjectInfo]:
+        """Return object metadata, or None if nothing was uploaded to `path`"""
+        raise NotImplementedError
+
+    async def delete(self, path: str):
+        """Remove an object, for uploads rejected on completion"""
+        raise NotImplementedError
+
+    def source(self, path: str) -> ObjectSource:
+        """Where to fetch an object's bytes from, for server-side processing such as thumbnails"""
+        raise NotImplementedError
+
+
+storage_policy = UpstreamPolicy(
+    "supabase_storage",
+    deadlines={
+        "read": settings.UPSTREAM_READ_TIMEOUT,
+        "sign": settings.UPSTREAM_READ_TIMEOUT,
+        "delete": settings.UPSTREAM_WRITE_TIMEOUT,
+    },
+    idempotent_operations=("read", "sign", "delete"),
+    retry=RetryPolicy(
+        attempts=settings.UPSTREAM_RETRY_ATTEMPTS,
+        base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+        max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+    ),
+    breaker=CircuitBreaker(
+        "supabase_storage",
+        failure_threshold=settings.UPSTREAM_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.UPSTREAM_BREAKER_RECOVERY_TIMEOUT,
+    ),
+)
+
+
+class SupabaseObjectStorage(ObjectStorage):
+    """Supabase Storage backend using its signed URL endpoints"""
+
+    def __init__(self, base_url: str, service_key: str, bucket: str):
+        self.base_url = f"{base_url.rstrip('/')}/storage/v1"
+        self.bucket = bucket
+        self.headers = {"Authorization": f"Bearer {service_key}", "apikey": service_key}
+
+    def _object_path(self, path: str) -> str:
+        return f"{self.bucket}/{quote(path)}"
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> "httpx.Response":
+        response = await get_http_client().request(method, url, headers=self.headers, **kwargs)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return response
+
+    async def create_upload_url(self, path: str, content_type: str, max_size: int) -> PresignedUrl:
+        # Signed upload URLs carry no size or type; bound them with the bucket's
+        # file size limit and allowed MIME types, and complete_upload checks both
+        response = await storage_policy.call(
+            lambda: self._request("POST", f"{self.base_url}/object/upload/sign/{self._object_path(path)}"),
+            "sign",
+        )
+        response.raise_for_status()
+        # Supabase signed upload URLs are valid for two hours
+        return PresignedUrl(
+            url=f"{self.base_url}{response.json()['url']}",
+            method="PUT",
+            expires_at=int(time.time()) + 7200,
+            headers={"Content-Type": content_type},
+        )
+
+    async def create_download_url(self, path: str) -> PresignedUrl:
+        ttl = settings.STORAGE_URL_TTL_SECONDS
+        response = await storage_policy.call(
+            lambda: self._request("POST", f"{self.base_url}/object/sign/{self._object_path(path)}", json={"expiresIn": ttl}),
+            "sign",
+        )
+        response.raise_for_status()
+        return PresignedUrl(
+            url=f"{self.base_url}{response.json()['signedURL']}",
+            method="GET",
+            expires_at=int(time.time()) + ttl,
+            headers={},
+        )
+
+    async def stat(self, path: str) -> Optional[ObjectInfo]:
+        response = await storage_policy.call(
+            lambda: self._request("HEAD", f"{self.base_url}/object/authenticated/{self._object_path(path)}"),
+            "read",
+        )
+        if response.status_code in (400, 404):
+            return None
+        response.raise_for_status()
+        return ObjectInfo(
+            size=int(response.headers.get("content-length", 0)),
+            content_type=response.headers.get("content-type"),
+            etag=response.headers.get("etag", "").strip('"') or None,
+        )
+
+    def source(self, path: str) -> ObjectSource:
+        return ObjectSource(url=f"{self.base_url}/object/authenticated/{self._object_path(path)}", headers=self.headers)
+
+    async def delete(self, path: str):
+        response = await storage_policy.call(
+            lambda: self._request("DELETE", f"{self.base_url}/object/{self._object_path(path)}"),
+            "delete",
+        )
+        if response.status_code not in (400, 404):
+            response.raise_for_status()
+
+
+def signing_secret_configured() -> bool:
+    """Whether STORAGE_SIGNING_SECRET was changed from its default"""
+    return bool(settings.STORAGE_SIGNING_SECRET) and settings.STORAGE_SIGNING_SECRET != DEFAULT_STORAGE_SIGNING_SECRET
+
+
+def _signature(body: str) -> str:
+    return hmac.new(settings.STORAGE_SIGNING_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+def _sign(payload: Dict[str, Any]) -> str:
+    if not signing_secret_configured():
+        raise RuntimeError("STORAGE_SIGNING_SECRET must be set to sign local storage URLs")
+    body = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+    return f"{body}.{_signature(body)}"
+
+
+def verify_local_token(token: str, method: str) -> Optional[Dict[str, Any]]:
+    """
+    Validate a local storage URL token
+
+    Returns:
+        The signed payload if the signature, method and expiry are valid, otherwise None
+    """
+    if not signing_secret_configured():
+        return None
+    try:
+        body, signature = token.rsplit(".", 1)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(_signature(body), signature):
+        return None
+    payload = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    if payload.get("m") != method or payload.get("e", 0) < time.time():
+        return None
+    return payload
+
+
+class LocalObjectStorage(ObjectStorage):
+    """
+    Filesystem stand-in for Supabase Storage, for development and tests
+
+    Presigned URLs point at the API's own /storage/local routes and carry a
+    token signed with STORAGE_SIGNING_SECRET; uploads are streamed to disk in
+    chunks. Disk access runs in the threadpool.
+    """
+
+    def __init__(self, root: str, public_base_url: str):
+        if not signing_secret_configured():
+            raise RuntimeError("Set STORAGE_SIGNING_SECRET to use the local storage backend")
+        self.root = Path(root)
+        self.public_base_url = public_base_url.rstrip("/")
+
+    def file_path(self, path: str) -> Path:
+        resolved = (self.root / path).resolve()
+        if self.root.resolve() not in resolved.parents:
+            raise ValueError(f"Invalid storage path: {path}")
+        return resolved
+
+    def _url(self, payload: Dict[str, Any]) -> str:
+        return f"{self.public_base_url}/storage/local/{_sign(payload)}"
+
+    async def create_upload_url(self, path: str, content_type: str, max_size: int) -> PresignedUrl:
+        expires_at = int(time.time()) + settings.STORAGE_URL_TTL_SECONDS
+        url = self._url({"p": path, "m": "PUT", "e": expires_at, "ct": content_type, "max": max_size})
+        return PresignedUrl(url=url, method="PUT", expires_at=expires_at, headers={"Content-Type": content_type})
+
+    async def create_download_url(self, path: str) -> PresignedUrl:
+        expires_at = int(time.time()) + settings.STORAGE_URL_TTL_SECONDS
+        return PresignedUrl(url=self._url({"p": path, "m": "GET", "e": expires_at}), method="GET", expires_at=expires_at, headers={})
+
+    def meta_path(self, file_path: Path) -> Path:
+        return file_path.with_name(file_path.name + ".meta.json")
+
+    def stat_file(self, path: str) -> Optional[ObjectInfo]:
+        file_path = self.file_path(path)
+        meta_path = self.meta_path(file_path)
+        if not file_path.exists() or not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text())
+        return ObjectInfo(size=file_path.stat().st_size, content_type=meta.get("content_type"), checksum=meta.get("sha256"))
+
+    def delete_file(self, path: str):
+        file_path = self.file_path(path)
+        for stored in (file_path, self.meta_path(file_path)):
+            stored.unlink(missing_ok=True)
+
+    async def stat(self, path: str) -> Optional[ObjectInfo]:
+        return await run_in_threadpool(self.stat_file, path)
+
+    def source(self, path: str) -> ObjectSource:
+        return ObjectSource(file=str(self.file_path(path)))
+
+    async def delete(self, path: str):
+        await run_in_threadpool(self.delete_file, path)
+
+
+_object_storage: Optional[ObjectStorage] = None
+
+
+def get_object_storage() -> ObjectStorage:
+    """Return the configured storage backend"""
+    global _object_storage
+    if _object_storage is None:
+        if settings.FILE_STORAGE_BACKEND == "local":
+            _object_storage = LocalObjectStorage(settings.LOCAL_STORAGE_DIR, settings.PUBLIC_BASE_URL)
+        else:
+            _object_storage = SupabaseObjectStorage(settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.STORAGE_BUCKET)
+        logger.info(f"Using {settings.FILE_STORAGE_BACKEND} object storage")
+    return _object_storage
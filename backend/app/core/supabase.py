@@ -1,55 +1,328 @@
-
 """
 Supabase client initialization and utility functions
 """
-from supabase import create_client
-import httpx
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Optional
+import json
+import threading
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.security import local_verification_enabled, token_cache, token_expiry, verify_token_locally
+from app.core.records import compact_result, expand_result
+from app.core.resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+    StaleCache,
+    UpstreamPolicy,
+    UpstreamUnavailableError,
+)
 import logging
 
+if TYPE_CHECKING:
+    import httpx
+
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client
-if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+# Created on first use: importing the supabase package and building the client
+# is the most expensive part of startup, and many processes never need it
+_supabase: Optional[Any] = None
+_supabase_lock = threading.Lock()
+
+
+def _create_supabase_client():
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+
+    return create_client(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_KEY,
+        options=ClientOptions(
+            postgrest_client_timeout=max(settings.UPSTREAM_READ_TIMEOUT, settings.UPSTREAM_WRITE_TIMEOUT),
+        ),
+    )
+
+
+def get_supabase():
+    """
+    Shared Supabase client, created on first use
+
+    Raises:
+        HTTPException: 503 if Supabase is not configured or the client cannot be created
+    """
+    global _supabase
+    if _supabase is not None:
+        return _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            if not (settings.SUPABASE_URL and settings.SUPABASE_KEY):
+                logger.warning("Supabase URL or key not provided. Supabase integration will be unavailable.")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Database not configured",
+                )
+            try:
+                _supabase = _create_supabase_client()
+                logger.info("Supabase client initialized successfully")
+            except Exception as e:
+                logger.error(f"Error initializing Supabase client: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Database unavailable",
+                )
+    return _supabase
+
+
+def close_supabase():
+    """Release the Supabase client's connection pool, if the client was created"""
+    global _supabase
+    if _supabase is not None:
+        try:
+            _supabase.postgrest.session.close()
+        except Exception as e:
+            logger.warning(f"Error closing Supabase client: {e}")
+        _supabase = None
+
+_retry = RetryPolicy(
+    attempts=settings.UPSTREAM_RETRY_ATTEMPTS,
+    base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+)
+
+# Policy for PostgREST table calls. Inserts and transactional write RPCs are never
+# retried: a timed-out call may still have been applied upstream.
+db_policy = UpstreamPolicy(
+    "supabase_db",
+    deadlines={
+        "read": settings.UPSTREAM_READ_TIMEOUT,
+        "insert": settings.UPSTREAM_WRITE_TIMEOUT,
+        "update": settings.UPSTREAM_WRITE_TIMEOUT,
+        "delete": settings.UPSTREAM_WRITE_TIMEOUT,
+        "write_rpc": settings.UPSTREAM_WRITE_TIMEOUT,
+    },
+    idempotent_operations=("read", "update", "delete"),
+    retry=_retry,
+    breaker=CircuitBreaker(
+        "supabase_db",
+        failure_threshold=settings.UPSTREAM_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.UPSTREAM_BREAKER_RECOVERY_TIMEOUT,
+    ),
+    stale_cache=StaleCache(
+        settings.UPSTREAM_STALE_CACHE_SIZE,
+        settings.UPSTREAM_STALE_MAX_AGE,
+        compact=(
+            partial(compact_result, min_rows=settings.UPSTREAM_STALE_COMPACT_MIN_ROWS)
+            if settings.UPSTREAM_STALE_COMPACT else None
+        ),
+        expand=expand_result if settings.UPSTREAM_STALE_COMPACT else None,
+    ),
+)
+
+# Policy for the GoTrue auth endpoint
+auth_policy = UpstreamPolicy(
+    "supabase_auth",
+    deadlines={"verify": settings.UPSTREAM_AUTH_TIMEOUT},
+    idempotent_operations=("verify",),
+    retry=_retry,
+    breaker=CircuitBreaker(
+        "supabase_auth",
+        failure_threshold=settings.UPSTREAM_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.UPSTREAM_BREAKER_RECOVERY_TIMEOUT,
+    ),
+)
+
+_http_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Shared async HTTP client for direct calls to Supabase services, created on first use"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.UPSTREAM_AUTH_TIMEOUT),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+def http_client_stats() -> Dict[str, Any]:
+    """Connection counts for the shared HTTP client's pool"""
+    if _http_client is None:
+        return {"created": False}
+    pool = getattr(getattr(_http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "created": True,
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+async def close_http_client():
+    """Close the shared HTTP client, if it was created"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def reset_after_fork():
+    """
+    Forget clients inherited from a preloading parent process
+
+    Called in each gunicorn worker right after fork; connection pools must not
+    be shared between processes, so the worker creates its own on startup.
+    """
+    global _http_client, _supabase
+    _http_client = None
+    _supabase = None
+
+
+def _unavailable(error: UpstreamUnavailableError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Upstream service temporarily unavailable",
+        headers={"Retry-After": str(max(1, int(error.retry_after)))},
+    )
+
+
+def _query_cache_key(query: Any) -> Optional[Hashable]:
+    """Stale-cache key for a read: the request path plus its encoded filters and RPC arguments"""
+    if hasattr(query, "cache_key"):
+        return query.cache_key()
+    path = getattr(query, "path", None)
+    params = getattr(query, "params", None)
+    if path is None or params is None:
+        return None
+    body = getattr(query, "json", None)
+    return (str(path), str(params), json.dumps(body, sort_keys=True, default=str) if body else "")
+
+
+async def run_query(query: Any, operation: str = "read", cache_key: Optional[Hashable] = None):
+    """
+    Execute a query builder under the database upstream policy
+
+    Args:
+        query: Query builder, e.g. get_db().table("appliances").select("*").eq("id", x);
+            PostgREST builders run in the threadpool, direct backends on the event loop
+        operation: One of "read", "insert", "update", "delete" or "write_rpc"
+        cache_key: Key under which a read may be served stale while the circuit is open;
+            defaults to the query's path and filters for reads
+
+    Returns:
+        The query response
+
+    Raises:
+        HTTPException: 503 if the database is unavailable or the deadline elapsed
+    """
+    if cache_key is None and operation == "read":
+        cache_key = _query_cache_key(query)
+    try:
+        if getattr(query, "is_async", False):
+            return await db_policy.call(query.execute, operation, cache_key=cache_key)
+        # A thread cannot be cancelled; the client timeout set in _create_supabase_client bounds each attempt
+        return await db_policy.call(
+            lambda: run_in_threadpool(query.execute), operation, cache_key=cache_key, cancellable=False
+        )
+    except UpstreamUnavailableError as e:
+        logger.error(f"Database unavailable for {operation}: {e}")
+        raise _unavailable(e)
+
+
+# SQLSTATEs raised by the database functions in supabase/migrations
+RPC_ERROR_STATUS = {
+    "P0002": status.HTTP_404_NOT_FOUND,
+    "42501": status.HTTP_403_FORBIDDEN,
+    "22023": status.HTTP_400_BAD_REQUEST,
+}
+
+
+async def run_write_rpc(function: str, params: Dict[str, Any]):
+    """
+    Call a transactional write function, e.g. delete_home_profile_cascade
+
+    Args:
+        function: Database function name
+        params: Function arguments
+
+    Returns:
+        The function's result
+
+    Raises:
+        HTTPException: 404, 403 or 400 for the function's own errors (see
+            RPC_ERROR_STATUS), 503 if the database is unavailable
+    """
     try:
-        supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-        logger.info("Supabase client initialized successfully")
+        from app.core.database import get_db
+
+        result = await run_query(get_db().rpc(function, params), "write_rpc")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error initializing Supabase client: {e}")
-        supabase = None
-else:
-    logger.warning("Supabase URL or key not provided. Supabase integration will be unavailable.")
-    supabase = None
+        status_code = RPC_ERROR_STATUS.get(getattr(e, "code", None))
+        if status_code is None:
+            raise
+        raise HTTPException(status_code=status_code, detail=getattr(e, "message", None) or str(e))
+    return result.data
+
+
+async def _fetch_user(token: str) -> "httpx.Response":
+    response = await get_http_client().get(
+        f"{settings.SUPABASE_URL}/auth/v1/user",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "apikey": settings.SUPABASE_ANON_KEY
+        }
+    )
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response
+
 
 async def verify_token(token: str):
     """
-    Verify JWT token with Supabase
-    
+    Verify JWT token, locally when the project's JWT secret is configured
+
+    Verified users are cached until the token expires (or AUTH_CACHE_TTL), so
+    repeated requests with the same token cost no network hop. Without a JWT
+    secret the token is checked against Supabase's /auth/v1/user endpoint.
+
     Args:
         token: JWT token from Authorization header
-        
+
     Returns:
         User data if token is valid, otherwise None
+
+    Raises:
+        HTTPException: 503 if the auth service is unavailable
     """
-    if not supabase or not settings.SUPABASE_URL:
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    if local_verification_enabled():
+        return verify_token_locally(token)
+
+    if not settings.SUPABASE_URL:
         logger.error("Supabase configuration missing, cannot verify token")
         return None
-    
+
     try:
         # Get user details
-        user_response = httpx.get(
-            f"{settings.SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "apikey": settings.SUPABASE_ANON_KEY
-            }
-        )
-        
+        user_response = await auth_policy.call(lambda: _fetch_user(token), "verify")
+
         if user_response.status_code == 200:
-            return user_response.json()
+            user = user_response.json()
+            token_cache.put(token, user, expires_at=token_expiry(token))
+            return user
         else:
             logger.warning(f"Failed to verify token: {user_response.status_code} - {user_response.text}")
             return None
+    except UpstreamUnavailableError as e:
+        logger.error(f"Auth service unavailable: {e}")
+        raise _unavailable(e)
     except Exception as e:
         logger.error(f"Error verifying token: {str(e)}")
         return None
@@ -0,0 +1,235 @@
+"""
+Server-side image thumbnails with a content-addressed cache
+
+Thumbnails are rendered in a process pool so image decoding never blocks the
+event loop, and stored under the SHA-256 of the source image. Identical
+images uploaded by different users or profiles share one set of thumbnails,
+and a rendered thumbnail never changes, so it can be cached indefinitely.
+
+The pool processes fetch the source image from storage themselves, so its
+bytes never pass through the API workers. Sources over
+THUMBNAIL_MAX_SOURCE_BYTES or THUMBNAIL_MAX_PIXELS are skipped.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.storage import ObjectSource, get_object_storage, read_object_source
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_FORMAT = "webp"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+
+thumbnails_generated = registry.counter(
+    "thumbnails_generated_total", "Thumbnail sets rendered or found in the content-addressed cache", ["outcome"]
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending: Dict[str, asyncio.Task] = {}
+
+
+def thumbnail_sizes() -> List[int]:
+    """Configured thumbnail bounding box sizes in pixels"""
+    return sorted(int(size) for size in settings.THUMBNAIL_SIZES.split(",") if size.strip())
+
+
+def render_thumbnails(data: bytes, sizes: Iterable[int], max_pixels: int) -> Dict[int, bytes]:
+    """
+    Render WebP thumbnails of an image (runs in a worker process)
+
+    Args:
+        data: Source image bytes
+        sizes: Bounding box sizes; the aspect ratio is preserved
+        max_pixels: Largest source image, in pixels, that will be decoded
+
+    Returns:
+        Encoded thumbnail bytes by size
+
+    Raises:
+        ValueError: If the image has more than max_pixels pixels
+    """
+    from PIL import Image, ImageOps
+
+    # Also makes Pillow refuse decompression bombs inside formats it opens lazily
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    sizes = sorted(sizes, reverse=True)
+    results = {}
+    with Image.open(io.BytesIO(data)) as source:
+        # Dimensions come from the header; nothing is decoded yet
+        if source.width * source.height > max_pixels:
+            raise ValueError(f"Image of {source.width}x{source.height} exceeds {max_pixels} pixels")
+        # JPEG can decode at a fraction of full size when the largest thumbnail allows it
+        source.draft("RGB", (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(source).convert("RGB")
+        for size in sizes:
+            # Downscale from the previous (larger) thumbnail to avoid re-sampling the original
+            image.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, THUMBNAIL_FORMAT, quality=80, method=4)
+            results[size] = output.getvalue()
+    return results
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the thumbnail worker processes, if started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Worker pool state and the number of images being processed"""
+    return {"started": _pool is not None, "workers": settings.THUMBNAIL_WORKERS, "pending": len(_pending)}
+
+
+def reset_after_fork():
+    """Forget a worker pool inherited from a preloading parent process"""
+    global _pool
+    _pool = None
+    _pending.clear()
+
+
+def thumbnail_path(digest: str, size: int) -> Path:
+    """Location of a thumbnail in the content-addressed cache"""
+    return Path(settings.THUMBNAIL_CACHE_DIR) / digest[:2] / digest / f"{size}.{THUMBNAIL_FORMAT}"
+
+
+def has_thumbnails(digest: str) -> bool:
+    return all(thumbnail_path(digest, size).exists() for size in thumbnail_sizes())
+
+
+async def processed_digests(digests: Iterable[str]) -> Set[str]:
+    """The digests whose thumbnails all exist, checked in one threadpool call"""
+    digests = set(digests)
+    if not digests:
+        return set()
+    return await run_in_threadpool(lambda: {digest for digest in digests if has_thumbnails(digest)})
+
+
+def thumbnail_urls(digest: str) -> Dict[str, str]:
+    """Public URLs of each thumbnail size for a source image digest"""
+    base = settings.PUBLIC_BASE_URL.rstrip("/")
+    return {str(size): f"{base}/thumbnails/{digest}/{size}.{THUMBNAIL_FORMAT}" for size in thumbnail_sizes()}
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+def process_image(
+    source: ObjectSource,
+    sizes: List[int],
+    max_bytes: int,
+    max_pixels: int,
+    timeout: float,
+) -> Tuple[str, int]:
+    """
+    Fetch an image, and render and store its thumbnails unless they are
+    already cached (runs in a worker process)
+
+    Returns:
+        The image's SHA-256 digest and the number of thumbnails rendered
+    """
+    data = read_object_source(source, max_bytes, timeout)
+    digest = hashlib.sha256(data).hexdigest()
+    if has_thumbnails(digest):
+        return digest, 0
+    rendered = render_thumbnails(data, sizes, max_pixels)
+    for size, thumbnail in rendered.items():
+        _write_atomic(thumbnail_path(digest, size), thumbnail)
+    return digest, len(rendered)
+
+
+async def generate_thumbnails(storage_path: str) -> Optional[str]:
+    """
+    Ensure thumbnails exist for an uploaded image
+
+    Args:
+        storage_path: Object storage path of the source image
+
+    Returns:
+        The source image's SHA-256 digest, or None if it could not be processed
+    """
+    storage = get_object_storage()
+    info = await storage.stat(storage_path)
+    if info is None:
+        logger.warning(f"No image at {storage_path} to render thumbnails for")
+        return None
+    if info.size > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+        thumbnails_generated.inc(outcome="skipped")
+        logger.info(f"Skipping thumbnails for {storage_path}: {info.size} bytes exceeds THUMBNAIL_MAX_SOURCE_BYTES")
+        return None
+
+    loop = asyncio.get_running_loop()
+    try:
+        digest, rendered = await loop.run_in_executor(
+            _get_pool(),
+            process_image,
+            storage.source(storage_path),
+            thumbnail_sizes(),
+            settings.THUMBNAIL_MAX_SOURCE_BYTES,
+            settings.THUMBNAIL_MAX_PIXELS,
+            settings.UPSTREAM_READ_TIMEOUT,
+        )
+    except Exception as e:
+        thumbnails_generated.inc(outcome="failed")
+        logger.error(f"Failed to render thumbnails for {storage_path}: {str(e)}")
+        return None
+
+    if not rendered:
+        thumbnails_generated.inc(outcome="cached")
+        return digest
+    thumbnails_generated.inc(outcome="rendered")
+    logger.info(f"Rendered {rendered} thumbnails for {storage_path} ({digest[:12]})")
+    return digest
+
+
+async def _generate_logged(storage_path: str, on_done: Optional[Callable[[str], Awaitable[None]]]) -> Optional[str]:
+    try:
+        digest = await generate_thumbnails(storage_path)
+        if digest and on_done is not None:
+            await on_done(digest)
+        return digest
+    except Exception as e:
+        logger.error(f"Error generating thumbnails for {storage_path}: {str(e)}")
+        return None
+
+
+def schedule_thumbnails(
+    storage_path: str,
+    on_done: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> asyncio.Task:
+    """
+    Generate thumbnails in the background, de-duplicating concurrent requests
+
+    Args:
+        storage_path: Object storage path of the source image
+        on_done: Coroutine called with the source digest once thumbnails exist
+    """
+    task = _pending.get(storage_path)
+    if task is None:
+        task = asyncio.create_task(_generate_logged(storage_path, on_done))
+        _pending[storage_path] = task
+        task.add_done_callback(lambda _: _pending.pop(storage_path, None))
+    return task
@@ -0,0 +1,240 @@
+"""
+Anonymized traffic capture for replay
+
+With TRAFFIC_CAPTURE_ENABLED, TrafficCaptureMiddleware records the shape of
+(a TRAFFIC_CAPTURE_SAMPLE_RATE fraction of) requests, one JSON object per line
+in a file per worker under TRAFFIC_CAPTURE_DIR:
+
+    {"t": 1792375621.619, "m": "GET", "r": "/appliances/{appliance_id}",
+     "q": {"include": "service_records"}, "u": 417, "s": 200, "d": 4.312}
+
+- t: start time (epoch seconds), d: duration (ms), s: status code
+- r: the route template, never the concrete path, so no ids are kept; null
+  for a path no route matches
+- q: query parameters; ids become "@id" and free text "@text", while
+  numbers, dates, booleans and known option names keep their values
+- u: the caller's user bucket, a keyed hash of the user id modulo
+  TRAFFIC_CAPTURE_USER_BUCKETS (absent for anonymous requests)
+- b: request body size in bytes, when there is a body
+
+Requests answered before routing (idempotent replays, rate-limited 429s,
+304s from the compression layer) are attributed to the route their path
+matches, so the capture keeps the full request mix. The admin and docs
+endpoints are not recorded. Lines are written by a background thread in
+batches, and capture stops once the file
+reaches TRAFFIC_CAPTURE_MAX_BYTES. `scripts/replay_traffic.py` replays the
+files against a local instance.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from starlette.routing import Match
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.security import cached_user_id
+
+logger = logging.getLogger(__name__)
+
+captured_requests = registry.counter("traffic_captured_requests_total", "Requests recorded by traffic capture", ["outcome"])
+
+EXCLUDED_PREFIXES = ("/admin", "/docs", "/redoc", "/openapi.json")
+# Query parameters whose values are options rather than user data
+KEPT_PARAMETERS = {"sort", "include", "format", "group_by", "verbose", "compare"}
+UUID = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+SCALAR = re.compile(r"-?\d+(\.\d+)?|true|false|\d{4}-\d\d-\d\d([T ][\d:.]+(Z|[+-]\d\d:?\d\d)?)?", re.IGNORECASE)
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+
+
+def match_route(scope: Dict[str, Any]) -> Optional[str]:
+    """
+    The template of the route a request's path and method match, for requests
+    a middleware answered before routing; None when no route matches
+    """
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+        if match == Match.PARTIAL and partial is None:
+            # The path matches but not the method (a 405)
+            partial = getattr(route, "path", None)
+    return partial
+
+
+def anonymize_query(query_string: bytes) -> Dict[str, str]:
+    """Query parameters with ids and free text replaced by placeholders"""
+    query = {}
+    for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        items = value.split(",")
+        if value and all(UUID.fullmatch(item.strip()) for item in items):
+            query[name] = ",".join("@id" for _ in items)
+        elif name in KEPT_PARAMETERS or name.endswith("_limit") or not value or SCALAR.fullmatch(value):
+            query[name] = value
+        else:
+            query[name] = "@text"
+    return query
+
+
+class TrafficRecorder:
+    """Appends capture lines to this worker's file from a background thread"""
+
+    def __init__(self, directory: str, max_bytes: int, buckets: int, salt: str):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.buckets = max(1, buckets)
+        # Without a configured salt, buckets are consistent within a worker only
+        self._key = hashlib.blake2b(salt.encode()).digest()[:32] if salt else os.urandom(32)
+        self.path: Optional[str] = None
+        self._pending: List[str] = []
+        self._last_flush = time.monotonic()
+        self._written = 0
+        self._lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def bucket(self, user_id: str) -> int:
+        digest = hashlib.blake2b(user_id.encode(), key=self._key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.buckets
+
+    def record(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._written + len(line) > self.max_bytes:
+                self.dropped += 1
+                captured_requests.inc(outcome="dropped")
+                return
+            self._written += len(line)
+            self._pending.append(line)
+            self.recorded += 1
+            captured_requests.inc(outcome="recorded")
+            if len(self._pending) < BATCH_SIZE and time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+                return
+            batch, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        self._submit(batch)
+
+    def _submit(self, batch: List[str]):
+        if self._writer is None:
+            # Created in the worker, after any fork
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="traffic-capture")
+        self._writer.submit(self._write, batch)
+
+    def _write(self, batch: List[str]):
+        try:
+            if self.path is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.path = os.path.join(self.directory, f"traffic-{os.getpid()}-{int(time.time())}.jsonl")
+            with open(self.path, "a", encoding="utf-8") as capture:
+                capture.writelines(batch)
+        except OSError as e:
+            logger.warning(f"Could not write traffic capture: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._submit(batch)
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.TRAFFIC_CAPTURE_ENABLED,
+            "path": self.path,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "bytes": self._written,
+        }
+
+
+traffic_recorder = TrafficRecorder(
+    settings.TRAFFIC_CAPTURE_DIR,
+    settings.TRAFFIC_CAPTURE_MAX_BYTES,
+    settings.TRAFFIC_CAPTURE_USER_BUCKETS,
+    settings.TRAFFIC_CAPTURE_SALT,
+)
+
+
+def close_traffic_capture():
+    traffic_recorder.close()
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware recording anonymized request shapes"""
+
+    def __init__(self, app, recorder: Optional[TrafficRecorder] = None, sample_rate: Optional[float] = None):
+        self.app = app
+        self.recorder = recorder if recorder is not None else traffic_recorder
+        self.sample_rate = settings.TRAFFIC_CAPTURE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(EXCLUDED_PREFIXES)
+            or (self.sample_rate < 1 and random.random() >= self.sample_rate)
+        ):
+            return await self.app(scope, receive, send)
+
+        status_code = None
+        body_bytes = 0
+
+        async def counting_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self._record(
+                scope,
+                route.path if route is not None else match_route(scope),
+                started_at,
+                time.perf_counter() - started,
+                status_code,
+                body_bytes,
+            )
+
+    def _record(self, scope, route: Optional[str], started_at: float, duration: float, status_code: Optional[int], body_bytes: int):
+        entry: Dict[str, Any] = {"t": round(started_at, 3), "m": scope["method"], "r": route}
+        query = anonymize_query(scope.get("query_string", b""))
+        if query:
+            entry["q"] = query
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                user_id = cached_user_id(token.strip()) if scheme.lower() == "bearer" and token else None
+                if user_id:
+                    entry["u"] = self.recorder.bucket(user_id)
+                break
+        entry["s"] = status_code if status_code is not None else 500
+        entry["d"] = round(duration * 1000, 3)
+        if body_bytes:
+            entry["b"] = body_bytes
+        self.recorder.record(entry)
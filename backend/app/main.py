@@ -2,19 +2,74 @@
 """
 Main FastAPI application entry point
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import os
 
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
 from app.api.routes import api_router
+from app.core.database import close_db
+from app.core.events import close_event_bus
+from app.core.health import health_monitor
+from app.core.idempotency import IdempotencyMiddleware, close_idempotency_store
 from app.core.logging import configure_logging
+from app.core.memory import start_tracing
+from app.core.metrics import registry
+from app.core.profiling import ProfilingMiddleware
+from app.core.rate_limit import RateLimitMiddleware, close_bucket_store
+from app.core.jobs import job_runner
+from app.core.replica import read_replica
+from app.core.reports import report_renderer
+from app.core.serialization import build_serializers
+from app.core.storage import get_object_storage
+from app.core.supabase import close_http_client, close_supabase
+from app.core.traffic import TrafficCaptureMiddleware, close_traffic_capture
+from app.models.appliance import ApplianceResponse
+from app.models.home_profile import HomeProfileResponse
+from app.models.reminder import ReminderResponse
+from app.models.service_record import ServiceRecordResponse
+from app.core.thumbnails import shutdown_pool
 
 # Setup logging
 logger = configure_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown
+
+    Runs once per worker process (after fork under gunicorn). Shared clients are
+    created on first use inside the worker, never at import time, and are
+    closed here on shutdown.
+    """
+    start_tracing()
+    if settings.FILE_STORAGE_BACKEND == "local":
+        # Fails fast when STORAGE_SIGNING_SECRET is left unset
+        get_object_storage()
+    build_serializers(HomeProfileResponse, ApplianceResponse, ServiceRecordResponse, ReminderResponse)
+    health_monitor.start()
+    job_runner.start()
+    logger.info(f"Worker {os.getpid()} started")
+    yield
+    await health_monitor.stop()
+    await job_runner.stop()
+    report_renderer.shutdown()
+    read_replica.close()
+    shutdown_pool()
+    close_traffic_capture()
+    await close_event_bus()
+    await close_bucket_store()
+    await close_idempotency_store()
+    await close_db()
+    close_supabase()
+    await close_http_client()
+
 # Initialize application
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
     description=settings.PROJECT_DESCRIPTION,
@@ -22,6 +77,29 @@ app = FastAPI(
     redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
 )
 
+# Idempotency-Key deduplication, innermost so stored responses exclude CORS headers
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware)
+
+# Rate limiting (added before CORS so that 429 responses carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Response compression, outside idempotency so stored responses are replayed
+# in whatever encoding the retrying client accepts
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Request profiling, outside the other middleware so profiles include them;
+# not installed at all unless enabled
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Traffic capture, outermost but for CORS so recorded durations cover every
+# other middleware; not installed at all unless enabled
+if settings.TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -37,7 +115,8 @@ app.include_router(api_router)
 @app.get("/")
 async def root():
     """
-    Root endpoint returning application health information
+    Root endpoint returning application information; see /health/ready for
+    upstream-aware readiness
     """
     return {
         "message": "Welcome to the Home Maintenance API", 
@@ -46,7 +125,15 @@ async def root():
         "environment": settings.ENVIRONMENT
     }
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics, including upstream circuit breaker state
+    """
+    return registry.render()
+
 # Run the application with: uvicorn app.main:app --reload
+# In production: gunicorn -c gunicorn_conf.py app.main:app
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=settings.ENVIRONMENT != "production")
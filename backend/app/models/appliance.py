@@ -7,6 +7,9 @@ from typing import Optional, List
 from datetime import date
 import uuid
 
+from app.models.reminder import ReminderResponse
+from app.models.service_record import ServiceRecordResponse
+
 class ApplianceBase(BaseModel):
     """Base model for appliances"""
     name: str
@@ -38,3 +41,8 @@ class ApplianceResponse(ApplianceBase):
     model_config = {
         "from_attributes": True
     }
+
+class ApplianceDetailResponse(ApplianceResponse):
+    """Model for an appliance with the children requested through ?include="""
+    service_records: Optional[List[ServiceRecordResponse]] = None
+    reminders: Optional[List[ReminderResponse]] = None
@@ -0,0 +1,30 @@
+"""
+Models for cascading deletes, bulk moves and multi-gets
+"""
+from pydantic import BaseModel
+from typing import Generic, Optional, List, TypeVar
+
+RowT = TypeVar("RowT")
+
+class DeletionCounts(BaseModel):
+    """Rows removed by a cascading delete, per table"""
+    home_profiles: int = 0
+    appliances: int = 0
+    service_records: int = 0
+    maintenance_reminders: int = 0
+
+class MoveAppliancesRequest(BaseModel):
+    """Model for moving appliances to another home profile"""
+    to_home_profile_id: str
+    appliance_ids: Optional[List[str]] = None
+
+class MoveAppliancesResponse(BaseModel):
+    """Model for bulk move results"""
+    moved: int
+    appliance_ids: List[str]
+
+class ByIdResponse(BaseModel, Generic[RowT]):
+    """Model for a multi-get by id: the user's rows, in request order, and the ids that were not returned"""
+    found: List[RowT]
+    forbidden: List[str]
+    missing: List[str]
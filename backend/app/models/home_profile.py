@@ -3,10 +3,12 @@
 Home profile models for request and response schemas
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import date
 import uuid
 
+from app.models.appliance import ApplianceResponse
+
 class HomeProfileBase(BaseModel):
     """Base model for home profiles"""
     address: str
@@ -27,7 +29,12 @@ class HomeProfileResponse(HomeProfileBase):
     """Model for home profile responses"""
     id: str
     user_id: str
+    thumbnails: Optional[Dict[str, Dict[str, str]]] = None
     
     model_config = {
         "from_attributes": True
     }
+
+class HomeProfileDetailResponse(HomeProfileResponse):
+    """Model for a home profile with the children requested through ?include="""
+    appliances: Optional[List[ApplianceResponse]] = None
@@ -0,0 +1,16 @@
+"""
+Request profile models for admin endpoints
+"""
+from pydantic import BaseModel
+from typing import Optional
+
+class ProfileSummary(BaseModel):
+    """Model for a captured request profile, without its stacks"""
+    id: str
+    method: str
+    route: str
+    trigger: str
+    status_code: Optional[int] = None
+    started_at: float
+    duration_ms: float
+    samples: int
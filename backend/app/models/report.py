@@ -0,0 +1,41 @@
+"""
+Report job models for request and response schemas
+"""
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class ReportFormat(str, Enum):
+    """Output format of a report"""
+    pdf = "pdf"
+    csv = "csv"
+
+class ReportStatus(str, Enum):
+    """Lifecycle of a report job"""
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class ReportCreate(BaseModel):
+    """Model for requesting a home lifecycle and cost report"""
+    home_profile_id: str
+    format: ReportFormat = ReportFormat.pdf
+
+class ReportJobResponse(BaseModel):
+    """Model for report job responses"""
+    id: str
+    home_profile_id: str
+    format: ReportFormat
+    status: ReportStatus
+    data_hash: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = {
+        "from_attributes": True
+    }
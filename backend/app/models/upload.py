@@ -0,0 +1,54 @@
+"""
+File upload models for request and response schemas
+"""
+from pydantic import BaseModel, Field
+from typing import Optional, Dict
+from datetime import datetime
+from enum import Enum
+
+class UploadKind(str, Enum):
+    """What an uploaded file is attached to"""
+    warranty_document = "warranty_document"
+    invoice_document = "invoice_document"
+    home_image = "home_image"
+
+class UploadCreate(BaseModel):
+    """Model for requesting a presigned upload URL"""
+    kind: UploadKind
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0)
+
+class UploadComplete(BaseModel):
+    """Model for confirming a finished upload"""
+    checksum: Optional[str] = Field(None, description="Hex SHA-256 of the uploaded bytes")
+
+class PresignedUrlResponse(BaseModel):
+    """Model for a presigned storage URL"""
+    url: str
+    method: str
+    expires_at: int
+    headers: Dict[str, str] = {}
+
+class UploadTicketResponse(PresignedUrlResponse):
+    """Model for a newly issued upload URL"""
+    id: str
+    path: str
+
+class UploadResponse(BaseModel):
+    """Model for upload metadata responses"""
+    id: str
+    user_id: str
+    kind: UploadKind
+    path: str
+    filename: str
+    content_type: str
+    size: Optional[int] = None
+    checksum: Optional[str] = None
+    status: str
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    model_config = {
+        "from_attributes": True
+    }
@@ -0,0 +1,112 @@
+"""
+Benchmark: per-request app overhead of the API on the in-memory database
+
+Run from the backend directory:
+    python -m benchmarks.bench_api --profiles 5 --appliances 20 --requests 2000
+
+Requests go through the full ASGI stack (middleware, auth, routing,
+validation, serialization) without a network or database round trip, so the
+numbers are what the application itself costs per request.
+"""
+import os
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-" + "x" * 32)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+
+def auth_headers(user_id: str) -> Dict[str, str]:
+    from jose import jwt
+
+    from app.core.config import settings
+
+    token = jwt.encode(
+        {"sub": user_id, "aud": settings.JWT_AUDIENCE, "role": "authenticated", "exp": int(time.time()) + 3600},
+        settings.JWT_SECRET,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def seed(user_id: str, profiles: int, appliances: int) -> Dict[str, str]:
+    from app.core.database import get_db
+
+    db = get_db()
+    profile_ids = []
+    for profile in range(profiles):
+        row = (await db.table("home_profiles").insert({
+            "user_id": user_id, "address": f"{profile} Benchmark Way", "construction_year": 1990
+        }).execute()).data[0]
+        profile_ids.append(row["id"])
+        for index in range(appliances):
+            appliance = (await db.table("appliances").insert({
+                "home_profile_id": row["id"], "name": f"Appliance {index}",
+                "category": "Kitchen", "purchase_date": "2020-01-01",
+            }).execute()).data[0]
+            await db.table("service_records").insert([{
+                "appliance_id": appliance["id"], "date": "2023-05-01", "service_type": "Inspection",
+                "provider_name": "Acme", "cost": 99.5,
+            }] * 3).execute()
+            await db.table("maintenance_reminders").insert({
+                "appliance_id": appliance["id"], "title": "Filter", "due_date": "2027-01-01"
+            }).execute()
+    return {"home_profile_id": profile_ids[0], "appliance_id": appliance["id"]}
+
+
+async def measure(client: httpx.AsyncClient, path: str, headers: Dict[str, str], requests: int) -> List[float]:
+    await client.get(path, headers=headers)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}: {response.text[:200]}")
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", type=int, default=5)
+    parser.add_argument("--appliances", type=int, default=20, help="Appliances per home profile")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from app.main import app
+
+    user_id = str(uuid.uuid4())
+    headers = auth_headers(user_id)
+    ids = await seed(user_id, args.profiles, args.appliances)
+    paths = {
+        "get appliance": f"/appliances/{ids['appliance_id']}",
+        "list home profiles": "/home_profiles/",
+        "list appliances": "/appliances/",
+        "list service records": "/service_records/",
+        "list reminders": "/reminders/",
+    }
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{args.profiles} profiles x {args.appliances} appliances, {args.requests} sequential requests each:")
+            for label, path in paths.items():
+                samples = sorted(await measure(client, path, headers, args.requests))
+                p95 = samples[int(len(samples) * 0.95) - 1]
+                print(
+                    f"  {label:<22} p50 {statistics.median(samples) * 1000:7.3f} ms   p95 {p95 * 1000:7.3f} ms"
+                    f"   {len(samples) / sum(samples):8.0f} requests/s"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
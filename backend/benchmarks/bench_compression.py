@@ -0,0 +1,125 @@
+"""
+Benchmark: bytes and CPU saved by response compression
+
+Run from the backend directory:
+    python -m benchmarks.bench_compression --records 200 --requests 300
+
+Seeds the in-memory database and fetches the service record list and a CSV
+report through the full ASGI stack with each Accept-Encoding. "cold" clears
+the compressed cache before every request, so it pays for compression each
+time; "cached" repeats the same response and is served precompressed. Bytes
+are measured on the wire (before the client would decode them) and CPU is
+the process time per request, client included.
+"""
+import os
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-" + "x" * 32)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.bench_api import auth_headers
+
+ENCODINGS = ("identity", "gzip", "br", "zstd")
+
+
+async def seed(client: httpx.AsyncClient, headers: Dict[str, str], records: int) -> str:
+    profile = (await client.post(
+        "/home_profiles/", json={"address": "1 Benchmark Way", "construction_year": 1990}, headers=headers
+    )).json()
+    categories = ["Kitchen", "HVAC", "Laundry", "Plumbing"]
+    appliance_ids = []
+    for index in range(10):
+        appliance = (await client.post("/appliances/", json={
+            "home_profile_id": profile["id"], "name": f"Appliance {index}",
+            "category": categories[index % len(categories)], "purchase_date": "2020-01-01",
+        }, headers=headers)).json()
+        appliance_ids.append(appliance["id"])
+    for index in range(records):
+        await client.post("/service_records/", json={
+            "appliance_id": appliance_ids[index % len(appliance_ids)], "date": f"2023-{index % 12 + 1:02d}-01",
+            "service_type": ["Inspection", "Repair", "Cleaning"][index % 3], "provider_name": "Acme Services",
+            "cost": 99.5 + index % 7, "notes": "Routine visit",
+        }, headers=headers)
+    return profile["id"]
+
+
+async def report_path(client: httpx.AsyncClient, headers: Dict[str, str], home_profile_id: str) -> str:
+    job = (await client.post("/reports/", json={"home_profile_id": home_profile_id, "format": "csv"}, headers=headers)).json()
+    for _ in range(200):
+        if (await client.get(f"/reports/{job['id']}", headers=headers)).json()["status"] == "succeeded":
+            return f"/reports/{job['id']}/download"
+        await asyncio.sleep(0.05)
+    raise RuntimeError("Report did not finish")
+
+
+async def measure(
+    client: httpx.AsyncClient, path: str, headers: Dict[str, str], requests: int, cold: bool
+) -> Tuple[int, List[float], float]:
+    from app.core.compression import compressed_cache
+
+    wire_bytes = 0
+    samples = []
+    cpu_started = time.process_time()
+    for _ in range(requests):
+        if cold:
+            compressed_cache.clear()
+        started = time.perf_counter()
+        async with client.stream("GET", path, headers=headers) as response:
+            wire_bytes = sum([len(chunk) async for chunk in response.aiter_raw()])
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return wire_bytes, samples, (time.process_time() - cpu_started) / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=200, help="Service records in the list")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    from app.core.compression import available_codecs
+    from app.main import app
+
+    headers = auth_headers(str(uuid.uuid4()))
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            home_profile_id = await seed(client, headers, args.records)
+            paths = {
+                f"list {args.records} service records": "/service_records/",
+                "CSV report": await report_path(client, headers, home_profile_id),
+            }
+            codecs = available_codecs()
+            for label, path in paths.items():
+                print(f"{label}:")
+                baseline_cpu = None
+                for encoding in ENCODINGS:
+                    if encoding != "identity" and encoding not in codecs:
+                        print(f"  {encoding:<8} skipped, its package is not installed")
+                        continue
+                    for mode in (("cold",) if encoding == "identity" else ("cold", "cached")):
+                        size, samples, cpu = await measure(
+                            client, path, {**headers, "Accept-Encoding": encoding}, args.requests, mode == "cold"
+                        )
+                        if baseline_cpu is None:
+                            baseline_cpu, baseline_size = cpu, size
+                        print(
+                            f"  {encoding:<8} {mode:<6} {size:8d} bytes ({size / baseline_size:6.1%})"
+                            f"   p50 {statistics.median(samples) * 1000:7.3f} ms"
+                            f"   CPU {cpu * 1000:7.3f} ms/request ({(cpu - baseline_cpu) * 1000:+7.3f})"
+                        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Benchmark: hot queries through run_query, direct Postgres vs. PostgREST
+
+Run from the backend directory against a database with the migrations applied:
+    python -m benchmarks.bench_database --dsn postgresql://postgres@localhost/postgres --seed
+
+--seed inserts a user with 5 home profiles, 20 appliances each and their
+history. The PostgREST path is included when SUPABASE_URL and SUPABASE_KEY
+point at the same database. Each query runs --iterations times per
+concurrent task, and latency covers building the query, the round trip and
+decoding the rows.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+from app.core.config import settings
+
+
+async def seed(dsn: str) -> str:
+    import asyncpg
+
+    user_id = str(uuid.uuid4())
+    connection = await asyncpg.connect(dsn)
+    try:
+        for profile in range(5):
+            home_profile_id = await connection.fetchval(
+                "insert into home_profiles (user_id, address, construction_year) values ($1, $2, 1990) returning id",
+                uuid.UUID(user_id), f"{profile} Benchmark Way",
+            )
+            for index in range(20):
+                appliance_id = await connection.fetchval(
+                    "insert into appliances (home_profile_id, name, category, purchase_date)"
+                    " values ($1, $2, 'Kitchen', '2020-01-01') returning id",
+                    home_profile_id, f"Appliance {index}",
+                )
+                await connection.executemany(
+                    "insert into service_records (appliance_id, date, service_type, provider_name, cost)"
+                    " values ($1, '2023-05-01', 'Inspection', 'Acme', 99.5)",
+                    [(appliance_id,)] * 3,
+                )
+                await connection.execute(
+                    "insert into maintenance_reminders (appliance_id, title, due_date) values ($1, 'Filter', '2027-01-01')",
+                    appliance_id,
+                )
+    finally:
+        await connection.close()
+    return user_id
+
+
+def hot_queries(db, user_id: str, home_profile_id: str, appliance_id: str) -> Dict[str, Callable[[], object]]:
+    return {
+        "get appliance by id": lambda: db.table("appliances").select("*").eq("id", appliance_id),
+        "list home profiles by user": lambda: db.table("home_profiles").select("*").eq("user_id", user_id),
+        "list appliances by profiles": lambda: db.table("appliances").select("*").in_("home_profile_id", [home_profile_id]),
+        "get_user_appliances RPC": lambda: db.rpc("get_user_appliances", {"p_user_id": user_id}),
+    }
+
+
+async def measure(run: Callable[[], Awaitable[object]], iterations: int, concurrency: int) -> List[float]:
+    await run()  # warm up: connect, prepare
+    samples: List[float] = []
+
+    async def worker():
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await run()
+            samples.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def bench_backend(db, user_id: str, iterations: int, concurrency: int) -> Dict[str, List[float]]:
+    from app.core.supabase import run_query
+
+    profiles = await run_query(db.table("home_profiles").select("id").eq("user_id", user_id))
+    home_profile_id = profiles.data[0]["id"]
+    appliances = await run_query(db.table("appliances").select("id").eq("home_profile_id", home_profile_id))
+    appliance_id = appliances.data[0]["id"]
+
+    results = {}
+    for label, build in hot_queries(db, user_id, home_profile_id, appliance_id).items():
+        # A fresh builder per call, as in a request handler
+        results[label] = await measure(lambda: run_query(build()), iterations, concurrency)
+    return results
+
+
+def report(name: str, results: Dict[str, List[float]], concurrency: int):
+    print(f"{name} (concurrency {concurrency}):")
+    for label, samples in results.items():
+        samples = sorted(samples)
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        total = sum(samples) / concurrency
+        print(
+            f"  {label:<30} p50 {statistics.median(samples) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms"
+            f"   {len(samples) / total:8.0f} queries/s"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("POSTGRES_DSN", ""))
+    parser.add_argument("--user-id", help="Existing user with home profiles and appliances")
+    parser.add_argument("--seed", action="store_true", help="Insert benchmark rows for a new user")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("--dsn or POSTGRES_DSN is required")
+    user_id = await seed(args.dsn) if args.seed else args.user_id
+    if not user_id:
+        parser.error("--user-id or --seed is required")
+
+    from app.core.postgres import PostgresDatabase
+
+    postgres = PostgresDatabase(args.dsn, max_size=args.concurrency)
+    try:
+        report("postgres (asyncpg)", await bench_backend(postgres, user_id, args.iterations, args.concurrency), args.concurrency)
+    finally:
+        await postgres.close()
+
+    if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+        from app.core.supabase import get_supabase
+
+        report("supabase (PostgREST)", await bench_backend(get_supabase(), user_id, args.iterations, args.concurrency), args.concurrency)
+    else:
+        print("supabase (PostgREST): skipped, SUPABASE_URL and SUPABASE_KEY are not set")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Benchmark: bytes per cached row, dicts vs. compact records
+
+Run from the backend directory:
+    python -m benchmarks.bench_memory --users 200
+
+Builds the working set of --users users (20 appliances each, with their
+service records and reminders) as PostgREST would return it, decoded from
+JSON, and measures with tracemalloc the memory each representation retains:
+the plain dicts, one `__slots__` record per row and one RecordArray per
+table and user (the form the stale read cache stores). Also reports the CPU
+cost of converting rows to and from the compact form, per row and per read
+(one table's rows for one user, as a list endpoint fetches them), which a
+worker pays on every cached read when UPSTREAM_STALE_COMPACT is on.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from app.core.records import RECORD_TYPES, RecordArray
+
+CATEGORIES = ["HVAC", "Kitchen", "Laundry", "Plumbing", "Electrical", "Outdoor"]
+SERVICE_TYPES = ["Inspection", "Repair", "Cleaning", "Filter replacement", "Installation"]
+PROVIDERS = [f"Provider {index}" for index in range(25)]
+TITLES = ["Replace filter", "Descale", "Clean coils", "Check seals", "Flush tank"]
+
+
+def _timestamp(rng: random.Random) -> str:
+    moment = datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(3 * 365 * 86400))
+    return moment.replace(microsecond=rng.randrange(1000000)).isoformat()
+
+
+def _date(rng: random.Random) -> str:
+    return (datetime(2019, 1, 1) + timedelta(days=rng.randrange(6 * 365))).date().isoformat()
+
+
+def working_set(rng: random.Random, appliances: int) -> Dict[str, List[Dict[str, Any]]]:
+    """One user's rows per table"""
+    home_profile_id = str(uuid.uuid4())
+    tables: Dict[str, List[Dict[str, Any]]] = {"appliances": [], "service_records": [], "maintenance_reminders": []}
+    for index in range(appliances):
+        appliance_id = str(uuid.uuid4())
+        tables["appliances"].append({
+            "id": appliance_id, "home_profile_id": home_profile_id, "name": f"Appliance {index}",
+            "category": rng.choice(CATEGORIES), "purchase_date": _date(rng),
+            "warranty_expiration_date": _date(rng) if index % 2 else None, "warranty_document": None,
+            "notes": "Bought with the house" if index % 3 == 0 else None,
+            "created_at": _timestamp(rng), "updated_at": _timestamp(rng),
+        })
+        for _ in range(rng.randrange(2, 9)):
+            tables["service_records"].append({
+                "id": str(uuid.uuid4()), "appliance_id": appliance_id, "date": _date(rng),
+                "service_type": rng.choice(SERVICE_TYPES), "provider_name": rng.choice(PROVIDERS),
+                "provider_contact": None, "cost": round(rng.uniform(40, 600), 2), "notes": None,
+                "invoice_document": None, "created_at": _timestamp(rng), "updated_at": _timestamp(rng),
+            })
+        for _ in range(rng.randrange(0, 3)):
+            tables["maintenance_reminders"].append({
+                "id": str(uuid.uuid4()), "appliance_id": appliance_id, "title": rng.choice(TITLES),
+                "description": None, "due_date": _date(rng), "recurring": True,
+                "recurrence_pattern": "yearly", "completed": False,
+                "created_at": _timestamp(rng), "updated_at": _timestamp(rng),
+            })
+    return tables
+
+
+def retained(build: Callable[[], Any]) -> int:
+    """Bytes still allocated after `build()`, while its result is alive"""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--appliances", type=int, default=20, help="Appliances per user")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # Encoded as the upstream sends it, so every row is decoded into its own strings
+    payloads = [
+        {table: json.dumps(rows) for table, rows in working_set(rng, args.appliances).items()}
+        for _ in range(args.users)
+    ]
+    rows = sum(len(json.loads(payload)) for user in payloads for payload in user.values())
+
+    def dicts():
+        return [{table: json.loads(payload) for table, payload in user.items()} for user in payloads]
+
+    def records():
+        return [
+            {table: [RECORD_TYPES[table](row) for row in json.loads(payload)] for table, payload in user.items()}
+            for user in payloads
+        ]
+
+    def arrays():
+        return [
+            {table: RecordArray(RECORD_TYPES[table], json.loads(payload)) for table, payload in user.items()}
+            for user in payloads
+        ]
+
+    tracemalloc.start()
+    sizes = {"dicts": retained(dicts), "__slots__ records": retained(records), "RecordArray": retained(arrays)}
+    tracemalloc.stop()
+
+    print(f"{args.users} users, {rows} rows")
+    for label, size in sizes.items():
+        print(
+            f"  {label:<18} {size / rows:7.1f} bytes/row   {size / 1024 / 1024:7.2f} MiB"
+            f"   {sizes['dicts'] / size:4.1f}x   {100 * 1024 * 1024 * args.users // size:7d} users per 100 MiB"
+        )
+
+    decoded = dicts()
+    reads = sum(len(user) for user in decoded)
+    started = time.process_time()
+    compacted = [{table: RecordArray(RECORD_TYPES[table], data) for table, data in user.items()} for user in decoded]
+    compact_cpu = time.process_time() - started
+    started = time.process_time()
+    for user in compacted:
+        for array in user.values():
+            array.to_rows()
+    expand_cpu = time.process_time() - started
+    print(f"  compact {compact_cpu / rows * 1e6:.2f} µs/row, expand {expand_cpu / rows * 1e6:.2f} µs/row")
+    print(
+        f"  per read ({rows / reads:.0f} rows on average): compact {compact_cpu / reads * 1000:.3f} ms,"
+        f" expand {expand_cpu / reads * 1000:.3f} ms; per 1000-row read: compact"
+        f" {compact_cpu / rows * 1e6:.2f} ms, expand {expand_cpu / rows * 1e6:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: CPU per 10k-row list response, response_model validation vs. the fast path
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --rows 10000 --iterations 20
+"""
+import argparse
+import statistics
+import time
+import uuid
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.serialization import build_serializers, serialize_list
+from app.models.appliance import ApplianceResponse
+
+
+def make_rows(count: int) -> List[dict]:
+    categories = ["HVAC", "Kitchen", "Laundry", "Plumbing", "Electrical"]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "home_profile_id": str(uuid.uuid4()),
+            "name": f"Appliance {i}",
+            "category": categories[i % len(categories)],
+            "purchase_date": "2021-03-14",
+            "warranty_expiration_date": "2026-03-14" if i % 2 else None,
+            "warranty_document": None,
+            "notes": "Serviced annually",
+            "created_at": "2024-01-01T00:00:00+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(rows: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=List[ApplianceResponse])
+    async def validated():
+        return rows
+
+    @app.get("/fast", response_model=List[ApplianceResponse])
+    async def fast():
+        return serialize_list(rows, ApplianceResponse)
+
+    return app
+
+
+def measure(client: TestClient, path: str, iterations: int) -> List[float]:
+    client.get(path)  # warm up
+    samples = []
+    for _ in range(iterations):
+        started = time.process_time()
+        response = client.get(path)
+        response.read()
+        samples.append(time.process_time() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    build_serializers(ApplianceResponse)
+    client = TestClient(build_app(rows))
+
+    results = {}
+    results["response_model validation"] = measure(client, "/validated", args.iterations)
+
+    settings.SERIALIZATION_STREAM_THRESHOLD = args.rows + 1
+    results["fast path"] = measure(client, "/fast", args.iterations)
+
+    settings.SERIALIZATION_STREAM_THRESHOLD = 0
+    results["fast path, streamed"] = measure(client, "/fast", args.iterations)
+
+    baseline = statistics.median(results["response_model validation"])
+    print(f"CPU per {args.rows}-row response (median of {args.iterations}):")
+    for name, samples in results.items():
+        median = statistics.median(samples)
+        print(f"  {name:<28} {median * 1000:8.1f} ms   {baseline / median:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: cold start, from a fresh interpreter to the first 200 response
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --runs 5
+
+Each run starts a new uvicorn process and polls /health/live until it answers,
+so the timing covers interpreter start, imports, app construction, the lifespan
+startup and the first request. The import of app.main alone is timed separately.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_import(runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def time_first_response(runs: int, timeout: float) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/health/live"
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"No response from {url} within {timeout}s")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.005)
+            samples.append(time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ENVIRONMENT", "production")
+
+    results = {
+        "import app.main": time_import(args.runs),
+        "cold start to first 200": time_first_response(args.runs, args.timeout),
+    }
+    print(f"Startup timings (median of {args.runs}):")
+    for name, samples in results.items():
+        print(f"  {name:<26} {statistics.median(samples) * 1000:8.1f} ms   (min {min(samples) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
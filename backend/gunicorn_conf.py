@@ -0,0 +1,69 @@
+"""
+Gunicorn configuration for production: multiple uvicorn worker processes
+
+Run with:
+    gunicorn -c gunicorn_conf.py app.main:app
+
+Every setting can be overridden through the environment variables below.
+"""
+import logging
+import multiprocessing
+import os
+
+
+def _available_cpus() -> int:
+    # Respect CPU affinity (e.g. container cpusets) where the platform supports it
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# Async workers each serve many concurrent requests, so one per core keeps every
+# core busy without oversubscribing
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cpus() * int(os.getenv("WORKERS_PER_CORE", "1"))))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the application once in the master so workers fork with its code already
+# loaded. Shared clients and pools are created inside each worker on first use,
+# after the fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting
+# all workers at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# Let in-flight requests finish on reload (HUP) and shutdown (TERM)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    server.log.info(f"Gunicorn ready with {workers} {worker_class} workers (preload={preload_app})")
+    from app.core.config import settings
+
+    if workers > 1 and settings.IDEMPOTENCY_ENABLED and settings.IDEMPOTENCY_STORE == "memory":
+        server.log.warning("IDEMPOTENCY_STORE=memory is per worker; set it to redis to deduplicate across workers")
+
+
+def post_fork(server, worker):
+    # Anything the master created while preloading must not be shared across
+    # processes; drop it so the worker creates its own
+    from app.core import database, supabase, thumbnails
+
+    database.reset_after_fork()
+    supabase.reset_after_fork()
+    thumbnails.reset_after_fork()
+    server.log.info(f"Worker {worker.pid} forked")
+
+
+def worker_exit(server, worker):
+    logging.getLogger("app").info(f"Worker {worker.pid} exiting")
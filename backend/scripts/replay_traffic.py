@@ -0,0 +1,412 @@
+"""
+Replay captured traffic against a local instance and compare builds
+
+Usage (from the backend directory):
+    python -m scripts.replay_traffic run "$DATA_DIR"/traffic/*.jsonl --speed 4 --output build-a.json
+    python -m scripts.replay_traffic run "$DATA_DIR"/traffic/*.jsonl --speed 4 --output build-b.json --baseline build-a.json
+    python -m scripts.replay_traffic compare build-a.json build-b.json
+
+`run` loads `app.main:app` in process on the in-memory database, which stands
+in for Supabase. It seeds a synthetic user for each user bucket in the capture
+(see app/core/traffic.py) and sends the captured requests through the full
+ASGI stack. Requests go out at their original offsets divided by --speed
+(--speed 0 sends them as fast as --concurrency allows). Ids in paths and
+queries are filled from the bucket's seeded rows, and write bodies are
+synthetic. Each DELETE gets a spare row seeded for it. Requests whose shape
+cannot be rebuilt (uploads, event streams, unknown path parameters) are
+skipped and counted.
+
+The output holds every request's latency by route, and `compare` (or
+--baseline) prints p50/p90/p99 per route for two runs side by side. Replay
+runs on the same capture and seed are deterministic, so differences come
+from the build.
+"""
+import os
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ.setdefault("JWT_SECRET", "replay-secret-" + "x" * 32)
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["TRAFFIC_CAPTURE_ENABLED"] = "false"
+os.environ["PROFILING_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# Path parameter names and the table whose ids they take
+PARAMETER_TABLES = {
+    "profile_id": "home_profiles",
+    "home_profile_id": "home_profiles",
+    "appliance_id": "appliances",
+    "record_id": "service_records",
+    "reminder_id": "maintenance_reminders",
+}
+# List endpoints and the table of their `ids` parameter
+LIST_TABLES = {
+    "/home_profiles/": "home_profiles",
+    "/appliances/": "appliances",
+    "/service_records/": "service_records",
+    "/reminders/": "maintenance_reminders",
+}
+UNSUPPORTED = ("/uploads", "/thumbnails", "/events", "/home_profiles/{profile_id}/move_appliances")
+
+
+def _create_body(table: str, ids: Dict[str, List[str]]) -> Dict[str, Any]:
+    if table == "home_profiles":
+        return {"address": "1 Replay Way", "construction_year": 1990}
+    if table == "appliances":
+        return {"home_profile_id": ids["home_profiles"][0], "name": "Replay appliance", "category": "Kitchen",
+                "purchase_date": "2020-01-01"}
+    if table == "service_records":
+        return {"appliance_id": ids["appliances"][0], "date": "2024-01-01", "service_type": "Inspection",
+                "provider_name": "Acme Services", "cost": 120.0}
+    return {"appliance_id": ids["appliances"][0], "title": "Replace filter", "due_date": "2027-01-01"}
+
+
+# Write routes: (method, route) -> body factory given the bucket's seeded ids
+BODIES: Dict[Tuple[str, str], Callable[[Dict[str, List[str]]], Optional[Dict[str, Any]]]] = {
+    ("POST", "/home_profiles/"): lambda ids: _create_body("home_profiles", ids),
+    ("POST", "/appliances/"): lambda ids: _create_body("appliances", ids),
+    ("POST", "/service_records/"): lambda ids: _create_body("service_records", ids),
+    ("POST", "/reminders/"): lambda ids: _create_body("maintenance_reminders", ids),
+    ("POST", "/reports/"): lambda ids: {"home_profile_id": ids["home_profiles"][0], "format": "csv"},
+    ("PUT", "/home_profiles/{profile_id}"): lambda ids: {"address": "2 Replay Way"},
+    ("PUT", "/appliances/{appliance_id}"): lambda ids: {"notes": "Replayed update"},
+    ("PUT", "/service_records/{record_id}"): lambda ids: {"cost": 130.0},
+    ("PUT", "/reminders/{reminder_id}"): lambda ids: {"title": "Replace filter soon"},
+    ("PATCH", "/reminders/{reminder_id}/complete"): lambda ids: None,
+}
+
+
+@dataclass
+class Planned:
+    offset: float
+    method: str
+    route: str
+    path: str
+    params: Dict[str, str]
+    bucket: Optional[int]
+    body: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class Bucket:
+    user_id: str
+    headers: Dict[str, str]
+    ids: Dict[str, List[str]] = field(default_factory=dict)
+    spares: Dict[str, List[str]] = field(default_factory=lambda: defaultdict(list))
+
+
+def auth_headers(user_id: str) -> Dict[str, str]:
+    from jose import jwt
+
+    from app.core.config import settings
+
+    token = jwt.encode(
+        {"sub": user_id, "aud": settings.JWT_AUDIENCE, "role": "authenticated", "exp": int(time.time()) + 86400},
+        settings.JWT_SECRET,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def load_captures(paths: List[str], limit: Optional[int]) -> List[Dict[str, Any]]:
+    entries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as capture:
+            for line in capture:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and {"t", "m", "r"} <= entry.keys():
+                    entries.append(entry)
+    entries.sort(key=lambda entry: entry["t"])
+    return entries[:limit] if limit else entries
+
+
+def _delete_table(route: str) -> Optional[str]:
+    parameter = route.rstrip("/").split("/")[2] if route.count("/") >= 2 else ""
+    return PARAMETER_TABLES.get(parameter.strip("{}"))
+
+
+async def seed_bucket(bucket: Bucket, appliances: int, records: int, reminders: int, spares: Counter):
+    """Rows for one synthetic user, plus a spare row for each DELETE of the bucket"""
+    from app.core.database import get_db
+
+    db = get_db()
+
+    async def insert(table: str, rows: List[Dict[str, Any]]) -> List[str]:
+        return [row["id"] for row in (await db.table(table).insert(rows).execute()).data] if rows else []
+
+    profile = await insert("home_profiles", [{
+        "user_id": bucket.user_id, "address": "1 Replay Way", "construction_year": 1990,
+    }])
+    appliance_ids = await insert("appliances", [{
+        "home_profile_id": profile[0], "name": f"Appliance {index}", "category": ["Kitchen", "HVAC", "Laundry"][index % 3],
+        "purchase_date": "2020-01-01",
+    } for index in range(appliances)])
+    record_ids = await insert("service_records", [{
+        "appliance_id": appliance_id, "date": f"2023-{index % 12 + 1:02d}-01", "service_type": "Inspection",
+        "provider_name": "Acme Services", "cost": 99.5,
+    } for appliance_id in appliance_ids for index in range(records)])
+    reminder_ids = await insert("maintenance_reminders", [{
+        "appliance_id": appliance_id, "title": "Replace filter", "due_date": "2027-01-01",
+    } for appliance_id in appliance_ids for _ in range(reminders)])
+    bucket.ids = {
+        "home_profiles": profile, "appliances": appliance_ids,
+        "service_records": record_ids, "maintenance_reminders": reminder_ids,
+    }
+    for table, count in spares.items():
+        spare = [_create_body(table, bucket.ids) for _ in range(count)]
+        if table == "home_profiles":
+            spare = [{**row, "user_id": bucket.user_id} for row in spare]
+        bucket.spares[table] = await insert(table, spare)
+
+
+def plan(entries: List[Dict[str, Any]]) -> Tuple[List[Planned], Counter, Dict[int, Counter]]:
+    """Requests with placeholders still unresolved, skip reasons, and spare rows needed per bucket"""
+    planned: List[Planned] = []
+    skipped: Counter = Counter()
+    spares: Dict[int, Counter] = defaultdict(Counter)
+    started = entries[0]["t"] if entries else 0
+    for entry in entries:
+        method, route, bucket = entry["m"], entry["r"], entry.get("u")
+        if route is None:
+            skipped["unmatched path"] += 1
+            continue
+        if route.startswith(UNSUPPORTED):
+            skipped["unsupported route"] += 1
+            continue
+        parameters = [part[1:-1] for part in route.split("/") if part.startswith("{")]
+        if any(parameter not in PARAMETER_TABLES for parameter in parameters):
+            skipped["unknown path parameter"] += 1
+            continue
+        if parameters and bucket is None:
+            skipped["anonymous request for a row"] += 1
+            continue
+        if method in ("POST", "PUT", "PATCH") and (method, route) not in BODIES:
+            skipped["unsupported write"] += 1
+            continue
+        if method == "DELETE":
+            table = _delete_table(route)
+            if table is None:
+                skipped["unsupported write"] += 1
+                continue
+            spares[bucket][table] += 1
+        planned.append(Planned(entry["t"] - started, method, route, route, dict(entry.get("q", {})), bucket))
+    return planned, skipped, spares
+
+
+def resolve(request: Planned, bucket: Optional[Bucket], rng: random.Random) -> bool:
+    """Fill ids from the bucket's rows and attach the write body; False if the bucket has no row to use"""
+    path = request.route
+    for part in request.route.split("/"):
+        if part.startswith("{"):
+            table = PARAMETER_TABLES[part[1:-1]]
+            if request.method == "DELETE" and part == request.route.split("/")[2]:
+                candidates = bucket.spares[table]
+                row_id = candidates.pop() if candidates else None
+            else:
+                row_id = rng.choice(bucket.ids[table]) if bucket.ids[table] else None
+            if row_id is None:
+                return False
+            path = path.replace(part, row_id, 1)
+    params = {}
+    for name, value in request.params.items():
+        if "@text" in value:
+            continue
+        if "@id" in value:
+            table = LIST_TABLES.get(request.route) if name == "ids" else PARAMETER_TABLES.get(name)
+            if table is None or bucket is None or not bucket.ids.get(table):
+                continue
+            count = min(value.count("@id"), len(bucket.ids[table]))
+            value = ",".join(rng.sample(bucket.ids[table], count))
+        params[name] = value
+    request.path = path
+    request.params = params
+    body = BODIES.get((request.method, request.route))
+    request.body = body(bucket.ids) if body is not None and bucket is not None else None
+    return True
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def replay(args) -> Dict[str, Any]:
+    from app.main import app
+
+    entries = load_captures(args.captures, args.limit)
+    if not entries:
+        raise SystemExit("No captured requests found")
+    rng = random.Random(args.seed)
+    planned, skipped, spares = plan(entries)
+
+    transport = httpx.ASGITransport(app=app)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    lags: List[float] = []
+    async with app.router.lifespan_context(app):
+        buckets: Dict[int, Bucket] = {}
+        for number in sorted({request.bucket for request in planned if request.bucket is not None}):
+            user_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"replay-bucket-{number}"))
+            buckets[number] = Bucket(user_id, auth_headers(user_id))
+            await seed_bucket(buckets[number], args.appliances, args.records, args.reminders, spares.get(number, Counter()))
+        resolved = []
+        for request in planned:
+            if resolve(request, buckets.get(request.bucket), rng):
+                resolved.append(request)
+            else:
+                skipped["no seeded row"] += 1
+        planned = resolved
+        if not planned:
+            raise SystemExit("No captured request could be replayed")
+        warmup = min(args.warmup, len(planned) // 2)
+
+        limit = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60) as client:
+            async def send(request: Planned, due: float):
+                async with limit:
+                    lags.append(max(0.0, time.perf_counter() - due))
+                    headers = buckets[request.bucket].headers if request.bucket is not None else {}
+                    started = time.perf_counter()
+                    response = await client.request(
+                        request.method, request.path, params=request.params, json=request.body, headers=headers
+                    )
+                    elapsed = time.perf_counter() - started
+                key = f"{request.method} {request.route}"
+                latencies[key].append(round(elapsed * 1000, 3))
+                statuses[key][str(response.status_code)] += 1
+
+            for request in planned[:warmup]:
+                await send(request, time.perf_counter())
+            latencies.clear()
+            statuses.clear()
+            lags.clear()
+
+            tasks = []
+            started = time.perf_counter()
+            for request in planned[warmup:]:
+                due = started + (request.offset - planned[warmup].offset) / args.speed if args.speed > 0 else started
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(request, due)))
+            await asyncio.gather(*tasks)
+            wall = time.perf_counter() - started
+
+    return {
+        "label": args.label,
+        "captures": args.captures,
+        "speed": args.speed,
+        "seed": args.seed,
+        "requests": sum(len(samples) for samples in latencies.values()),
+        "wall_seconds": round(wall, 3),
+        "skipped": dict(skipped),
+        "lag_ms": {"p50": round(percentile(lags, 0.5) * 1000, 3), "p99": round(percentile(lags, 0.99) * 1000, 3)},
+        "routes": {
+            key: {"latencies_ms": sorted(samples), "statuses": dict(statuses[key])}
+            for key, samples in sorted(latencies.items())
+        },
+    }
+
+
+def _row(label: str, baseline: List[float], current: List[float]) -> str:
+    cells = [f"{label[:48]:<48}", f"{len(current):>6}"]
+    for fraction in (0.5, 0.9, 0.99):
+        before, after = percentile(baseline, fraction), percentile(current, fraction)
+        change = f"{(after - before) / before:+.0%}" if baseline and before > 0 else "new"
+        cells.append(f"{before:8.2f} {after:8.2f} {change:>6}")
+    return "  ".join(cells)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    lines = [
+        f"{baseline.get('label') or 'baseline'} vs {current.get('label') or 'current'} (latency in ms)",
+        f"{'route':<48}  {'n':>6}  {'p50 before/after':>24}  {'p90 before/after':>24}  {'p99 before/after':>24}",
+    ]
+    overall_before: List[float] = []
+    overall_after: List[float] = []
+    for key in sorted(set(baseline["routes"]) | set(current["routes"])):
+        before = baseline["routes"].get(key, {}).get("latencies_ms", [])
+        after = current["routes"].get(key, {}).get("latencies_ms", [])
+        overall_before += before
+        overall_after += after
+        lines.append(_row(key, before, after))
+    lines.append(_row("all requests", overall_before, overall_after))
+    return "\n".join(lines)
+
+
+def summary(result: Dict[str, Any]) -> str:
+    lines = [
+        f"{result['requests']} requests in {result['wall_seconds']:.1f}s at {result['speed']}x"
+        f" (schedule lag p50 {result['lag_ms']['p50']:.1f} ms, p99 {result['lag_ms']['p99']:.1f} ms)",
+    ]
+    if result["skipped"]:
+        lines.append("skipped: " + ", ".join(f"{reason} {count}" for reason, count in result["skipped"].items()))
+    for key, route in result["routes"].items():
+        samples = route["latencies_ms"]
+        lines.append(
+            f"  {key[:48]:<48} {len(samples):6d}  p50 {percentile(samples, 0.5):8.2f}  p90 {percentile(samples, 0.9):8.2f}"
+            f"  p99 {percentile(samples, 0.99):8.2f}  {route['statuses']}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Replay captures and record latencies")
+    run.add_argument("captures", nargs="+", help="Capture files written by TrafficCaptureMiddleware")
+    run.add_argument("--speed", type=float, default=1.0, help="Multiple of the original rate; 0 for no pacing")
+    run.add_argument("--concurrency", type=int, default=64, help="Most requests in flight at once")
+    run.add_argument("--warmup", type=int, default=100, help="Leading requests sent one by one and not recorded")
+    run.add_argument("--limit", type=int, help="Replay only the first N captured requests")
+    run.add_argument("--seed", type=int, default=1, help="Seed for choosing rows; keep it equal across builds")
+    run.add_argument("--appliances", type=int, default=10, help="Seeded appliances per user bucket")
+    run.add_argument("--records", type=int, default=4, help="Seeded service records per appliance")
+    run.add_argument("--reminders", type=int, default=1, help="Seeded reminders per appliance")
+    run.add_argument("--label", help="Name of this build in reports, e.g. a commit")
+    run.add_argument("--output", help="Write latencies to this file, for compare")
+    run.add_argument("--baseline", help="Compare with an earlier --output")
+    diff = commands.add_parser("compare", help="Compare the latencies of two runs")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as baseline, open(args.current) as current:
+            print(compare(json.load(baseline), json.load(current)))
+        return
+
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    if args.appliances < 1:
+        parser.error("--appliances must be at least 1")
+    result = asyncio.run(replay(args))
+    print(summary(result))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            print()
+            print(compare(json.load(baseline), result))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
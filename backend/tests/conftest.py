@@ -0,0 +1,110 @@
+"""
+Shared fixtures: the app on the in-memory database, and tokens for test users
+
+Settings are read when app.core.config is first imported, so the test
+environment is set here before anything from the app is imported.
+"""
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.update(
+    DATABASE_BACKEND="memory",
+    SUPABASE_URL="",
+    JWT_SECRET="test-jwt-secret-" + "x" * 16,
+    RATE_LIMIT_ENABLED="false",
+    IDEMPOTENCY_ENABLED="true",
+    USE_DB_RPC="false",
+    REPLICA_ENABLED="false",
+    FILE_STORAGE_BACKEND="local",
+    STORAGE_SIGNING_SECRET="test-storage-secret-" + "x" * 12,
+    PUBLIC_BASE_URL="http://testserver",
+    DATA_DIR=tempfile.mkdtemp(prefix="home-maintenance-api-tests-"),
+    LOG_LEVEL="WARNING",
+)
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core.config import settings
+from app.main import app
+
+
+def auth_headers(user_id: str) -> dict:
+    token = jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 3600},
+        settings.JWT_SECRET,
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def user():
+    """Auth headers for a new user, so tests never see each other's rows"""
+    return auth_headers(str(uuid.uuid4()))
+
+
+@pytest.fixture
+def other_user():
+    return auth_headers(str(uuid.uuid4()))
+
+
+@pytest.fixture
+def make_home_profile(client):
+    def make(headers: dict, address: str = "1 Elm Street", construction_year: int = 1990) -> dict:
+        response = client.post(
+            "/home_profiles/", json={"address": address, "construction_year": construction_year}, headers=headers
+        )
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def make_appliance(client):
+    def make(headers: dict, home_profile_id: str, name: str = "Fridge", category: str = "Kitchen",
+             purchase_date: str = "2015-01-02") -> dict:
+        response = client.post(
+            "/appliances/",
+            json={"name": name, "category": category, "purchase_date": purchase_date, "home_profile_id": home_profile_id},
+            headers=headers,
+        )
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def make_service_record(client):
+    def make(headers: dict, appliance_id: str, date: str = "2020-01-01", service_type: str = "Repair",
+             provider_name: str = "Bob", cost: float = 100.0) -> dict:
+        response = client.post(
+            "/service_records/",
+            json={
+                "appliance_id": appliance_id, "date": date, "service_type": service_type,
+                "provider_name": provider_name, "cost": cost,
+            },
+            headers=headers,
+        )
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def make_reminder(client):
+    def make(headers: dict, appliance_id: str, title: str = "Replace filter", due_date: str = "2026-01-01") -> dict:
+        response = client.post(
+            "/reminders/", json={"appliance_id": appliance_id, "title": title, "due_date": due_date}, headers=headers
+        )
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
@@ -0,0 +1,151 @@
+"""
+Appliance CRUD and ownership checks, list filters and sort, ?ids= and ?include=
+"""
+import uuid
+
+from postgrest import SyncPostgrestClient
+
+from app.core.listing import ListQuery
+
+
+def test_create_get_update_delete(client, user, make_home_profile, make_appliance):
+    profile = make_home_profile(user)
+    appliance = make_appliance(user, profile["id"], name="Fridge", category="Kitchen")
+    assert appliance["home_profile_id"] == profile["id"]
+
+    response = client.get(f"/appliances/{appliance['id']}", headers=user)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Fridge"
+
+    response = client.put(f"/appliances/{appliance['id']}", json={"notes": "Bought with the house"}, headers=user)
+    assert response.status_code == 200
+    assert response.json()["notes"] == "Bought with the house"
+    assert response.json()["name"] == "Fridge"
+
+    # An update with nothing to change returns the appliance as it is
+    response = client.put(f"/appliances/{appliance['id']}", json={}, headers=user)
+    assert response.status_code == 200
+    assert response.json()["notes"] == "Bought with the house"
+
+    assert client.delete(f"/appliances/{appliance['id']}", headers=user).status_code == 204
+    assert client.get(f"/appliances/{appliance['id']}", headers=user).status_code == 404
+    assert client.delete(f"/appliances/{appliance['id']}", headers=user).status_code == 404
+
+
+def test_other_users_appliance_is_forbidden(client, user, other_user, make_home_profile, make_appliance):
+    profile = make_home_profile(user)
+    appliance = make_appliance(user, profile["id"])
+    theirs = make_home_profile(other_user)
+
+    assert client.get(f"/appliances/{appliance['id']}", headers=other_user).status_code == 403
+    assert client.put(f"/appliances/{appliance['id']}", json={"notes": "x"}, headers=other_user).status_code == 403
+    assert client.delete(f"/appliances/{appliance['id']}", headers=other_user).status_code == 403
+    assert client.get("/appliances/", headers=other_user).json() == []
+
+    # Nor can appliances be added to, or moved into, another user's home profile
+    response = client.post(
+        "/appliances/",
+        json={"name": "Oven", "category": "Kitchen", "purchase_date": "2020-01-01", "home_profile_id": theirs["id"]},
+        headers=user,
+    )
+    assert response.status_code == 403
+    response = client.put(f"/appliances/{appliance['id']}", json={"home_profile_id": theirs["id"]}, headers=user)
+    assert response.status_code == 403
+    assert client.get(f"/appliances/{appliance['id']}", headers=user).json()["home_profile_id"] == profile["id"]
+
+
+def test_missing_appliance(client, user):
+    assert client.get(f"/appliances/{uuid.uuid4()}", headers=user).status_code == 404
+    assert client.put(f"/appliances/{uuid.uuid4()}", json={"notes": "x"}, headers=user).status_code == 404
+
+
+def test_filters_and_sort(client, user, make_home_profile, make_appliance):
+    house = make_home_profile(user, address="House")
+    cabin = make_home_profile(user, address="Cabin")
+    make_appliance(user, house["id"], name="Fridge", category="Kitchen", purchase_date="2018-05-01")
+    make_appliance(user, house["id"], name="Furnace", category="HVAC", purchase_date="2016-10-01")
+    make_appliance(user, cabin["id"], name="Dishwasher", category="Kitchen", purchase_date="2021-03-01")
+
+    def names(query):
+        response = client.get(f"/appliances/{query}", headers=user)
+        assert response.status_code == 200, response.text
+        return [row["name"] for row in response.json()]
+
+    assert names("?sort=name") == ["Dishwasher", "Fridge", "Furnace"]
+    assert names("?sort=-purchase_date") == ["Dishwasher", "Fridge", "Furnace"]
+    assert names("?category=Kitchen&sort=-name") == ["Fridge", "Dishwasher"]
+    assert names(f"?home_profile_id={house['id']}&sort=name") == ["Fridge", "Furnace"]
+    assert names("?sort=category,name") == ["Furnace", "Dishwasher", "Fridge"]
+    assert names("?category=Laundry") == []
+    assert client.get("/appliances/?sort=price", headers=user).status_code == 422
+
+
+def test_sort_puts_null_warranties_last(client, user, make_home_profile, make_appliance):
+    profile = make_home_profile(user)
+    for name, expires in (("Fridge", "2025-01-01"), ("Furnace", None), ("Dishwasher", "2027-01-01")):
+        appliance = make_appliance(user, profile["id"], name=name)
+        if expires:
+            client.put(f"/appliances/{appliance['id']}", json={"warranty_expiration_date": expires}, headers=user)
+
+    def names(sort):
+        response = client.get(f"/appliances/?sort={sort}", headers=user)
+        assert response.status_code == 200, response.text
+        return [row["name"] for row in response.json()]
+
+    assert names("warranty_expiration_date") == ["Fridge", "Dishwasher", "Furnace"]
+    assert names("-warranty_expiration_date") == ["Dishwasher", "Fridge", "Furnace"]
+
+
+def test_sort_asks_postgrest_for_nulls_last():
+    # Without the modifier Postgres would put nulls first in a descending sort
+    query = SyncPostgrestClient("http://localhost").table("appliances").select("*")
+    query = ListQuery().sort("-warranty_expiration_date").apply(query)
+    assert query.params["order"] == "warranty_expiration_date.desc.nullslast"
+
+
+def test_get_by_ids(client, user, other_user, make_home_profile, make_appliance):
+    profile = make_home_profile(user)
+    first = make_appliance(user, profile["id"], name="Fridge")
+    second = make_appliance(user, profile["id"], name="Oven")
+    theirs = make_appliance(other_user, make_home_profile(other_user)["id"])
+    missing = str(uuid.uuid4())
+
+    response = client.get(f"/appliances/?ids={second['id']},{theirs['id']},{missing},{first['id']}", headers=user)
+    assert response.status_code == 200
+    body = response.json()
+    # Found rows keep the order the ids were requested in
+    assert [row["id"] for row in body["found"]] == [second["id"], first["id"]]
+    assert body["forbidden"] == [theirs["id"]]
+    assert body["missing"] == [missing]
+
+
+def test_get_by_ids_validation(client, user):
+    assert client.get("/appliances/?ids=not-a-uuid", headers=user).status_code == 422
+    assert client.get("/appliances/?ids=", headers=user).status_code == 422
+    too_many = ",".join(str(uuid.uuid4()) for _ in range(101))
+    assert client.get(f"/appliances/?ids={too_many}", headers=user).status_code == 422
+
+
+def test_include_service_records_and_reminders(
+    client, user, other_user, make_home_profile, make_appliance, make_service_record, make_reminder
+):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    for date in ("2020-01-01", "2022-01-01", "2021-06-01"):
+        make_service_record(user, appliance["id"], date=date)
+    for due_date in ("2026-03-01", "2026-01-01"):
+        make_reminder(user, appliance["id"], due_date=due_date)
+
+    response = client.get(f"/appliances/{appliance['id']}?include=service_records,reminders", headers=user)
+    assert response.status_code == 200
+    body = response.json()
+    # Service records newest first, reminders soonest due first
+    assert [row["date"] for row in body["service_records"]] == ["2022-01-01", "2021-06-01", "2020-01-01"]
+    assert [row["due_date"] for row in body["reminders"]] == ["2026-01-01", "2026-03-01"]
+
+    response = client.get(
+        f"/appliances/{appliance['id']}?include=service_records&service_records_limit=1", headers=user
+    )
+    assert [row["date"] for row in response.json()["service_records"]] == ["2022-01-01"]
+
+    assert client.get(f"/appliances/{appliance['id']}?include=service_records", headers=other_user).status_code == 403
+    assert client.get(f"/appliances/{appliance['id']}?include=owner", headers=user).status_code == 422
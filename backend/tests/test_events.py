@@ -0,0 +1,35 @@
+"""
+Event stream authentication: single-use tickets instead of tokens in the URL
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.core.dependencies import get_stream_user
+from app.core.events import EventBus
+
+
+def test_ticket_is_redeemed_once(client, user):
+    response = client.post("/events/ticket", headers=user)
+    assert response.status_code == 200
+    ticket = response.json()["ticket"]
+
+    user_id = jwt.get_unverified_claims(user["Authorization"].split(" ", 1)[1])["sub"]
+    assert asyncio.run(get_stream_user(None, ticket))["id"] == user_id
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_stream_user(None, ticket))
+    assert error.value.status_code == 401
+
+
+def test_ticket_expires():
+    bus = EventBus()
+    ticket = asyncio.run(bus.issue_ticket({"id": "u1"}, ttl=0))
+    assert asyncio.run(bus.redeem_ticket(ticket)) is None
+
+
+def test_stream_rejects_token_in_query_string(client, user):
+    token = user["Authorization"].split(" ", 1)[1]
+    response = client.get("/events/stream", params={"access_token": token})
+    assert response.status_code in (401, 403)
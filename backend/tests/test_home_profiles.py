@@ -0,0 +1,139 @@
+"""
+Home profile CRUD, ownership checks, embedded appliances, thumbnails,
+cascading delete and bulk move
+"""
+import hashlib
+
+from app.core.thumbnails import thumbnail_path, thumbnail_sizes
+from tests.test_uploads import put_object, start_upload
+
+
+def test_create_get_update_delete(client, user, make_home_profile):
+    profile = make_home_profile(user, address="1 Elm Street", construction_year=1990)
+    assert profile["address"] == "1 Elm Street"
+
+    assert client.get(f"/home_profiles/{profile['id']}", headers=user).json()["address"] == "1 Elm Street"
+    assert [row["id"] for row in client.get("/home_profiles/", headers=user).json()] == [profile["id"]]
+
+    response = client.put(f"/home_profiles/{profile['id']}", json={"address": "2 Oak Avenue"}, headers=user)
+    assert response.status_code == 200
+    assert response.json()["address"] == "2 Oak Avenue"
+    assert response.json()["construction_year"] == 1990
+
+    # An update with nothing to change returns the profile as it is
+    response = client.put(f"/home_profiles/{profile['id']}", json={}, headers=user)
+    assert response.status_code == 200
+    assert response.json()["address"] == "2 Oak Avenue"
+
+    assert client.delete(f"/home_profiles/{profile['id']}", headers=user).status_code == 204
+    assert client.get(f"/home_profiles/{profile['id']}", headers=user).status_code == 404
+
+
+def test_other_users_profile_is_forbidden(client, user, other_user, make_home_profile):
+    profile = make_home_profile(user)
+
+    assert client.get(f"/home_profiles/{profile['id']}", headers=other_user).status_code == 403
+    assert client.put(f"/home_profiles/{profile['id']}", json={"address": "x"}, headers=other_user).status_code == 403
+    assert client.delete(f"/home_profiles/{profile['id']}", headers=other_user).status_code == 403
+    assert client.get("/home_profiles/", headers=other_user).json() == []
+    assert client.get(f"/home_profiles/{profile['id']}", headers=user).status_code == 200
+
+
+def test_requires_authentication(client):
+    assert client.get("/home_profiles/").status_code in (401, 403)
+
+
+def test_include_appliances(client, user, make_home_profile, make_appliance):
+    profile = make_home_profile(user)
+    for name in ("Fridge", "Oven", "Washer"):
+        make_appliance(user, profile["id"], name=name)
+
+    response = client.get(f"/home_profiles/{profile['id']}?include=appliances", headers=user)
+    assert response.status_code == 200
+    assert sorted(row["name"] for row in response.json()["appliances"]) == ["Fridge", "Oven", "Washer"]
+
+    response = client.get(f"/home_profiles/{profile['id']}?include=appliances&appliances_limit=2", headers=user)
+    assert len(response.json()["appliances"]) == 2
+
+    assert client.get(f"/home_profiles/{profile['id']}", headers=user).json().get("appliances") is None
+    assert client.get(f"/home_profiles/{profile['id']}?include=owners", headers=user).status_code == 422
+
+
+def test_include_thumbnails(client, user, make_home_profile):
+    body = b"%PDF-1.4 floor plan"
+    digest = hashlib.sha256(body).hexdigest()
+    ticket = start_upload(client, user, len(body))
+    assert put_object(client, ticket, body).status_code < 300
+    assert client.post(f"/uploads/{ticket['id']}/complete", json={"checksum": digest}, headers=user).status_code == 200
+    profile = client.put(
+        f"/home_profiles/{make_home_profile(user)['id']}", json={"images": [ticket["path"], "unknown.png"]}, headers=user
+    ).json()
+
+    def thumbnails():
+        rows = client.get("/home_profiles/?include_thumbnails=true", headers=user).json()
+        return {row["id"]: row["thumbnails"] for row in rows}
+
+    assert thumbnails()[profile["id"]] == {}
+    for size in thumbnail_sizes():
+        thumbnail_path(digest, size).parent.mkdir(parents=True, exist_ok=True)
+        thumbnail_path(digest, size).write_bytes(b"thumbnail")
+    urls = thumbnails()[profile["id"]][ticket["path"]]
+    assert sorted(urls) == sorted(str(size) for size in thumbnail_sizes())
+
+
+def test_cascade_delete(
+    client, user, other_user, make_home_profile, make_appliance, make_service_record, make_reminder
+):
+    profile = make_home_profile(user)
+    appliance = make_appliance(user, profile["id"])
+    make_service_record(user, appliance["id"])
+    make_service_record(user, appliance["id"])
+    make_reminder(user, appliance["id"])
+
+    assert client.delete(f"/home_profiles/{profile['id']}/cascade", headers=other_user).status_code == 403
+
+    response = client.delete(f"/home_profiles/{profile['id']}/cascade", headers=user)
+    assert response.status_code == 200
+    assert response.json() == {"home_profiles": 1, "appliances": 1, "service_records": 2, "maintenance_reminders": 1}
+
+    assert client.get(f"/appliances/{appliance['id']}", headers=user).status_code == 404
+    assert client.get("/service_records/", headers=user).json() == []
+    assert client.delete(f"/home_profiles/{profile['id']}/cascade", headers=user).status_code == 404
+
+
+def test_move_appliances(client, user, other_user, make_home_profile, make_appliance):
+    source = make_home_profile(user, address="Old house")
+    target = make_home_profile(user, address="New house")
+    fridge = make_appliance(user, source["id"], name="Fridge")
+    oven = make_appliance(user, source["id"], name="Oven")
+
+    response = client.post(
+        f"/home_profiles/{source['id']}/move_appliances",
+        json={"to_home_profile_id": target["id"], "appliance_ids": [fridge["id"]]},
+        headers=user,
+    )
+    assert response.status_code == 200
+    assert response.json() == {"moved": 1, "appliance_ids": [fridge["id"]]}
+    assert client.get(f"/appliances/{fridge['id']}", headers=user).json()["home_profile_id"] == target["id"]
+    assert client.get(f"/appliances/{oven['id']}", headers=user).json()["home_profile_id"] == source["id"]
+
+    response = client.post(
+        f"/home_profiles/{source['id']}/move_appliances", json={"to_home_profile_id": target["id"]}, headers=user
+    )
+    assert response.json() == {"moved": 1, "appliance_ids": [oven["id"]]}
+
+
+def test_move_appliances_rejects_invalid_targets(client, user, other_user, make_home_profile, make_appliance):
+    source = make_home_profile(user)
+    make_appliance(user, source["id"])
+    theirs = make_home_profile(other_user)
+
+    response = client.post(
+        f"/home_profiles/{source['id']}/move_appliances", json={"to_home_profile_id": source["id"]}, headers=user
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        f"/home_profiles/{source['id']}/move_appliances", json={"to_home_profile_id": theirs["id"]}, headers=user
+    )
+    assert response.status_code == 403
@@ -0,0 +1,56 @@
+"""
+Idempotency-Key handling: replays of a completed request, mismatched bodies and key scoping
+"""
+import uuid
+
+from tests.conftest import auth_headers
+
+
+def test_replay_returns_the_stored_response(client, user):
+    headers = {**user, "Idempotency-Key": str(uuid.uuid4())}
+    body = {"address": "1 Elm Street", "construction_year": 1990}
+
+    first = client.post("/home_profiles/", json=body, headers=headers)
+    second = client.post("/home_profiles/", json=body, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.headers.get("idempotent-replayed") == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert second.json() == first.json()
+    # Only one profile was created
+    assert len(client.get("/home_profiles/", headers=user).json()) == 1
+
+
+def test_key_reused_with_a_different_body_is_rejected(client, user):
+    headers = {**user, "Idempotency-Key": str(uuid.uuid4())}
+
+    assert client.post("/home_profiles/", json={"address": "1 Elm Street", "construction_year": 1990}, headers=headers).status_code == 201
+    response = client.post("/home_profiles/", json={"address": "2 Oak Avenue", "construction_year": 1990}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(client.get("/home_profiles/", headers=user).json()) == 1
+
+
+def test_keys_are_scoped_to_the_user(client, user):
+    key = str(uuid.uuid4())
+    body = {"address": "1 Elm Street", "construction_year": 1990}
+    other_id = str(uuid.uuid4())
+    other = auth_headers(other_id)
+
+    mine = client.post("/home_profiles/", json=body, headers={**user, "Idempotency-Key": key})
+    theirs = client.post("/home_profiles/", json=body, headers={**other, "Idempotency-Key": key})
+
+    assert theirs.status_code == 201
+    assert "idempotent-replayed" not in theirs.headers
+    assert theirs.json()["id"] != mine.json()["id"]
+    assert theirs.json()["user_id"] == other_id
+
+
+def test_failed_requests_are_not_stored(client, user):
+    headers = {**user, "Idempotency-Key": str(uuid.uuid4())}
+    body = {"name": "Fridge", "category": "Kitchen", "purchase_date": "2015-01-02", "home_profile_id": str(uuid.uuid4())}
+
+    assert client.post("/appliances/", json=body, headers=headers).status_code == 404
+    response = client.post("/appliances/", json=body, headers=headers)
+    assert response.status_code == 404
+    assert "idempotent-replayed" not in response.headers
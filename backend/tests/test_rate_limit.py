@@ -0,0 +1,51 @@
+"""
+Token-bucket rate limiting: requests past the burst are rejected with 429
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.rate_limit import RateLimitMiddleware, route_group
+
+
+def limited_app(limits):
+    app = FastAPI()
+
+    @app.get("/items")
+    async def list_items():
+        return []
+
+    @app.post("/items")
+    async def create_item():
+        return {}
+
+    @app.get("/health/live")
+    async def live():
+        return {"status": "ok"}
+
+    app.add_middleware(RateLimitMiddleware, limits=limits)
+    return app
+
+
+def test_requests_past_the_burst_get_429():
+    client = TestClient(limited_app({"read": (0.001, 3), "write": (0.001, 1)}))
+
+    assert [client.get("/items").status_code for _ in range(3)] == [200, 200, 200]
+    response = client.get("/items")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Rate limit exceeded"}
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.headers["RateLimit-Limit"] == "3"
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+    # Each route group has its own bucket, and probes are never limited
+    assert client.post("/items").status_code == 200
+    assert client.post("/items").status_code == 429
+    assert client.get("/health/live").status_code == 200
+
+
+def test_route_groups():
+    assert route_group("GET", "/appliances/") == "read"
+    assert route_group("POST", "/appliances/") == "write"
+    assert route_group("POST", "/uploads/") == "uploads"
+    assert route_group("GET", "/health/ready") is None
+    assert route_group("OPTIONS", "/appliances/") is None
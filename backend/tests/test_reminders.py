@@ -0,0 +1,36 @@
+"""
+Reminder ownership checks, completion, list filters and sort
+"""
+
+
+def test_ownership_and_completion(client, user, other_user, make_home_profile, make_appliance, make_reminder):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    reminder = make_reminder(user, appliance["id"])
+    assert reminder["completed"] is False
+
+    assert client.get(f"/reminders/{reminder['id']}", headers=other_user).status_code == 403
+    assert client.patch(f"/reminders/{reminder['id']}/complete", headers=other_user).status_code == 403
+
+    response = client.patch(f"/reminders/{reminder['id']}/complete", headers=user)
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+    assert client.delete(f"/reminders/{reminder['id']}", headers=user).status_code == 204
+
+
+def test_filters_and_sort(client, user, make_home_profile, make_appliance, make_reminder):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    for index, due_date in enumerate(("2026-01-01", "2026-03-01", "2026-02-01")):
+        reminder = make_reminder(user, appliance["id"], title=f"Task {index}", due_date=due_date)
+        if index == 1:
+            client.patch(f"/reminders/{reminder['id']}/complete", headers=user)
+
+    def due_dates(query):
+        response = client.get(f"/reminders/{query}", headers=user)
+        assert response.status_code == 200, response.text
+        return [row["due_date"] for row in response.json()]
+
+    assert due_dates("?completed=false&sort=-due_date") == ["2026-02-01", "2026-01-01"]
+    assert due_dates("?due_from=2026-01-15&due_to=2026-02-15") == ["2026-02-01"]
+    assert due_dates("?sort=completed,-due_date") == ["2026-02-01", "2026-01-01", "2026-03-01"]
+    assert client.get("/reminders/?due_from=2026-05-01&due_to=2026-01-01", headers=user).status_code == 422
+    assert client.get("/reminders/?completed=maybe", headers=user).status_code == 422
@@ -0,0 +1,152 @@
+"""
+Upstream policy: which PostgREST errors count as outages, retries, the
+circuit breaker and stale reads
+"""
+import asyncio
+
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from postgrest.exceptions import APIError
+
+from app.core.resilience import (
+    CircuitBreaker, RetryPolicy, StaleCache, UpstreamPolicy, UpstreamUnavailableError, is_retryable,
+)
+
+
+class FakeBuilder:
+    """A PostgREST query builder whose execute() raises the given errors, then returns rows"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"data": [{"id": "a"}]}
+
+
+def policy(failure_threshold=2):
+    return UpstreamPolicy(
+        "test_db",
+        deadlines={"read": 5.0},
+        idempotent_operations=("read",),
+        retry=RetryPolicy(attempts=3, base_delay=0.001, max_delay=0.001),
+        breaker=CircuitBreaker("test_db", failure_threshold=failure_threshold, recovery_timeout=60),
+        stale_cache=StaleCache(16, 60),
+    )
+
+
+def run(policy, builder, cache_key=("appliances", "id=eq.a")):
+    return asyncio.run(
+        policy.call(lambda: run_in_threadpool(builder.execute), "read", cache_key=cache_key, cancellable=False)
+    )
+
+
+@pytest.mark.parametrize("code", [502, 503, 504, 429, "PGRST000", "PGRST003", "57014", "08006", "40001"])
+def test_outages_are_retryable(code):
+    assert is_retryable(APIError({"code": code, "message": "unavailable"}))
+
+
+@pytest.mark.parametrize("code", [400, 404, "PGRST116", "23505", "42501", "P0002", None])
+def test_request_errors_are_not_retryable(code):
+    assert not is_retryable(APIError({"code": code, "message": "rejected"}))
+
+
+def test_gateway_error_is_retried():
+    builder = FakeBuilder(APIError({"code": 503, "message": "JSON could not be generated"}))
+    assert run(policy(), builder) == {"data": [{"id": "a"}]}
+    assert builder.calls == 2
+
+
+def test_outage_opens_the_circuit_and_serves_stale_reads():
+    upstream = policy(failure_threshold=1)
+    assert run(upstream, FakeBuilder()) == {"data": [{"id": "a"}]}
+
+    down = FakeBuilder(*[APIError({"code": 503, "message": "down"}) for _ in range(3)])
+    # Every attempt failed, so the last good result is served and the circuit opens
+    assert run(upstream, down) == {"data": [{"id": "a"}]}
+    assert down.calls == 3
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+
+    # While open, no call reaches the upstream
+    rejected = FakeBuilder()
+    assert run(upstream, rejected) == {"data": [{"id": "a"}]}
+    assert rejected.calls == 0
+    with pytest.raises(UpstreamUnavailableError):
+        run(upstream, rejected, cache_key=("appliances", "id=eq.b"))
+
+
+def test_request_errors_are_raised_without_retrying():
+    upstream = policy(failure_threshold=1)
+    builder = FakeBuilder(APIError({"code": "23505", "message": "duplicate key"}))
+    with pytest.raises(APIError):
+        run(upstream, builder)
+    assert builder.calls == 1
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.fixture
+def open_circuit():
+    """Opens the database circuit, so reads are answered from the stale cache only"""
+    from app.core.supabase import db_policy
+
+    def open():
+        while db_policy.breaker.state != CircuitBreaker.OPEN:
+            db_policy.breaker.record_failure()
+
+    yield open
+    db_policy.breaker.record_success()
+
+
+def test_stale_reads_keep_embedded_owners(client, user, open_circuit, make_home_profile, make_appliance):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    live = client.get(f"/appliances/{appliance['id']}", headers=user)
+    assert live.status_code == 200
+    assert "owner" not in live.json()
+
+    open_circuit()
+    # The route's reads of the cached result must not have changed it
+    for _ in range(2):
+        stale = client.get(f"/appliances/{appliance['id']}", headers=user)
+        assert stale.status_code == 200
+        assert stale.json() == live.json()
+
+
+def test_stale_cache_stores_and_serves_copies():
+    cache = StaleCache(4, 60)
+
+    class Result:
+        def __init__(self, data):
+            self.data = data
+
+    result = Result([{"id": "a", "owner": {"user_id": "u"}}])
+    cache.put("key", result)
+    result.data[0].pop("owner")
+
+    served = cache.get("key")
+    assert served.data == [{"id": "a", "owner": {"user_id": "u"}}]
+    served.data[0]["owner"]["user_id"] = "changed"
+    assert cache.get("key").data[0]["owner"] == {"user_id": "u"}
+
+
+def test_stale_multi_gets_keep_embedded_owners(
+    client, user, open_circuit, make_home_profile, make_appliance, make_service_record, make_reminder
+):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    paths = {
+        "appliances": appliance["id"],
+        "service_records": make_service_record(user, appliance["id"])["id"],
+        "reminders": make_reminder(user, appliance["id"])["id"],
+    }
+    live = {path: client.get(f"/{path}/?ids={record_id}", headers=user) for path, record_id in paths.items()}
+    for response in live.values():
+        assert response.status_code == 200
+        assert len(response.json()["found"]) == 1
+
+    open_circuit()
+    for path, record_id in paths.items():
+        stale = client.get(f"/{path}/?ids={record_id}", headers=user)
+        assert stale.status_code == 200, stale.text
+        assert stale.json() == live[path].json()
@@ -0,0 +1,45 @@
+"""
+Service record ownership checks, list filters and sort
+"""
+
+
+def test_ownership(client, user, other_user, make_home_profile, make_appliance, make_service_record):
+    appliance = make_appliance(user, make_home_profile(user)["id"])
+    record = make_service_record(user, appliance["id"], cost=125.5)
+    assert record["cost"] == 125.5
+
+    assert client.get(f"/service_records/{record['id']}", headers=other_user).status_code == 403
+    assert client.delete(f"/service_records/{record['id']}", headers=other_user).status_code == 403
+    response = client.post(
+        "/service_records/",
+        json={
+            "appliance_id": appliance["id"], "date": "2021-01-01", "service_type": "Repair",
+            "provider_name": "Eve", "cost": 1.0,
+        },
+        headers=other_user,
+    )
+    assert response.status_code == 403
+
+    response = client.put(f"/service_records/{record['id']}", json={"cost": 99.0}, headers=user)
+    assert response.json()["cost"] == 99.0
+    assert client.delete(f"/service_records/{record['id']}", headers=user).status_code == 204
+
+
+def test_filters_and_sort(client, user, make_home_profile, make_appliance, make_service_record):
+    profile = make_home_profile(user)
+    fridge = make_appliance(user, profile["id"], name="Fridge")
+    furnace = make_appliance(user, profile["id"], name="Furnace")
+    make_service_record(user, fridge["id"], date="2020-01-01", service_type="Repair", provider_name="Bob", cost=10)
+    make_service_record(user, furnace["id"], date="2022-01-01", service_type="Inspection", provider_name="Ann", cost=30)
+    make_service_record(user, fridge["id"], date="2021-06-01", service_type="Repair", provider_name="Ann", cost=20)
+
+    def dates(query):
+        response = client.get(f"/service_records/{query}", headers=user)
+        assert response.status_code == 200, response.text
+        return [row["date"] for row in response.json()]
+
+    assert dates("?sort=-date") == ["2022-01-01", "2021-06-01", "2020-01-01"]
+    assert dates("?service_type=Repair&sort=-date") == ["2021-06-01", "2020-01-01"]
+    assert dates("?provider_name=Ann&date_from=2021-01-01&sort=cost") == ["2021-06-01", "2022-01-01"]
+    assert dates("?date_to=2021-12-31&sort=date") == ["2020-01-01", "2021-06-01"]
+    assert sorted(dates(f"?appliance_id={fridge['id']}")) == ["2020-01-01", "2021-06-01"]
@@ -0,0 +1,39 @@
+"""
+Parsing timestamps as PostgREST returns them, with trimmed fractional seconds
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.database import parse_timestamp
+from app.core.jobs import DatabaseJobBackend
+from app.core.reports import expire_if_stale
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-01-02T03:04:05.12345+00:00", datetime(2026, 1, 2, 3, 4, 5, 123450, timezone.utc)),
+    ("2026-01-02T03:04:05.1+00:00", datetime(2026, 1, 2, 3, 4, 5, 100000, timezone.utc)),
+    ("2026-01-02T03:04:05.123456+00:00", datetime(2026, 1, 2, 3, 4, 5, 123456, timezone.utc)),
+    ("2026-01-02T03:04:05.1234567Z", datetime(2026, 1, 2, 3, 4, 5, 123456, timezone.utc)),
+    ("2026-01-02T03:04:05+00:00", datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)),
+    ("2026-01-02 03:04:05.5+02", datetime(2026, 1, 2, 3, 4, 5, 500000, timezone(timedelta(hours=2)))),
+    ("2026-01-02T03:04:05.25", datetime(2026, 1, 2, 3, 4, 5, 250000)),
+])
+def test_parse_timestamp(value, expected):
+    assert parse_timestamp(value) == expected
+
+
+def test_claimed_job_with_a_five_digit_fraction():
+    job = DatabaseJobBackend._job({
+        "id": "j1", "name": "reports.generate", "payload": None, "attempts": 1, "max_attempts": 3,
+        "run_at": "2026-01-02T03:04:05.12345+00:00",
+    })
+    assert job.run_at == datetime(2026, 1, 2, 3, 4, 5, 123450, timezone.utc).timestamp()
+    assert job.payload == {}
+
+
+def test_report_job_with_a_five_digit_fraction_is_not_expired():
+    created_at = datetime.now(timezone.utc).replace(microsecond=123450).isoformat().replace("123450", "12345")
+    job = {"id": "r1", "status": "running", "created_at": created_at}
+    assert asyncio.run(expire_if_stale(job)) is job
@@ -0,0 +1,100 @@
+"""
+Direct uploads to local storage: completion records the stored object only
+when it matches what was declared
+"""
+import hashlib
+import os
+
+from app.core.config import settings
+
+
+def start_upload(client, headers, size, content_type="application/pdf", kind="warranty_document"):
+    response = client.post(
+        "/uploads/",
+        json={"kind": kind, "filename": "manual.pdf", "content_type": content_type, "size": size},
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def put_object(client, ticket, body, content_type="application/pdf"):
+    return client.put(
+        ticket["url"].replace(settings.PUBLIC_BASE_URL, ""),
+        content=body,
+        headers={**ticket["headers"], "Content-Type": content_type},
+    )
+
+
+def stored(ticket):
+    return os.path.exists(os.path.join(settings.LOCAL_STORAGE_DIR, ticket["path"]))
+
+
+def test_completion_records_the_stored_object(client, user, other_user):
+    body = b"%PDF-1.4 owner's manual"
+    ticket = start_upload(client, user, len(body))
+    assert put_object(client, ticket, body).status_code < 300
+
+    assert client.post(f"/uploads/{ticket['id']}/complete", json={}, headers=other_user).status_code == 403
+
+    response = client.post(
+        f"/uploads/{ticket['id']}/complete", json={"checksum": hashlib.sha256(body).hexdigest()}, headers=user
+    )
+    assert response.status_code == 200, response.text
+    upload = response.json()
+    assert upload["status"] == "complete"
+    assert upload["size"] == len(body)
+    assert upload["content_type"] == "application/pdf"
+    assert upload["checksum"] == hashlib.sha256(body).hexdigest()
+
+    # Completing again is a no-op
+    assert client.post(f"/uploads/{ticket['id']}/complete", json={}, headers=user).json() == upload
+    assert client.get(f"/uploads/{ticket['id']}/download", headers=user).status_code == 200
+
+
+def test_completion_before_the_object_exists(client, user):
+    ticket = start_upload(client, user, 10)
+    assert client.post(f"/uploads/{ticket['id']}/complete", json={}, headers=user).status_code == 409
+    assert client.get(f"/uploads/{ticket['id']}/download", headers=user).status_code == 409
+
+
+def test_object_larger_than_declared_is_refused(client, user):
+    ticket = start_upload(client, user, 5)
+    assert put_object(client, ticket, b"hello, world").status_code == 413
+    assert not stored(ticket)
+
+
+def test_size_other_than_declared_is_rejected_and_deleted(client, user):
+    ticket = start_upload(client, user, 12)
+    assert put_object(client, ticket, b"hello").status_code < 300
+
+    response = client.post(f"/uploads/{ticket['id']}/complete", json={}, headers=user)
+    assert response.status_code == 422
+    assert not stored(ticket)
+    assert client.get(f"/uploads/{ticket['id']}", headers=user).json()["status"] == "pending"
+
+
+def test_checksum_mismatch_is_rejected_and_deleted(client, user):
+    ticket = start_upload(client, user, 5)
+    assert put_object(client, ticket, b"hello").status_code < 300
+
+    response = client.post(f"/uploads/{ticket['id']}/complete", json={"checksum": "00" * 32}, headers=user)
+    assert response.status_code == 422
+    assert not stored(ticket)
+
+
+def test_create_checks_content_type_and_size(client, user):
+    response = client.post(
+        "/uploads/",
+        json={"kind": "home_image", "filename": "manual.pdf", "content_type": "application/pdf", "size": 5},
+        headers=user,
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/uploads/",
+        json={"kind": "warranty_document", "filename": "big.pdf", "content_type": "application/pdf",
+              "size": settings.MAX_UPLOAD_BYTES + 1},
+        headers=user,
+    )
+    assert response.status_code == 413
@@ -0,0 +1,95 @@
+-- Baseline schema for the tables used by the API.
+-- Written to be a no-op against an existing project (create ... if not exists),
+-- and to bootstrap a fresh local Postgres for EXPLAIN runs and tests.
+
+create table if not exists public.home_profiles (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    address text not null,
+    construction_year integer not null,
+    images text[],
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.appliances (
+    id uuid primary key default gen_random_uuid(),
+    home_profile_id uuid not null references public.home_profiles (id) on delete cascade,
+    name text not null,
+    category text not null,
+    purchase_date date not null,
+    warranty_expiration_date date,
+    warranty_document text,
+    notes text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.service_records (
+    id uuid primary key default gen_random_uuid(),
+    appliance_id uuid not null references public.appliances (id) on delete cascade,
+    date date not null,
+    service_type text not null,
+    provider_name text not null,
+    provider_contact text,
+    cost numeric(12, 2) not null,
+    notes text,
+    invoice_document text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.maintenance_reminders (
+    id uuid primary key default gen_random_uuid(),
+    appliance_id uuid not null references public.appliances (id) on delete cascade,
+    title text not null,
+    description text,
+    due_date date not null,
+    recurring boolean not null default false,
+    recurrence_pattern text,
+    completed boolean not null default false,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.file_uploads (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    kind text not null check (kind in ('warranty_document', 'invoice_document', 'home_image')),
+    path text not null unique,
+    filename text not null,
+    content_type text not null,
+    size bigint,
+    checksum text,
+    status text not null default 'pending' check (status in ('pending', 'complete')),
+    created_at timestamptz not null default now(),
+    completed_at timestamptz
+);
+
+-- Keep updated_at current so incremental readers can pull changed rows
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['home_profiles', 'appliances', 'service_records', 'maintenance_reminders'] loop
+        if not exists (
+            select 1 from pg_trigger where tgname = t || '_set_updated_at' and tgrelid = ('public.' || t)::regclass
+        ) then
+            execute format(
+                'create trigger %I before update on public.%I for each row execute function public.set_updated_at()',
+                t || '_set_updated_at', t
+            );
+        end if;
+    end loop;
+end;
+$$;
@@ -0,0 +1,26 @@
+-- Indexes backing the API's hot lookups. Primary keys already cover eq("id").
+
+-- eq("user_id") on home_profiles: every list endpoint starts here
+create index if not exists home_profiles_user_id_idx
+    on public.home_profiles (user_id);
+
+-- in_("home_profile_id") on appliances
+create index if not exists appliances_home_profile_id_idx
+    on public.appliances (home_profile_id);
+
+-- in_("appliance_id") on service records, returned newest first
+create index if not exists service_records_appliance_id_date_idx
+    on public.service_records (appliance_id, date desc);
+
+-- in_("appliance_id") on reminders, returned by due date
+create index if not exists maintenance_reminders_appliance_id_due_date_idx
+    on public.maintenance_reminders (appliance_id, due_date);
+
+-- Open reminders only: the common "what is due" query
+create index if not exists maintenance_reminders_open_due_date_idx
+    on public.maintenance_reminders (appliance_id, due_date)
+    where not completed;
+
+-- Thumbnail lookups by owner and image path
+create index if not exists file_uploads_user_id_path_idx
+    on public.file_uploads (user_id, path);
@@ -0,0 +1,60 @@
+-- Ownership-joined list functions: one round trip instead of
+-- home_profiles -> appliances -> children. Called by the API with the
+-- service role key, so the caller passes the authenticated user's id.
+-- Plain SQL functions with schema-qualified names so the planner can inline
+-- them and use the indexes from the previous migration.
+
+create or replace function public.get_user_appliances(p_user_id uuid)
+returns setof public.appliances
+language sql
+stable
+as $$
+    select a.*
+    from public.appliances a
+    join public.home_profiles hp on hp.id = a.home_profile_id
+    where hp.user_id = p_user_id;
+$$;
+
+create or replace function public.get_user_service_records(p_user_id uuid)
+returns setof public.service_records
+language sql
+stable
+as $$
+    select sr.*
+    from public.service_records sr
+    join public.appliances a on a.id = sr.appliance_id
+    join public.home_profiles hp on hp.id = a.home_profile_id
+    where hp.user_id = p_user_id
+    order by sr.date desc;
+$$;
+
+create or replace function public.get_user_reminders(p_user_id uuid)
+returns setof public.maintenance_reminders
+language sql
+stable
+as $$
+    select mr.*
+    from public.maintenance_reminders mr
+    join public.appliances a on a.id = mr.appliance_id
+    join public.home_profiles hp on hp.id = a.home_profile_id
+    where hp.user_id = p_user_id
+    order by mr.due_date;
+$$;
+
+-- These functions trust p_user_id, so only the service role may call them
+revoke execute on function public.get_user_appliances(uuid) from public;
+revoke execute on function public.get_user_service_records(uuid) from public;
+revoke execute on function public.get_user_reminders(uuid) from public;
+
+do $$
+begin
+    if exists (select 1 from pg_roles where rolname = 'service_role') then
+        revoke execute on function public.get_user_appliances(uuid) from anon, authenticated;
+        revoke execute on function public.get_user_service_records(uuid) from anon, authenticated;
+        revoke execute on function public.get_user_reminders(uuid) from anon, authenticated;
+        grant execute on function public.get_user_appliances(uuid) to service_role;
+        grant execute on function public.get_user_service_records(uuid) to service_role;
+        grant execute on function public.get_user_reminders(uuid) to service_role;
+    end if;
+end;
+$$;
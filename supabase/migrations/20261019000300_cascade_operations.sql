@@ -0,0 +1,168 @@
+-- Server-side cascading deletes and bulk moves. Each function runs in a single
+-- transaction, checks ownership once (locking the parent rows it checks) and
+-- returns affected row counts as jsonb. Children are deleted explicitly rather
+-- than relying on foreign key actions, so the counts are exact and the
+-- behaviour does not depend on how an existing project's constraints were
+-- created.
+--
+-- Errors use SQLSTATEs the API maps to HTTP statuses:
+--   P0002 (no_data_found)          -> 404
+--   42501 (insufficient_privilege) -> 403
+--   22023 (invalid_parameter_value) -> 400
+
+create or replace function public.delete_home_profile_cascade(p_user_id uuid, p_home_profile_id uuid)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_owner uuid;
+    v_appliance_ids uuid[];
+    v_reminders integer;
+    v_service_records integer;
+    v_appliances integer;
+begin
+    select user_id into v_owner
+    from public.home_profiles
+    where id = p_home_profile_id
+    for update;
+
+    if not found then
+        raise exception 'Home profile not found' using errcode = 'P0002';
+    end if;
+    if v_owner <> p_user_id then
+        raise exception 'Not authorized to delete this home profile' using errcode = '42501';
+    end if;
+
+    select coalesce(array_agg(id), '{}') into v_appliance_ids
+    from public.appliances
+    where home_profile_id = p_home_profile_id;
+
+    delete from public.maintenance_reminders where appliance_id = any(v_appliance_ids);
+    get diagnostics v_reminders = row_count;
+    delete from public.service_records where appliance_id = any(v_appliance_ids);
+    get diagnostics v_service_records = row_count;
+    delete from public.appliances where id = any(v_appliance_ids);
+    get diagnostics v_appliances = row_count;
+    delete from public.home_profiles where id = p_home_profile_id;
+
+    return jsonb_build_object(
+        'home_profiles', 1,
+        'appliances', v_appliances,
+        'service_records', v_service_records,
+        'maintenance_reminders', v_reminders
+    );
+end;
+$$;
+
+create or replace function public.delete_appliance_cascade(p_user_id uuid, p_appliance_id uuid)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_owner uuid;
+    v_reminders integer;
+    v_service_records integer;
+begin
+    select hp.user_id into v_owner
+    from public.appliances a
+    join public.home_profiles hp on hp.id = a.home_profile_id
+    where a.id = p_appliance_id
+    for update of a;
+
+    if not found then
+        raise exception 'Appliance not found' using errcode = 'P0002';
+    end if;
+    if v_owner <> p_user_id then
+        raise exception 'Not authorized to delete this appliance' using errcode = '42501';
+    end if;
+
+    delete from public.maintenance_reminders where appliance_id = p_appliance_id;
+    get diagnostics v_reminders = row_count;
+    delete from public.service_records where appliance_id = p_appliance_id;
+    get diagnostics v_service_records = row_count;
+    delete from public.appliances where id = p_appliance_id;
+
+    return jsonb_build_object(
+        'home_profiles', 0,
+        'appliances', 1,
+        'service_records', v_service_records,
+        'maintenance_reminders', v_reminders
+    );
+end;
+$$;
+
+-- Move appliances (all of them, or only p_appliance_ids) between two of the
+-- user's home profiles. Their service records and reminders follow them.
+create or replace function public.move_appliances(
+    p_user_id uuid,
+    p_from_home_profile_id uuid,
+    p_to_home_profile_id uuid,
+    p_appliance_ids uuid[] default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_owned integer;
+    v_found integer;
+    v_moved uuid[];
+begin
+    if p_from_home_profile_id = p_to_home_profile_id then
+        raise exception 'Source and target home profiles must differ' using errcode = '22023';
+    end if;
+
+    -- Lock both profiles in a fixed order so concurrent moves cannot deadlock
+    select count(*), count(*) filter (where user_id = p_user_id) into v_found, v_owned
+    from (
+        select user_id
+        from public.home_profiles
+        where id in (p_from_home_profile_id, p_to_home_profile_id)
+        order by id
+        for update
+    ) profiles;
+
+    if v_found < 2 then
+        raise exception 'Home profile not found' using errcode = 'P0002';
+    end if;
+    if v_owned < 2 then
+        raise exception 'Not authorized to move appliances between these home profiles' using errcode = '42501';
+    end if;
+
+    with moved as (
+        update public.appliances
+        set home_profile_id = p_to_home_profile_id
+        where home_profile_id = p_from_home_profile_id
+          and (p_appliance_ids is null or id = any(p_appliance_ids))
+        returning id
+    )
+    select coalesce(array_agg(id), '{}') into v_moved from moved;
+
+    if p_appliance_ids is not null
+       and cardinality(v_moved) <> (select count(distinct requested) from unnest(p_appliance_ids) requested) then
+        raise exception 'Some appliances do not belong to the source home profile' using errcode = 'P0002';
+    end if;
+
+    return jsonb_build_object(
+        'moved', cardinality(v_moved),
+        'appliance_ids', to_jsonb(v_moved)
+    );
+end;
+$$;
+
+-- These functions trust p_user_id, so only the service role may call them
+revoke execute on function public.delete_home_profile_cascade(uuid, uuid) from public;
+revoke execute on function public.delete_appliance_cascade(uuid, uuid) from public;
+revoke execute on function public.move_appliances(uuid, uuid, uuid, uuid[]) from public;
+
+do $$
+begin
+    if exists (select 1 from pg_roles where rolname = 'service_role') then
+        revoke execute on function public.delete_home_profile_cascade(uuid, uuid) from anon, authenticated;
+        revoke execute on function public.delete_appliance_cascade(uuid, uuid) from anon, authenticated;
+        revoke execute on function public.move_appliances(uuid, uuid, uuid, uuid[]) from anon, authenticated;
+        grant execute on function public.delete_home_profile_cascade(uuid, uuid) to service_role;
+        grant execute on function public.delete_appliance_cascade(uuid, uuid) to service_role;
+        grant execute on function public.move_appliances(uuid, uuid, uuid, uuid[]) to service_role;
+    end if;
+end;
+$$;
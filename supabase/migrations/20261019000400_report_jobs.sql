@@ -0,0 +1,20 @@
+-- Background report jobs. A row is created when a report is requested and
+-- updated by the API worker that renders it; the rendered file is cached on
+-- disk under data_hash, so identical data is never rendered twice.
+
+create table if not exists public.report_jobs (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    home_profile_id uuid not null references public.home_profiles (id) on delete cascade,
+    format text not null check (format in ('pdf', 'csv')),
+    status text not null default 'queued' check (status in ('queued', 'running', 'succeeded', 'failed')),
+    data_hash text,
+    size bigint,
+    error text,
+    created_at timestamptz not null default now(),
+    started_at timestamptz,
+    finished_at timestamptz
+);
+
+create index if not exists report_jobs_user_id_created_at_idx
+    on public.report_jobs (user_id, created_at desc);
@@ -0,0 +1,61 @@
+-- Durable queue for the background job runner (JOBS_BACKEND=database).
+-- Workers claim due jobs with claim_background_job, which locks one row with
+-- SKIP LOCKED so concurrent workers never claim the same job. A running job
+-- whose lease (locked_until) has expired belonged to a worker that died and
+-- is claimed again. dedupe_key makes each cron slot run once.
+
+create table if not exists public.background_jobs (
+    id uuid primary key default gen_random_uuid(),
+    name text not null,
+    payload jsonb not null default '{}',
+    status text not null default 'queued' check (status in ('queued', 'running', 'succeeded', 'failed')),
+    attempts integer not null default 0,
+    max_attempts integer not null default 1,
+    run_at timestamptz not null default now(),
+    locked_by text,
+    locked_until timestamptz,
+    dedupe_key text unique,
+    last_error text,
+    created_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+create index if not exists background_jobs_due_idx
+    on public.background_jobs (run_at)
+    where status in ('queued', 'running');
+
+create index if not exists background_jobs_finished_at_idx
+    on public.background_jobs (finished_at)
+    where status in ('succeeded', 'failed');
+
+create or replace function public.claim_background_job(p_names text[], p_worker text, p_lease_seconds integer)
+returns setof public.background_jobs
+language sql
+as $$
+    update public.background_jobs j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker,
+        locked_until = now() + make_interval(secs => p_lease_seconds)
+    where j.id = (
+        select id
+        from public.background_jobs
+        where name = any(p_names)
+          and ((status = 'queued' and run_at <= now()) or (status = 'running' and locked_until < now()))
+        order by run_at
+        limit 1
+        for update skip locked
+    )
+    returning j.*;
+$$;
+
+revoke execute on function public.claim_background_job(text[], text, integer) from public;
+
+do $$
+begin
+    if exists (select 1 from pg_roles where rolname = 'service_role') then
+        revoke execute on function public.claim_background_job(text[], text, integer) from anon, authenticated;
+        grant execute on function public.claim_background_job(text[], text, integer) to service_role;
+    end if;
+end;
+$$;